@@ -0,0 +1,132 @@
+"""
+Memory and throughput of per-worker embedding models versus one shared sidecar.
+
+For each worker count in ``--workers``, starts that many processes standing
+in for uvicorn workers.  In ``local`` mode each loads its own model; in
+``sidecar`` mode one embedding_sidecar process owns the model and the
+workers attach an EmbeddingClient.  Each worker encodes ``--requests`` pairs
+of texts through an EmbeddingBatcher, 16 at a time.  Reports the total
+resident memory of all processes and the texts encoded per second.
+
+The model is a numpy stand-in with MiniLM-L6 sized weights (about 90 MB, a
+6-layer feed-forward pass per token), so no model download is needed.
+
+    python benchmarks/bench_embedding_sidecar.py --workers 1 4 8
+"""
+import argparse
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import time
+
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+
+import numpy as np
+
+from common import ROOT  # noqa: F401  (puts the repository root on sys.path)
+
+WORDS = "retail cashier inventory customer service weekend shift stocking shelves forklift team".split()
+
+
+class MiniLMSizedModel:
+    def __init__(self, vocabulary: int = 30522, dim: int = 384, layers: int = 6):
+        rng = np.random.default_rng(0)
+        self.vocabulary = vocabulary
+        self.table = rng.standard_normal((vocabulary, dim), dtype=np.float32)
+        self.layers = [(rng.standard_normal((dim, dim * 4), dtype=np.float32) * 0.03,
+                        rng.standard_normal((dim * 4, dim), dtype=np.float32) * 0.03) for _ in range(layers)]
+
+    def encode(self, sentences, batch_size=None, **kwargs) -> np.ndarray:
+        tokens = [[int(hashlib.md5(word.encode()).hexdigest()[:8], 16) % self.vocabulary
+                   for word in text.split()][:64] or [0] for text in sentences]
+        x = self.table[np.concatenate(tokens)]
+        for up, down in self.layers:
+            x = x + np.maximum(x @ up, 0) @ down
+        offsets = np.cumsum([0] + [len(t) for t in tokens])
+        return np.stack([x[offsets[i]:offsets[i + 1]].mean(0) for i in range(len(sentences))])
+
+
+def rss_mb(pid="self") -> float:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def worker(worker_id, mode, requests, socket_path, results):
+    from embedding_sidecar import EmbeddingClient
+    from embeddings import EmbeddingBatcher, EmbeddingStore
+
+    model = MiniLMSizedModel() if mode == "local" else EmbeddingClient(socket_path)
+    batcher = EmbeddingBatcher(EmbeddingStore(), 5.0, 64)
+    batcher.attach(model)
+
+    async def run():
+        semaphore = asyncio.Semaphore(16)
+
+        async def one(n):
+            async with semaphore:
+                text = f"worker {worker_id} request {n} " + " ".join(WORDS[(n + k) % len(WORDS)] for k in range(20))
+                await batcher.encode([text, text + " job"])
+
+        await asyncio.gather(*[one(n) for n in range(requests)])
+
+    asyncio.run(run())
+    batcher.shutdown()
+    results.put(rss_mb())
+
+
+def sidecar(socket_path, ready):
+    from embedding_sidecar import serve
+
+    model = MiniLMSizedModel()
+    ready.set()
+    asyncio.run(serve(socket_path, model))
+
+
+def measure(mode, workers, requests):
+    socket_path = os.path.join(tempfile.mkdtemp(), "embeddings.sock")
+    server = None
+    if mode == "sidecar":
+        ready = multiprocessing.Event()
+        server = multiprocessing.Process(target=sidecar, args=(socket_path, ready))
+        server.start()
+        ready.wait()
+        while not os.path.exists(socket_path):
+            time.sleep(0.05)
+
+    results = multiprocessing.Queue()
+    started = time.perf_counter()
+    processes = [multiprocessing.Process(target=worker, args=(n, mode, requests, socket_path, results))
+                 for n in range(workers)]
+    for process in processes:
+        process.start()
+    worker_rss = sum(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+
+    sidecar_rss = 0.0
+    if server is not None:
+        sidecar_rss = rss_mb(server.pid)
+        server.terminate()
+        server.join()
+    print(f"{mode:8s} workers={workers}  rss {worker_rss + sidecar_rss:6.0f} MB "
+          f"(workers {worker_rss:.0f} + sidecar {sidecar_rss:.0f})  {workers * requests * 2 / elapsed:6.0f} texts/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--requests", type=int, default=200, help="encode calls per worker")
+    args = parser.parse_args()
+    for workers in args.workers:
+        for mode in ("local", "sidecar"):
+            measure(mode, workers, args.requests)
+
+
+if __name__ == "__main__":
+    main()
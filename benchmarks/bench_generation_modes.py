@@ -0,0 +1,47 @@
+"""
+End-to-end latency of job description generation per JOB_GENERATION_MODE.
+
+- "sequential": description, then a summary of it (two round-trips in a row)
+- "single_call": one structured prompt returns both
+- "parallel": the summary is written from the form fields alongside the description
+
+The stub Granite model answers every call in ``--stub-latency`` seconds
+whatever its length, so this measures the round-trips on the critical path;
+with the real model a single call's longer output costs extra decode time.
+
+    python benchmarks/bench_generation_modes.py --requests 20
+"""
+import argparse
+import asyncio
+import time
+
+from common import report, running_api
+
+JOB = {"store_name": "Cafe", "location": "Madhapur", "work_hours": "9-5", "wage": "$20/hour",
+       "responsibilities": "Prepare coffee and serve customers", "requirements": "Espresso experience"}
+
+
+async def run(args):
+    async with running_api(stub_latency=args.stub_latency) as (main, _):
+        service = main.granite_service
+        for mode in ("sequential", "single_call", "parallel"):
+            main.settings.JOB_GENERATION_MODE = mode
+            samples = []
+            for n in range(args.requests):
+                started = time.perf_counter()
+                # A new position every time, so the LLM response cache does not answer
+                result = await service.generate_enhanced_job_description({**JOB, "position": f"Barista {mode} {n} {time.time()}"})
+                samples.append(time.perf_counter() - started)
+                assert result["enhanced_description"] and result["summary"]
+            print(report(mode, samples))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--stub-latency", type=float, default=0.5)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
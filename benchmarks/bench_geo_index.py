@@ -0,0 +1,72 @@
+"""
+Latency of GeoIndex radius and k-nearest queries against brute-force haversine.
+
+Indexes ``--points`` random locations over roughly 55 x 53 km around
+Hyderabad, then times ``within`` at several radii and ``nearest`` with k=10
+for 200 queries inside the area, alongside a brute-force haversine pass over
+every point.  Also times the two cases that used to walk every ring of the
+grid: a query far outside the indexed area, and k larger than the index.
+Results are checked against brute force.
+
+    python benchmarks/bench_geo_index.py
+    python benchmarks/bench_geo_index.py --points 100000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from common import Timer, report
+from geo_index import GeoIndex, haversine_m
+
+
+def timed(queries, func):
+    samples = []
+    for lat, lon in queries:
+        started = time.perf_counter()
+        func(lat, lon)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(3)
+    lats = 17.25 + rng.random(args.points) * 0.5
+    lons = 78.2 + rng.random(args.points) * 0.5
+    ids = [f"p{n}" for n in range(args.points)]
+    index = GeoIndex()
+    with Timer() as timer:
+        index.add_many(ids, lats, lons)
+    print(f"{args.points} points indexed in {timer.seconds:.1f} s")
+
+    queries = [(17.3 + rng.random() * 0.4, 78.25 + rng.random() * 0.4) for _ in range(args.queries)]
+    for radius in (500, 2000, 5000):
+        hits = int(np.mean([len(index.within(lat, lon, radius)) for lat, lon in queries[:20]]))
+        print(f"{report(f'within {radius} m', timed(queries, lambda lat, lon: index.within(lat, lon, radius)))}  ~{hits} hits")
+    print(report("nearest k=10", timed(queries, lambda lat, lon: index.nearest(lat, lon, 10))))
+    print(report("brute force haversine, k=10",
+                 timed(queries, lambda lat, lon: np.argpartition(haversine_m(lat, lon, lats, lons), 10)[:10])))
+
+    far = [(14.0 + rng.random(), 75.0 + rng.random()) for _ in range(20)]
+    print(report("nearest k=10, ~400 km away", timed(far, lambda lat, lon: index.nearest(lat, lon, 10))))
+    small = GeoIndex()
+    small.add_many(ids[:1000], lats[:1000], lons[:1000])
+    print(report("nearest k=5000 of 1000 points", timed(queries[:20], lambda lat, lon: small.nearest(lat, lon, 5000))))
+
+    mismatches = 0
+    for lat, lon in queries[:50] + far[:5]:
+        distances = haversine_m(lat, lon, lats, lons)
+        expected = {int(n) for n in np.flatnonzero(distances <= 2000)}
+        mismatches += expected != {int(item[1:]) for item, _ in index.within(lat, lon, 2000)}
+        expected = [int(n) for n in np.argsort(distances, kind="stable")[:10]]
+        mismatches += expected != [int(item[1:]) for item, _ in index.nearest(lat, lon, 10)]
+    print(f"mismatches against brute force: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Load test: do other endpoints stay fast while Granite generations are in flight?
+
+Starts the API with the stub Granite model (each generation blocks its
+thread for ``--stub-latency`` seconds, like an SDK round-trip), keeps
+``--generations`` job description generations running, and meanwhile probes
+GET /stores and GET /profile on a fixed schedule.  ``--mode inline`` calls the SDK directly on
+the event loop, as the API did before generations moved to the Granite
+worker pool, for comparison.
+
+    python benchmarks/bench_granite_load.py
+    python benchmarks/bench_granite_load.py --mode inline --generations 4
+"""
+import argparse
+import asyncio
+import time
+
+from common import auth_headers, report, running_api
+
+JOB = {"store_name": "Cafe", "location": "Madhapur", "work_hours": "9-5", "wage": "$20/hour",
+       "responsibilities": "Prepare coffee", "requirements": "Espresso experience"}
+
+
+async def probe(client, path, headers, samples, stop: asyncio.Event, interval: float = 0.005):
+    """
+    Request ``path`` every ``interval`` seconds; latency counts from when the
+    request was due, so time spent waiting for a blocked event loop is included
+    """
+    due = time.perf_counter()
+    while not stop.is_set():
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        response = await client.get(path, headers=headers)
+        samples.append(time.perf_counter() - due)
+        response.raise_for_status()
+        due += interval
+
+
+async def run(args):
+    async with running_api(stub_latency=args.stub_latency, JOB_GENERATION_MODE="sequential") as (main, client):
+        service = main.granite_service
+        if args.mode == "inline":
+            async def inline(func, *func_args, timeout=None, **kwargs):
+                return func(*func_args, **kwargs)
+            service.runner.run = inline
+        headers = await auth_headers(client)
+
+        for label, generations in (("idle", 0), (f"{args.generations} generations in flight", args.generations)):
+            stop = asyncio.Event()
+            stores, profile = [], []
+            probes = [asyncio.create_task(probe(client, "/stores", None, stores, stop)),
+                      asyncio.create_task(probe(client, "/profile", headers, profile, stop))]
+            started = time.perf_counter()
+            if generations:
+                # Distinct positions, so the LLM response cache does not answer them
+                await asyncio.gather(*[
+                    service.generate_enhanced_job_description({**JOB, "position": f"Barista {time.time()} {n}"})
+                    for n in range(generations)
+                ])
+            else:
+                await asyncio.sleep(args.stub_latency * 2)
+            elapsed = time.perf_counter() - started
+            stop.set()
+            await asyncio.gather(*probes)
+            print(f"-- {label} ({args.mode}), {elapsed:.1f}s")
+            print(report("GET /stores", stores))
+            print(report("GET /profile", profile))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("pool", "inline"), default="pool")
+    parser.add_argument("--generations", type=int, default=16)
+    parser.add_argument("--stub-latency", type=float, default=1.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
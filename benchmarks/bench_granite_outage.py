@@ -0,0 +1,101 @@
+"""
+Tail latency of job description generation while Granite is down or flaky.
+
+Uses GraniteService with the fault-injecting stub client (no credentials):
+
+1. Outage: every call hangs for ``--hang-seconds`` before failing.  100
+   generations, 4 at a time, with the circuit breaker disabled and then
+   enabled; with the breaker, requests fall back to the template
+   description as soon as it opens instead of waiting out the deadline.
+2. Recovery: the stub is healed, and after the breaker's open period the
+   half-open probes close it again.
+3. Flaky: 5% of calls hang; 200 generations without and with hedging
+   (GRANITE_HEDGE_AFTER_SECONDS), which starts a second attempt for calls
+   that are much slower than usual.
+
+    python benchmarks/bench_granite_outage.py
+"""
+import argparse
+import asyncio
+import time
+
+from common import ROOT, report  # noqa: F401  (common puts the repository root on sys.path)
+
+JOB = {"store_name": "Cafe", "location": "Madhapur", "work_hours": "9-5", "wage": "$20/hour",
+       "responsibilities": "Prepare coffee", "requirements": "Espresso experience"}
+
+
+def service(main, breaker: bool, hedge_after=None, **stub):
+    from granite_runtime import StubGraniteClient
+
+    settings = main.settings
+    settings.GRANITE_HEDGE_AFTER_SECONDS = hedge_after
+    settings.GRANITE_BREAKER_MIN_CALLS = 5 if breaker else 10 ** 9
+    granite = main.GraniteService()
+    granite.client = StubGraniteClient(**stub)
+    granite.is_ready = True
+    return granite
+
+
+async def load(granite, requests: int, concurrency: int, tag: str):
+    """Latencies and the number of template fallbacks; distinct positions keep the LLM cache out of it"""
+    semaphore = asyncio.Semaphore(concurrency)
+    samples, fallbacks = [], 0
+
+    async def one(n):
+        nonlocal fallbacks
+        async with semaphore:
+            started = time.perf_counter()
+            result = await granite.generate_enhanced_job_description({**JOB, "position": f"Barista {tag} {n}"})
+            samples.append(time.perf_counter() - started)
+            fallbacks += not result["enhanced_description"].startswith("[stub]")
+
+    await asyncio.gather(*[one(n) for n in range(requests)])
+    return samples, fallbacks
+
+
+async def run(args):
+    import logging
+
+    import main
+
+    logging.disable(logging.CRITICAL)
+    settings = main.settings
+    settings.JOB_GENERATION_MODE = "single_call"
+    settings.GRANITE_MAX_CONCURRENCY = 8
+    settings.GRANITE_TIMEOUT_SECONDS = args.deadline
+    settings.GRANITE_BREAKER_OPEN_SECONDS = 1.0
+
+    for breaker in (False, True):
+        granite = service(main, breaker, latency_seconds=args.latency, hang_rate=1.0, hang_seconds=args.hang_seconds)
+        started = time.perf_counter()
+        samples, fallbacks = await load(granite, 100, 4, f"outage {breaker}")
+        label = "outage, breaker on" if breaker else "outage, breaker off"
+        print(f"{report(label, samples)}  "
+              f"{time.perf_counter() - started:5.1f} s total, {fallbacks} fallbacks, breaker {granite.breaker.state}")
+
+    granite.client.hang_rate = 0.0
+    await asyncio.sleep(settings.GRANITE_BREAKER_OPEN_SECONDS + 0.2)
+    for label in ("recovery, first 20", "recovery, next 20"):
+        samples, fallbacks = await load(granite, 20, 4, label)
+        print(f"{report(label, samples)}  {fallbacks} fallbacks, breaker {granite.breaker.state}")
+
+    for hedge_after in (None, args.hedge_after):
+        granite = service(main, True, hedge_after, latency_seconds=args.latency, hang_rate=0.05,
+                          hang_seconds=args.deadline, seed=7)
+        samples, fallbacks = await load(granite, 200, 4, f"flaky {hedge_after}")
+        label = f"5% hang, hedge after {hedge_after} s" if hedge_after else "5% hang, no hedging"
+        print(f"{report(label, samples)}  {fallbacks} fallbacks")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.2, help="healthy stub latency (seconds)")
+    parser.add_argument("--hang-seconds", type=float, default=3.0, help="how long a hung call blocks")
+    parser.add_argument("--deadline", type=float, default=2.0, help="GRANITE_TIMEOUT_SECONDS")
+    parser.add_argument("--hedge-after", type=float, default=0.5, help="GRANITE_HEDGE_AFTER_SECONDS")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
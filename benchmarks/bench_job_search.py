@@ -0,0 +1,120 @@
+"""
+Latency and relevance of hybrid job search (GET /jobs/search) on a synthetic corpus.
+
+Indexes ``--jobs`` synthetic jobs from eight categories into JobSearch
+(BM25 over the job text plus a ``--backend`` vector index), each with an
+embedding near its category's centroid.  Queries are phrased mostly with
+words that do not appear in the matching category's text, so keyword search
+alone finds little and the semantic side has to carry them.  Reports p50/p99
+latency and precision@20 (share of results from the queried category) for
+lexical-only, hybrid and filtered hybrid search, recall@20 of the vector
+index against exact cosine search, and checks that cursor pagination never
+repeats a job.
+
+    python benchmarks/bench_job_search.py
+    python benchmarks/bench_job_search.py --backend hnsw
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from common import Timer, report
+from job_search import JobSearch
+from text_search import BM25Index
+from vector_index import create_vector_index
+
+CATEGORIES = {
+    "barista": ("Barista", "espresso drinks latte art cafe counter milk steaming"),
+    "cashier": ("Cashier", "billing counter cash register POS customer payments"),
+    "driver": ("Delivery Driver", "two wheeler license routes parcels doorstep delivery"),
+    "stock": ("Stock Associate", "inventory shelves restocking warehouse receiving goods"),
+    "cook": ("Line Cook", "kitchen prep grill food safety orders"),
+    "guard": ("Security Guard", "patrol CCTV entry gate monitoring night"),
+    "sales": ("Sales Associate", "fashion retail floor customer styling targets"),
+    "reception": ("Receptionist", "front desk phone calls appointments visitors"),
+}
+GENERIC = "teamwork communication punctual weekend availability english hindi telugu friendly reliable".split()
+LOCATIONS = ["Jubilee Hills", "Banjara Hills", "Madhapur", "Gachibowli", "Kukatpally", "Ameerpet"]
+QUERIES = [("coffee shop job", "barista"), ("checkout counter work", "cashier"), ("bike courier", "driver"),
+           ("warehouse shelves", "stock"), ("restaurant kitchen", "cook"), ("watchman", "guard"),
+           ("clothing store", "sales"), ("office front desk", "reception")]
+
+
+def unit(vector: np.ndarray) -> np.ndarray:
+    return vector / np.linalg.norm(vector)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=100000)
+    parser.add_argument("--backend", choices=("flat", "hnsw"), default="flat")
+    parser.add_argument("--rounds", type=int, default=5, help="times each query is run")
+    args = parser.parse_args()
+
+    rnd, rng, dim = random.Random(7), np.random.default_rng(7), 384
+    centroids = {name: unit(rng.standard_normal(dim).astype(np.float32)) for name in CATEGORIES}
+    options = {"max_elements": args.jobs} if args.backend == "hnsw" else {}
+    vectors = create_vector_index(args.backend, **options)
+    search = JobSearch(BM25Index(), vectors, depth=1000)
+
+    labels, ids, embeddings = {}, [], []
+    with Timer() as timer:
+        for n in range(args.jobs):
+            category = rnd.choice(list(CATEGORIES))
+            position, words = CATEGORIES[category]
+            words = words.split()
+            search.upsert(f"j{n}", {
+                "position": position, "store_name": f"Store {n % 2000}",
+                "requirements": " ".join(rnd.sample(words, 3) + rnd.sample(GENERIC, 4)),
+                "responsibilities": " ".join(rnd.sample(words, 2)), "location": rnd.choice(LOCATIONS),
+                "wage": f"${rnd.randint(12, 30)}/hour", "distance": f"{rnd.randint(1, 20)} km"
+            })
+            labels[f"j{n}"] = category
+            ids.append(f"j{n}")
+            embeddings.append(unit(centroids[category] + 0.08 * rng.standard_normal(dim).astype(np.float32)))
+        matrix = np.array(embeddings)
+        vectors.add_many(ids, matrix)
+    print(f"{args.jobs} jobs indexed in {timer.seconds:.1f} s ({args.backend} vector index)")
+
+    def query_vector(category):
+        return unit(centroids[category] + 0.05 * rng.standard_normal(dim).astype(np.float32))
+
+    def run(label, semantic=False, **filters):
+        samples, precision = [], []
+        for _ in range(args.rounds):
+            for text, category in QUERIES:
+                vector = query_vector(category) if semantic else None
+                started = time.perf_counter()
+                page, _ = search.search(text, vector, limit=20, **filters)
+                samples.append(time.perf_counter() - started)
+                precision.append(sum(labels[hit["id"]] == category for hit in page) / 20)
+        print(f"{report(label, samples)}  precision@20 {np.mean(precision):.2f}")
+
+    run("lexical only")
+    run("hybrid (RRF)", semantic=True)
+    run("hybrid, Madhapur, wage >= 20", semantic=True, location="Madhapur", min_wage=20)
+    run("hybrid, wage 15-20", semantic=True, min_wage=15, max_wage=20)
+
+    recall = []
+    for _, category in QUERIES:
+        vector = query_vector(category)
+        exact = {ids[n] for n in np.argsort(-(matrix @ vector))[:20]}
+        recall.append(len(exact & {item for item, _ in vectors.search(vector, 20)}) / 20)
+    print(f"vector index recall@20 against exact search: {np.mean(recall):.3f}")
+
+    seen, cursor, pages, vector = set(), None, 0, query_vector("stock")
+    while pages < 10:
+        page, cursor = search.search("warehouse shelves", vector, limit=50, cursor=cursor)
+        page_ids = {hit["id"] for hit in page}
+        assert not seen & page_ids, "a job appeared on two pages"
+        seen |= page_ids
+        pages += 1
+        if cursor is None:
+            break
+    print(f"{pages} pages of 50 with a cursor: {len(seen)} distinct jobs, no repeats")
+
+
+if __name__ == "__main__":
+    main()
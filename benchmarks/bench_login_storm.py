@@ -0,0 +1,83 @@
+"""
+Login storm: login latency, and how the rest of the API fares, during a burst.
+
+Fires ``--logins`` concurrent POST /auth/login calls for one user while
+GET /stores is probed on a fixed schedule, and reports p50/p99 of both along
+with the password hasher's queue statistics.  Passwords are hashed with
+``--rounds`` (bcrypt cost) on ``--workers`` hasher threads; ``--mode inline``
+runs bcrypt directly on the event loop, as the API did before hashing moved
+to the PasswordHasher pool, for comparison.
+
+    python benchmarks/bench_login_storm.py
+    python benchmarks/bench_login_storm.py --mode inline
+"""
+import argparse
+import asyncio
+import time
+
+from common import auth_headers, report, running_api
+from security import PasswordHasher
+
+EMAIL, PASSWORD = "storm@example.com", "storm-password"
+
+
+async def probe(client, samples, stop: asyncio.Event, interval: float = 0.01):
+    """GET /stores every ``interval`` seconds, timed from when each request was due"""
+    due = time.perf_counter()
+    while not stop.is_set():
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        response = await client.get("/stores")
+        samples.append(time.perf_counter() - due)
+        response.raise_for_status()
+        due += interval
+
+
+async def run(args):
+    async with running_api() as (main, client):
+        hasher = main.password_hasher = PasswordHasher(rounds=args.rounds, max_workers=args.workers,
+                                                      max_pending=args.logins)
+        if args.mode == "inline":
+            async def inline(operation, func, *func_args):
+                return func(*func_args)
+            hasher._run = inline
+        await auth_headers(client, EMAIL, PASSWORD)
+
+        logins, stores, codes = [], [], {}
+        stop = asyncio.Event()
+
+        async def login():
+            # All logins are sent at once; time from the start of the burst, so
+            # time spent waiting for a blocked event loop is included
+            response = await client.post("/auth/login", json={"email": EMAIL, "password": PASSWORD})
+            logins.append(time.perf_counter() - started)
+            codes[response.status_code] = codes.get(response.status_code, 0) + 1
+
+        prober = asyncio.create_task(probe(client, stores, stop))
+        started = time.perf_counter()
+        await asyncio.gather(*[login() for _ in range(args.logins)])
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await prober
+
+        print(f"{args.logins} logins, bcrypt cost {args.rounds}, mode {args.mode}"
+              f"{'' if args.mode == 'inline' else f', {args.workers} hasher threads'}: "
+              f"{elapsed:.2f} s, status codes {codes}")
+        print(report("POST /auth/login", logins))
+        print(report("GET /stores during the storm", stores))
+        if args.mode == "pool":
+            print("hasher", hasher.stats())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("pool", "inline"), default="pool")
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=2)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
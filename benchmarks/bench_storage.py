@@ -0,0 +1,127 @@
+"""
+Read/write throughput of the storage backends with several worker processes.
+
+Each of ``--workers`` processes opens the same SQLite database (WAL mode,
+``--pool-size`` connections each), as uvicorn workers sharing
+STORAGE_BACKEND=sqlite would, and runs ``--concurrency`` coroutines doing
+gets by id, indexed finds and puts for ``--seconds``.  The memory backend
+is measured in a single process for reference (it cannot be shared).
+
+    python benchmarks/bench_storage.py --workers 4
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from common import ROOT  # noqa: F401  (puts the repository root on sys.path)
+from repositories import JOB_INDEXES
+from storage import open_storage
+
+LOCATIONS = ["Madhapur", "Gachibowli", "Kukatpally", "Ameerpet", "Jubilee Hills", "Banjara Hills"]
+
+
+def job(n: int):
+    return {"id": str(n), "position": f"Position {n % 50}", "location": LOCATIONS[n % len(LOCATIONS)],
+            "created_by": f"user-{n % 1000}", "wage": "$15/hour", "requirements": "reliable " * 20}
+
+
+async def workload(backend, path, pool_size, rows, write_share, seconds, concurrency, seed):
+    storage = open_storage(backend, path, pool_size)
+    jobs = storage.collection("jobs", JOB_INDEXES)
+    await storage.connect()
+    rng = random.Random(seed)
+    counts = {"get": 0, "find": 0, "put": 0}
+    deadline = time.perf_counter() + seconds
+
+    async def client():
+        while time.perf_counter() < deadline:
+            roll = rng.random()
+            if roll < write_share:
+                await jobs.put(job(rng.randrange(rows)))
+                counts["put"] += 1
+            elif roll < write_share + (1 - write_share) / 2:
+                await jobs.get(str(rng.randrange(rows)))
+                counts["get"] += 1
+            else:
+                await jobs.find("created_by", f"user-{rng.randrange(1000)}")
+                counts["find"] += 1
+
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    await storage.close()
+    return counts
+
+
+def worker(args, path, write_share, seed, results):
+    results.put(asyncio.run(workload("sqlite", path, args.pool_size, args.rows, write_share,
+                                      args.seconds, args.concurrency, seed)))
+
+
+async def fill(backend, path, pool_size, rows):
+    storage = open_storage(backend, path, pool_size)
+    jobs = storage.collection("jobs", JOB_INDEXES)
+    await storage.connect()
+    await jobs.put_many(job(n) for n in range(rows))
+    await storage.close()
+
+
+def line(label, counts, seconds):
+    total = sum(counts.values())
+    return (f"{label:34s} {total / seconds:9,.0f} ops/s  (get {counts['get'] / seconds:8,.0f}  "
+            f"find {counts['find'] / seconds:7,.0f}  put {counts['put'] / seconds:7,.0f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=16, help="coroutines per worker")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    asyncio.run(fill("sqlite", path, args.pool_size, args.rows))
+    for label, write_share in (("read only", 0.0), ("90% reads / 10% writes", 0.1), ("write only", 1.0)):
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=worker, args=(args, path, write_share, seed, results))
+                     for seed in range(args.workers)]
+        for process in processes:
+            process.start()
+        totals = {"get": 0, "find": 0, "put": 0}
+        for _ in processes:
+            for name, count in results.get().items():
+                totals[name] += count
+        for process in processes:
+            process.join()
+        print(line(f"sqlite x{args.workers} workers, {label}", totals, args.seconds))
+
+    async def memory(write_share):
+        storage = open_storage("memory")
+        jobs = storage.collection("jobs", JOB_INDEXES)
+        await jobs.put_many(job(n) for n in range(args.rows))
+        counts = {"get": 0, "find": 0, "put": 0}
+        rng = random.Random(0)
+        deadline = time.perf_counter() + args.seconds
+        while time.perf_counter() < deadline:
+            for _ in range(100):
+                roll = rng.random()
+                if roll < write_share:
+                    await jobs.put(job(rng.randrange(args.rows)))
+                    counts["put"] += 1
+                elif roll < write_share + (1 - write_share) / 2:
+                    await jobs.get(str(rng.randrange(args.rows)))
+                    counts["get"] += 1
+                else:
+                    await jobs.find("created_by", f"user-{rng.randrange(1000)}")
+                    counts["find"] += 1
+        return counts
+
+    print(line("memory x1 process, 90% / 10%", asyncio.run(memory(0.1)), args.seconds))
+
+
+if __name__ == "__main__":
+    main()
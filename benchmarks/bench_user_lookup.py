@@ -0,0 +1,73 @@
+"""
+User lookups by id and by email at growing user counts.
+
+Fills a UserRepository (memory backend by default, ``--backend sqlite`` for
+a temporary SQLite file) with synthetic users and times get_by_id and
+get_by_email at each size, next to the linear scan over every user that
+GET /profile used to do.
+
+    python benchmarks/bench_user_lookup.py --sizes 1000 10000 100000 1000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from common import ROOT  # noqa: F401  (puts the repository root on sys.path)
+from repositories import USER_INDEXES, UserRepository
+from storage import open_storage
+
+
+def user(n: int):
+    return {"id": f"user-{n}", "name": f"User {n}", "email": f"User{n}@Example.com", "password": "x",
+            "phone": str(n), "location": "Madhapur", "skills": [], "experience": None}
+
+
+async def time_lookups(lookup, keys, repeats: int = 1):
+    started = time.perf_counter()
+    for _ in range(repeats):
+        for key in keys:
+            assert await lookup(key) is not None
+    return (time.perf_counter() - started) / (len(keys) * repeats)
+
+
+async def run(args):
+    rng = random.Random(1)
+    for size in args.sizes:
+        path = os.path.join(tempfile.mkdtemp(), "users.db")
+        storage = open_storage(args.backend, path)
+        users = UserRepository(storage.collection("users", USER_INDEXES, unique=["email"]))
+        await storage.connect()
+        started = time.perf_counter()
+        await users.collection.put_many(user(n) for n in range(size))
+        fill = time.perf_counter() - started
+
+        picks = [rng.randrange(size) for _ in range(args.lookups)]
+        by_id = await time_lookups(users.get_by_id, [f"user-{n}" for n in picks])
+        by_email = await time_lookups(users.get_by_email, [f"user{n}@example.com" for n in picks])
+
+        # What GET /profile did before the repository: scan every user for the id
+        everyone = await users.all()
+        scan_keys = [f"user-{n}" for n in picks[:max(1, args.lookups // 1000)]]
+        started = time.perf_counter()
+        for key in scan_keys:
+            assert next(u for u in everyone if u["id"] == key)
+        scan = (time.perf_counter() - started) / len(scan_keys)
+
+        print(f"{size:>9,d} users ({args.backend}, filled in {fill:5.1f}s): get_by_id {by_id * 1e6:7.1f} us  "
+              f"get_by_email {by_email * 1e6:7.1f} us  linear scan {scan * 1e6:10.1f} us")
+        await storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--lookups", type=int, default=10000)
+    parser.add_argument("--backend", choices=("memory", "sqlite"), default="memory")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Shared helpers for the benchmark scripts in this directory.
+
+Every script runs standalone from the repository root, e.g.
+
+    python benchmarks/bench_granite_load.py --help
+
+and talks to the app in-process: ``running_api`` starts main.app through its
+own lifespan with the local stub Granite model (granite_runtime.StubGraniteClient)
+and a deterministic hash embedding model, and yields an httpx client on the
+ASGI app, so no IBM Cloud credentials or model downloads are needed.
+"""
+import hashlib
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+class HashEmbeddingModel:
+    """Stand-in for the sentence-transformer: a fixed pseudo-random vector per text"""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def encode(self, sentences: Sequence[str], batch_size=None, **kwargs) -> np.ndarray:
+        rows = []
+        for text in sentences:
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            rows.append(np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32))
+        return np.array(rows)
+
+
+def percentiles(samples: Iterable[float]) -> Dict[str, float]:
+    """p50 / p95 / p99 / max of durations in seconds, as milliseconds"""
+    ordered = sorted(samples)
+    if not ordered:
+        return {"n": 0}
+
+    def at(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+
+    return {"n": len(ordered), "p50_ms": at(0.50), "p95_ms": at(0.95), "p99_ms": at(0.99), "max_ms": round(ordered[-1] * 1000, 2)}
+
+
+def report(label: str, samples: List[float]) -> str:
+    stats = percentiles(samples)
+    if not stats["n"]:
+        return f"{label:40s} no samples"
+    return f"{label:40s} n={stats['n']:<5d} p50 {stats['p50_ms']:8.2f} ms  p99 {stats['p99_ms']:8.2f} ms  max {stats['max_ms']:8.2f} ms"
+
+
+class Timer:
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.started
+
+
+@asynccontextmanager
+async def running_api(stub_latency: float = 1.0, **settings):
+    """
+    main.app started through its lifespan, with the stub Granite model and
+    the hash embedding model; yields (main module, httpx.AsyncClient).
+    ``settings`` override attributes of main.settings before startup.
+    """
+    import httpx
+    import logging
+
+    import main
+
+    logging.disable(logging.WARNING)
+    main.settings.GRANITE_STUB_LATENCY = stub_latency
+    main.settings.AI_LOAD_IN_BACKGROUND = False
+    for name, value in settings.items():
+        setattr(main.settings, name, value)
+
+    async with main.app.router.lifespan_context(main.app):
+        main.granite_service.embeddings.attach(HashEmbeddingModel())
+        main.granite_service.embedding_model = main.granite_service.embeddings.model
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120.0) as client:
+            yield main, client
+
+
+async def auth_headers(client, email: str = "bench@example.com", password: str = "bench-password") -> Dict[str, str]:
+    """Register (or log in) a user and return its bearer header"""
+    response = await client.post("/auth/register", json={
+        "name": "Bench", "email": email, "password": password, "phone": "0", "location": "Madhapur"
+    })
+    if response.status_code != 200:
+        response = await client.post("/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
@@ -0,0 +1,161 @@
+"""
+Change tracking for derived embedding state.
+
+Profile and job mutations call ``ChangeTracker.mark`` which stamps the record
+with a new version and flags it dirty.  ``ReembedWorker`` runs as a background
+task, re-embeds only the dirty records in batches and hands the fresh vectors
+to an ``apply`` callback.  The callback runs synchronously on the event loop,
+so request handlers see either the whole batch or none of it.  A record that
+changes again while its batch is being encoded keeps its dirty flag and is
+picked up by the next batch instead of being overwritten with a stale vector.
+Versions are only kept while a record is dirty: once it has been re-embedded
+(or its vector removed, for a deleted record) the tracker forgets it.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RecordKey = Tuple[str, str]  # (kind, record id), e.g. ("job", "42")
+
+
+class ChangeTracker:
+    """Versioned dirty set keyed by (kind, id)"""
+
+    def __init__(self):
+        self._clock = 0
+        self._versions: Dict[RecordKey, int] = {}
+        self._dirty: Dict[RecordKey, int] = {}
+        self._event: Optional[asyncio.Event] = None
+        self.marked = 0
+        self.resolved = 0
+
+    def _signal(self) -> asyncio.Event:
+        if self._event is None:
+            self._event = asyncio.Event()
+        return self._event
+
+    def mark(self, kind: str, record_id: Any) -> int:
+        """Record a mutation and return the record's new version"""
+        key = (kind, str(record_id))
+        self._clock += 1
+        self._versions[key] = self._clock
+        self._dirty[key] = self._clock
+        self.marked += 1
+        self._signal().set()
+        return self._clock
+
+    def version(self, kind: str, record_id: Any) -> int:
+        """The record's current version while it is dirty, 0 once it has been resolved"""
+        return self._versions.get((kind, str(record_id)), 0)
+
+    def is_dirty(self, kind: str, record_id: Any) -> bool:
+        return (kind, str(record_id)) in self._dirty
+
+    def pending(self, limit: int) -> List[Tuple[str, str, int]]:
+        """Oldest dirty records first, as (kind, id, version)"""
+        batch = sorted(self._dirty.items(), key=lambda item: item[1])[:limit]
+        return [(kind, record_id, version) for (kind, record_id), version in batch]
+
+    def resolve(self, kind: str, record_id: str, version: int) -> bool:
+        """Clear the dirty flag and forget the record unless it changed again after ``version``"""
+        key = (kind, record_id)
+        if self._dirty.get(key) != version:
+            return False
+        del self._dirty[key]
+        del self._versions[key]
+        self.resolved += 1
+        return True
+
+    async def wait(self):
+        event = self._signal()
+        await event.wait()
+        event.clear()
+
+    def __len__(self) -> int:
+        return len(self._dirty)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "dirty": len(self._dirty),
+            "tracked": len(self._versions),
+            "marked": self.marked,
+            "resolved": self.resolved,
+            "version": self._clock
+        }
+
+
+class ReembedWorker:
+    """Background loop that re-embeds dirty records in batches"""
+
+    def __init__(
+        self,
+        tracker: ChangeTracker,
+        encode: Callable[[List[str]], Any],
+        load_text: Callable[[str, str], Awaitable[Optional[str]]],
+        apply: Callable[[List[Tuple[str, str, Any]], List[Tuple[str, str]]], None],
+        ready: Callable[[], bool] = lambda: True,
+        batch_size: int = 64,
+        debounce_seconds: float = 0.05,
+        retry_seconds: float = 1.0
+    ):
+        self.tracker = tracker
+        self.encode = encode
+        self.load_text = load_text
+        self.apply = apply
+        self.ready = ready
+        self.batch_size = batch_size
+        self.debounce_seconds = debounce_seconds
+        self.retry_seconds = retry_seconds
+        self.batches = 0
+        self.failures = 0
+
+    async def run(self):
+        while True:
+            if not len(self.tracker):
+                await self.tracker.wait()
+            # Let a burst of mutations accumulate into one batch
+            await asyncio.sleep(self.debounce_seconds)
+            while len(self.tracker):
+                if not self.ready():
+                    # Keep the records dirty until the embedding model is available
+                    await asyncio.sleep(self.retry_seconds)
+                    continue
+                try:
+                    await self.process_batch(self.tracker.pending(self.batch_size))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.failures += 1
+                    logger.error(f"Re-embedding batch failed: {str(e)}")
+                    await asyncio.sleep(self.retry_seconds)
+
+    async def process_batch(self, batch: List[Tuple[str, str, int]]):
+        to_encode = []
+        removals = []
+        for kind, record_id, version in batch:
+            text = await self.load_text(kind, record_id)
+            if text is None:
+                removals.append((kind, record_id, version))
+            else:
+                to_encode.append((kind, record_id, version, text))
+
+        vectors = await self.encode([text for _, _, _, text in to_encode]) if to_encode else []
+
+        # Skip records that were modified while the batch was encoding; they are still dirty
+        upserts = [
+            (kind, record_id, vector)
+            for (kind, record_id, version, _), vector in zip(to_encode, vectors)
+            if self.tracker.version(kind, record_id) == version
+        ]
+        deletes = [
+            (kind, record_id)
+            for kind, record_id, version in removals
+            if self.tracker.version(kind, record_id) == version
+        ]
+        self.apply(upserts, deletes)
+
+        for kind, record_id, version in batch:
+            self.tracker.resolve(kind, record_id, version)
+        self.batches += 1
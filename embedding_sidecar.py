@@ -0,0 +1,191 @@
+"""
+Local embedding sidecar shared by all uvicorn workers.
+
+Every worker that imports main.py would otherwise load its own copy of the
+sentence-transformer model.  Run one sidecar per host instead:
+
+    python embedding_sidecar.py --socket /tmp/fljobs-embeddings.sock
+
+and set ``EMBEDDING_SIDECAR_SOCKET`` to the same path.  The sidecar owns the
+only model; requests from all workers go through one ``EmbeddingBatcher``, so
+they are micro-batched and cached together.  Workers attach an
+``EmbeddingClient`` in place of the model; it keeps one connection open and
+reconnects once if the sidecar was restarted.  A timed-out request is not
+resent: the sidecar is still working on it, and a second copy would only
+add load while it is already behind.
+
+Wire format, both directions length-prefixed (network byte order):
+- request:  ``!I`` length, then a UTF-8 JSON list of texts
+- response: ``!BI`` status and length, then either ``!II`` rows and dim
+  followed by rows * dim little-endian float32 (status 0), or a UTF-8 error
+  message (status 1)
+
+A request longer than ``max_request_bytes`` gets an error reply and the
+connection is closed without reading the body.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+from embeddings import EmbeddingBatcher, EmbeddingStore
+
+logger = logging.getLogger(__name__)
+
+_REQUEST_HEADER = struct.Struct("!I")
+_RESPONSE_HEADER = struct.Struct("!BI")
+_SHAPE = struct.Struct("!II")
+
+
+def _encode_response(vectors: np.ndarray) -> bytes:
+    rows, dim = vectors.shape if vectors.size else (0, 0)
+    payload = _SHAPE.pack(rows, dim) + np.ascontiguousarray(vectors, dtype="<f4").tobytes()
+    return _RESPONSE_HEADER.pack(0, len(payload)) + payload
+
+
+def _encode_error(message: str) -> bytes:
+    payload = message.encode("utf-8")
+    return _RESPONSE_HEADER.pack(1, len(payload)) + payload
+
+
+class EmbeddingClient:
+    """
+    Stands in for a SentenceTransformer model: ``encode`` forwards the texts
+    to the sidecar over a persistent Unix socket connection.  Blocking, like
+    the model it replaces; EmbeddingBatcher calls it from its worker thread.
+    """
+
+    def __init__(self, socket_path: str, timeout_seconds: float = 30.0):
+        self.socket_path = socket_path
+        self.timeout_seconds = timeout_seconds
+        self._sock: Optional[socket.socket] = None
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connects = 0
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout_seconds)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+        self.connects += 1
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def encode(self, sentences: Sequence[str], batch_size: Optional[int] = None,
+               convert_to_numpy: bool = True, show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        payload = json.dumps(list(sentences)).encode("utf-8")
+        request = _REQUEST_HEADER.pack(len(payload)) + payload
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self.connect()
+                    self._sock.sendall(request)
+                    status, length = _RESPONSE_HEADER.unpack(self._recv_exactly(_RESPONSE_HEADER.size))
+                    body = self._recv_exactly(length)
+                    break
+                except OSError as e:
+                    # The stream is out of step after any error, so the connection goes either way
+                    self.close()
+                    # Only a dropped connection (sidecar restarted) is retried, not a timeout
+                    if attempt or not isinstance(e, ConnectionError):
+                        raise
+        self.requests += 1
+
+        if status != 0:
+            raise RuntimeError(f"Embedding sidecar error: {body.decode('utf-8', 'replace')}")
+        rows, dim = _SHAPE.unpack_from(body)
+        return np.frombuffer(body, dtype="<f4", offset=_SHAPE.size).reshape(rows, dim)
+
+    def _recv_exactly(self, size: int) -> bytes:
+        chunks = bytearray()
+        while len(chunks) < size:
+            chunk = self._sock.recv(size - len(chunks))
+            if not chunk:
+                raise ConnectionError("Embedding sidecar closed the connection")
+            chunks += chunk
+        return bytes(chunks)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"socket": self.socket_path, "requests": self.requests, "connects": self.connects}
+
+
+async def serve(socket_path: str, model, window_ms: float = 5.0, max_batch_size: int = 64, cache_entries: int = 10000,
+                max_request_bytes: int = 16 * 1024 * 1024):
+    """Serve ``model`` on ``socket_path`` until cancelled"""
+    batcher = EmbeddingBatcher(EmbeddingStore(max_entries=cache_entries), window_ms, max_batch_size)
+    batcher.attach(model)
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                (length,) = _REQUEST_HEADER.unpack(await reader.readexactly(_REQUEST_HEADER.size))
+                if length > max_request_bytes:
+                    # The body is never read, so the stream cannot be resynchronised
+                    writer.write(_encode_error(f"request of {length} bytes exceeds the {max_request_bytes} byte limit"))
+                    await writer.drain()
+                    break
+                body = await reader.readexactly(length)
+                try:
+                    texts = json.loads(body)
+                    if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                        raise ValueError("request must be a JSON list of strings")
+                    writer.write(_encode_response(await batcher.encode(texts)))
+                except Exception as e:
+                    writer.write(_encode_error(str(e)))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = await asyncio.start_unix_server(handle, path=socket_path)
+    logger.info("Embedding sidecar listening on %s", socket_path)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batcher.shutdown()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared sentence-transformer embedding server")
+    parser.add_argument("--socket", default="/tmp/fljobs-embeddings.sock")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--window-ms", type=float, default=5.0)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--cache-entries", type=int, default=10000)
+    parser.add_argument("--max-request-bytes", type=int, default=16 * 1024 * 1024)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(args.model)
+    try:
+        asyncio.run(serve(args.socket, model, args.window_ms, args.max_batch_size, args.cache_entries,
+                          args.max_request_bytes))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Cached, micro-batched sentence-transformer embeddings.
+
+Match scoring used to call ``embedding_model.encode`` with a batch of one,
+twice per request, re-embedding the same candidate and job texts every time.
+``EmbeddingStore`` keeps unit-length float32 vectors keyed by text hash in an
+LRU, and ``EmbeddingBatcher`` gathers cache misses from concurrent requests
+for a few milliseconds and encodes them in a single ``encode`` call on a
+background thread.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from metrics import Histogram
+
+EMBEDDING_ENCODE_SECONDS = Histogram(
+    "embedding_encode_seconds", "Time of one batched sentence-transformer encode call"
+)
+EMBEDDING_BATCH_SIZE = Histogram(
+    "embedding_batch_size", "Texts per batched encode call", buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Return float32 rows scaled to unit length (zero rows stay zero)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class EmbeddingStore:
+    """LRU of normalized embeddings keyed by the SHA-1 of the text"""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = text_key(text)
+        with self._lock:
+            vector = self._vectors.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._vectors.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, text: str, vector: np.ndarray):
+        key = text_key(text)
+        vector = np.ascontiguousarray(vector, dtype=np.float32)
+        vector.setflags(write=False)
+        with self._lock:
+            self._vectors[key] = vector
+            self._vectors.move_to_end(key)
+            while len(self._vectors) > self.max_entries:
+                self._vectors.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, text: str):
+        with self._lock:
+            self._vectors.pop(text_key(text), None)
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._vectors),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class EmbeddingBatcher:
+    """
+    Async front-end to a sentence-transformer model.
+
+    ``encode`` answers from the store when it can.  Misses are queued, and
+    after ``window_ms`` (or as soon as ``max_batch_size`` texts are waiting)
+    everything queued is encoded in one call on a dedicated thread, so the
+    event loop never runs the model itself.
+    """
+
+    def __init__(self, store: Optional[EmbeddingStore] = None, window_ms: float = 5.0, max_batch_size: int = 64):
+        self.model = None
+        self.store = store or EmbeddingStore()
+        self.window_seconds = window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._futures: Dict[str, asyncio.Future] = {}
+        self._queue: List[str] = []
+        self._flush_task: Optional[asyncio.Task] = None
+
+        self.batches = 0
+        self.encoded_texts = 0
+        self.largest_batch = 0
+
+    def attach(self, model):
+        """Set the sentence-transformer model used for encoding"""
+        self.model = model
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+
+    def shutdown(self):
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        self._fail_pending(RuntimeError("Embedding batcher shut down"))
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def encode(self, texts: Sequence[str]) -> np.ndarray:
+        """Return an (n, dim) float32 matrix of unit-length embeddings for ``texts``"""
+        if self.model is None:
+            raise RuntimeError("Embedding model not loaded")
+
+        loop = asyncio.get_running_loop()
+        rows: List[Optional[np.ndarray]] = [None] * len(texts)
+        waiting = []
+
+        for i, text in enumerate(texts):
+            vector = self.store.get(text)
+            if vector is not None:
+                rows[i] = vector
+                continue
+            future = self._futures.get(text)
+            if future is None:
+                future = loop.create_future()
+                self._futures[text] = future
+                self._queue.append(text)
+            waiting.append((i, future))
+
+        if waiting:
+            self._schedule_flush()
+            # Shielded so one cancelled request cannot cancel a vector others are waiting for;
+            # every future is awaited, so a failed batch does not leave unretrieved exceptions
+            vectors = await asyncio.gather(*[asyncio.shield(future) for _, future in waiting], return_exceptions=True)
+            for (i, _), vector in zip(waiting, vectors):
+                if isinstance(vector, BaseException):
+                    raise vector
+                rows[i] = vector
+
+        return np.vstack(rows) if rows else np.empty((0, 0), dtype=np.float32)
+
+    async def encode_one(self, text: str) -> np.ndarray:
+        return (await self.encode([text]))[0]
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self._flush_loop())
+
+    async def _flush_loop(self):
+        try:
+            while self._queue:
+                if len(self._queue) < self.max_batch_size:
+                    await asyncio.sleep(self.window_seconds)
+                batch = self._queue[:self.max_batch_size]
+                del self._queue[:len(batch)]
+                await self._encode_batch(batch)
+        except asyncio.CancelledError:
+            self._fail_pending(RuntimeError("Embedding batcher stopped"))
+            raise
+
+    def _fail_pending(self, error: Exception):
+        """Fail every queued or encoding text, so no caller waits forever"""
+        for future in self._futures.values():
+            if not future.done():
+                future.set_exception(error)
+                # Callers that already left would otherwise log it as never retrieved
+                future.exception()
+        self._futures.clear()
+        self._queue.clear()
+
+    async def _encode_batch(self, batch: List[str]):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            vectors = await loop.run_in_executor(self._executor, self._encode_sync, batch)
+        except Exception as e:
+            for text in batch:
+                future = self._futures.pop(text, None)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+
+        EMBEDDING_ENCODE_SECONDS.observe(time.perf_counter() - started)
+        EMBEDDING_BATCH_SIZE.observe(len(batch))
+        self.batches += 1
+        self.encoded_texts += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+
+        for text, vector in zip(batch, vectors):
+            self.store.put(text, vector)
+            future = self._futures.pop(text, None)
+            if future is not None and not future.done():
+                future.set_result(vector)
+
+    def _encode_sync(self, batch: List[str]) -> np.ndarray:
+        vectors = self.model.encode(
+            batch,
+            batch_size=len(batch),
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return normalize_rows(vectors)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cache": self.store.stats(),
+            "batches": self.batches,
+            "encoded_texts": self.encoded_texts,
+            "largest_batch": self.largest_batch,
+            "queued": len(self._queue),
+            "avg_batch_size": round(self.encoded_texts / self.batches, 2) if self.batches else 0.0
+        }
@@ -0,0 +1,236 @@
+"""
+Per-task Granite generation profiles and prompt token budgets.
+
+Every kind of generation has a ``TaskProfile`` with its own token cap, stop
+sequences and sampling parameters, so a two-sentence summary cannot run on
+for 800 tokens and a match analysis does not sample at the temperature used
+for marketing copy.  ``GENERATION_PROFILES`` is the registry, keyed by task
+name.
+
+Each profile also has a prompt budget (``max_prompt_tokens``).
+``fill_prompt`` substitutes the fields of a prompt template and, when they
+would not fit, trims the longest ones with ``fit_text``, which cuts at a
+paragraph, sentence or word boundary.  The cut only depends on the text and
+the allowance, so the same input always produces the same prompt and keeps
+hitting the LLM response cache.
+
+The Granite tokenizer is not available offline, so token counts are
+estimates (``estimate_tokens``) that err on the high side for English text.
+``TaskMetrics`` keeps calls, cache hits, token counts and latency per task,
+and exports them as Prometheus metrics labelled by task.
+"""
+import re
+from bisect import bisect_right
+from itertools import islice
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Tuple
+
+from granite_runtime import LatencyWindow
+from metrics import Counter, Histogram
+
+# One estimated token: up to four word characters, or one punctuation mark
+_TOKEN = re.compile(r"\w{1,4}|[^\w\s]")
+_BOUNDARIES = (re.compile(r"\n\s*\n"), re.compile(r"(?<=[.!?])\s"), re.compile(r"\s"))
+
+TRUNCATION_MARK = " ..."
+
+
+class TaskProfile(NamedTuple):
+    name: str
+    max_new_tokens: int
+    max_prompt_tokens: int
+    decoding_method: str = "sample"  # "sample" or "greedy"
+    temperature: float = 0.7
+    top_p: float = 0.9
+    repetition_penalty: float = 1.1
+    min_new_tokens: int = 0
+    stop_sequences: Tuple[str, ...] = ()
+
+    def params(self) -> Dict[str, Any]:
+        """watsonx.ai ``generate_text`` parameters"""
+        params: Dict[str, Any] = {
+            "decoding_method": self.decoding_method,
+            "max_new_tokens": self.max_new_tokens,
+            "min_new_tokens": self.min_new_tokens,
+            "repetition_penalty": self.repetition_penalty
+        }
+        if self.decoding_method == "sample":
+            params["temperature"] = self.temperature
+            params["top_p"] = self.top_p
+        if self.stop_sequences:
+            params["stop_sequences"] = list(self.stop_sequences)
+        return params
+
+
+GENERATION_PROFILES: Dict[str, TaskProfile] = {
+    profile.name: profile for profile in (
+        # Full job posting from the form fields
+        TaskProfile("description", max_new_tokens=800, max_prompt_tokens=1024),
+        # Description and summary from one structured prompt ("single_call" mode)
+        TaskProfile("description_and_summary", max_new_tokens=1000, max_prompt_tokens=1024),
+        # Two or three sentences; a blank line means the model has moved on to commentary
+        TaskProfile("summary", max_new_tokens=200, max_prompt_tokens=768, temperature=0.5,
+                    min_new_tokens=10, stop_sequences=("\n\n",)),
+        # Candidate/job comparison: deterministic, so equal inputs give equal analyses
+        TaskProfile("match_analysis", max_new_tokens=400, max_prompt_tokens=1536,
+                    decoding_method="greedy", repetition_penalty=1.05),
+        # Longer posting with preferred qualifications and growth sections
+        TaskProfile("smart_description", max_new_tokens=900, max_prompt_tokens=1024)
+    )
+}
+
+
+_TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 768, 1024, 1536, 2048)
+_TASK_EVENTS = ("cache_hit", "error", "truncated_prompt", "token_cap_hit")
+
+GRANITE_CALL_SECONDS = Histogram(
+    "granite_call_seconds", "Granite generation time per task, hedges and streaming included",
+    labelnames=("task",), label_sets=[(task,) for task in GENERATION_PROFILES]
+)
+GRANITE_PROMPT_TOKENS = Histogram(
+    "granite_prompt_tokens", "Prompt tokens per Granite generation", buckets=_TOKEN_BUCKETS,
+    labelnames=("task",), label_sets=[(task,) for task in GENERATION_PROFILES]
+)
+GRANITE_GENERATED_TOKENS = Histogram(
+    "granite_generated_tokens", "Generated tokens per Granite generation", buckets=_TOKEN_BUCKETS,
+    labelnames=("task",), label_sets=[(task,) for task in GENERATION_PROFILES]
+)
+GRANITE_TASK_EVENTS = Counter(
+    "granite_task_events_total", "Cache hits, errors, truncated prompts and token cap hits per generation task",
+    labelnames=("task", "event"), label_sets=[(task, event) for task in GENERATION_PROFILES for event in _TASK_EVENTS]
+)
+
+
+def task_profile(task: str) -> TaskProfile:
+    try:
+        return GENERATION_PROFILES[task]
+    except KeyError:
+        raise KeyError(f"Unknown generation task {task!r}; expected one of {sorted(GENERATION_PROFILES)}") from None
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    Approximate token count of ``text``: common words are one token, longer
+    words, numbers and rare strings one per four characters, punctuation one per mark
+    """
+    return len(_TOKEN.findall(text)) if text else 0
+
+
+def fit_text(text: str, max_tokens: int) -> str:
+    """
+    ``text`` cut to about ``max_tokens`` tokens (including the truncation
+    mark), ending at the last paragraph, sentence or word boundary that keeps
+    at least half of the allowance; unchanged if it already fits.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    allowance = max_tokens - estimate_tokens(TRUNCATION_MARK)
+    if allowance <= 0:
+        return ""
+
+    # End offset of each of the first ``allowance`` tokens; the text is cut at or before the last one
+    ends = [match.end() for match in islice(_TOKEN.finditer(text), allowance)]
+    end = ends[-1]
+    head = text[:end + 1]
+    for boundary in _BOUNDARIES:
+        cut = None
+        for match in boundary.finditer(head):
+            cut = match.start()
+        # Tokens kept by cutting here
+        if cut is not None and bisect_right(ends, cut) * 2 >= allowance:
+            end = cut
+            break
+    return text[:end].rstrip() + TRUNCATION_MARK
+
+
+def fill_prompt(profile: TaskProfile, template: str, **fields: Any) -> Tuple[str, bool]:
+    """
+    ``template.format(**fields)`` within ``profile.max_prompt_tokens``.
+
+    Fields that fit in an equal share of what the template leaves keep all
+    their text and pass their unused share on; the longer ones are cut with
+    ``fit_text`` to what is left.  Returns the prompt and whether anything
+    was cut.
+    """
+    values = {name: "" if value is None else str(value) for name, value in fields.items()}
+    sizes = {name: estimate_tokens(value) for name, value in values.items()}
+    budget = profile.max_prompt_tokens - estimate_tokens(template.format(**{name: "" for name in values}))
+    if sum(sizes.values()) <= budget:
+        return template.format(**values), False
+
+    budget = max(0, budget)
+    remaining = sorted(values, key=lambda name: (sizes[name], name))
+    while remaining:
+        share = budget // len(remaining)
+        name = remaining[0]
+        if sizes[name] > share:
+            break
+        budget -= sizes[name]
+        remaining.pop(0)
+    for name in remaining:
+        values[name] = fit_text(values[name], budget // len(remaining))
+    return template.format(**values), True
+
+
+class TaskMetrics:
+    """Calls, cache hits, errors, token counts and latency per generation task"""
+
+    def __init__(self, tasks: Iterable[str]):
+        self._tasks: Dict[str, Dict[str, Any]] = {}
+        # The task's Prometheus children, looked up once
+        self._series: Dict[str, Dict[str, Any]] = {}
+        for task in tasks:
+            self._counters(task)
+
+    def _counters(self, task: str) -> Dict[str, Any]:
+        counters = self._tasks.get(task)
+        if counters is None:
+            counters = self._tasks[task] = {
+                "calls": 0, "cache_hits": 0, "errors": 0, "truncated_prompts": 0, "token_cap_hits": 0,
+                "prompt_tokens": 0, "generated_tokens": 0, "latency": LatencyWindow()
+            }
+            self._series[task] = {
+                "seconds": GRANITE_CALL_SECONDS.labels(task),
+                "prompt_tokens": GRANITE_PROMPT_TOKENS.labels(task),
+                "generated_tokens": GRANITE_GENERATED_TOKENS.labels(task),
+                **{event: GRANITE_TASK_EVENTS.labels(task, event) for event in _TASK_EVENTS}
+            }
+        return counters
+
+    def record_call(self, task: str, seconds: float, prompt_tokens: int, generated_tokens: int,
+                    stop_reason: Optional[str] = None):
+        counters = self._counters(task)
+        series = self._series[task]
+        counters["calls"] += 1
+        counters["prompt_tokens"] += prompt_tokens
+        counters["generated_tokens"] += generated_tokens
+        if stop_reason == "max_tokens":
+            counters["token_cap_hits"] += 1
+            series["token_cap_hit"].inc()
+        counters["latency"].record(seconds)
+        series["seconds"].observe(seconds)
+        series["prompt_tokens"].observe(prompt_tokens)
+        series["generated_tokens"].observe(generated_tokens)
+
+    def record_cache_hit(self, task: str):
+        self._counters(task)["cache_hits"] += 1
+        self._series[task]["cache_hit"].inc()
+
+    def record_error(self, task: str):
+        self._counters(task)["errors"] += 1
+        self._series[task]["error"].inc()
+
+    def record_truncation(self, task: str):
+        self._counters(task)["truncated_prompts"] += 1
+        self._series[task]["truncated_prompt"].inc()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        stats = {}
+        for task, counters in self._tasks.items():
+            calls = counters["calls"]
+            stats[task] = {
+                **{name: value for name, value in counters.items() if name != "latency"},
+                "avg_prompt_tokens": round(counters["prompt_tokens"] / calls, 1) if calls else None,
+                "avg_generated_tokens": round(counters["generated_tokens"] / calls, 1) if calls else None,
+                "latency": counters["latency"].stats()
+            }
+        return stats
@@ -0,0 +1,216 @@
+"""
+Grid spatial index over latitude/longitude points.
+
+Points are bucketed into square cells of ``cell_degrees`` (0.01 degrees is
+about 1.1 km of latitude).  A radius query only looks at the cells that
+overlap the circle's bounding box and then computes exact haversine
+distances for those candidates with numpy; a k-nearest query walks rings of
+cells outwards from the query point (starting at the first ring that reaches
+the indexed area) until no unvisited cell can contain a closer point, every
+point has been seen, or the cells and points the walk has touched exceed an
+eighth of the index, at which point one vectorized pass over all points is
+cheaper (gathering a point from a cell costs several times more than
+including it in that pass).
+Points can be added, moved and removed at any time.
+"""
+import math
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_M / 180.0
+
+Cell = Tuple[int, int]
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in meters; works elementwise on numpy arrays"""
+    lat1, lon1, lat2, lon2 = (np.radians(value) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class GeoIndex:
+    def __init__(self, cell_degrees: float = 0.01, initial_capacity: int = 1024):
+        self.cell_degrees = cell_degrees
+        self._cells: Dict[Cell, Dict[int, None]] = {}
+        self._slots: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []
+        self._free: List[int] = []
+        self._lat = np.zeros(initial_capacity, dtype=np.float64)
+        self._lon = np.zeros(initial_capacity, dtype=np.float64)
+        # Cell index range in use (min lat, max lat, min lon, max lon); bounds the k-nearest walk
+        self._bounds: Optional[List[int]] = None
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, item_id: str) -> bool:
+        return str(item_id) in self._slots
+
+    def _cell(self, lat: float, lon: float) -> Cell:
+        return int(math.floor(lat / self.cell_degrees)), int(math.floor(lon / self.cell_degrees))
+
+    def _grow(self, size: int):
+        if size <= len(self._lat):
+            return
+        capacity = max(size, len(self._lat) * 2)
+        self._lat = np.concatenate([self._lat, np.zeros(capacity - len(self._lat))])
+        self._lon = np.concatenate([self._lon, np.zeros(capacity - len(self._lon))])
+
+    def add(self, item_id: str, lat: float, lon: float):
+        """Insert or move a point"""
+        item_id = str(item_id)
+        self.remove(item_id)
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = len(self._ids)
+            self._ids.append(None)
+            self._grow(slot + 1)
+        self._slots[item_id] = slot
+        self._ids[slot] = item_id
+        self._lat[slot] = lat
+        self._lon[slot] = lon
+        cell = self._cell(lat, lon)
+        self._cells.setdefault(cell, {})[slot] = None
+        if self._bounds is None:
+            self._bounds = [cell[0], cell[0], cell[1], cell[1]]
+        else:
+            bounds = self._bounds
+            bounds[0], bounds[1] = min(bounds[0], cell[0]), max(bounds[1], cell[0])
+            bounds[2], bounds[3] = min(bounds[2], cell[1]), max(bounds[3], cell[1])
+
+    def add_many(self, item_ids: Iterable[str], lats: Iterable[float], lons: Iterable[float]):
+        for item_id, lat, lon in zip(item_ids, lats, lons):
+            self.add(item_id, float(lat), float(lon))
+
+    def remove(self, item_id: str) -> bool:
+        slot = self._slots.pop(str(item_id), None)
+        if slot is None:
+            return False
+        cell = self._cell(self._lat[slot], self._lon[slot])
+        members = self._cells[cell]
+        del members[slot]
+        if not members:
+            del self._cells[cell]
+            bounds = self._bounds
+            if cell[0] in (bounds[0], bounds[1]) or cell[1] in (bounds[2], bounds[3]):
+                self._bounds = self._cell_bounds()
+        self._ids[slot] = None
+        self._free.append(slot)
+        return True
+
+    def _cell_bounds(self) -> Optional[List[int]]:
+        if not self._cells:
+            return None
+        rows = [cell[0] for cell in self._cells]
+        cols = [cell[1] for cell in self._cells]
+        return [min(rows), max(rows), min(cols), max(cols)]
+
+    def location(self, item_id: str) -> Optional[Tuple[float, float]]:
+        slot = self._slots.get(str(item_id))
+        return (float(self._lat[slot]), float(self._lon[slot])) if slot is not None else None
+
+    def _gather(self, cells: Iterable[Cell]) -> np.ndarray:
+        members = [self._cells[cell] for cell in cells if cell in self._cells]
+        total = sum(len(m) for m in members)
+        return np.fromiter(chain.from_iterable(members), dtype=np.int64, count=total)
+
+    def _results(self, slots: np.ndarray, distances: np.ndarray) -> List[Tuple[str, float]]:
+        order = np.lexsort((slots, distances))
+        return [(self._ids[slots[i]], float(distances[i])) for i in order]
+
+    def within(self, lat: float, lon: float, radius_m: float, limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """(id, meters) of every point within ``radius_m``, nearest first"""
+        if not self._slots or radius_m < 0:
+            return []
+        dlat = radius_m / METERS_PER_DEGREE_LAT
+        dlon = radius_m / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 1e-6))
+        lat_lo, lon_lo = self._cell(lat - dlat, lon - dlon)
+        lat_hi, lon_hi = self._cell(lat + dlat, lon + dlon)
+
+        if (lat_hi - lat_lo + 1) * (lon_hi - lon_lo + 1) > len(self._cells):
+            cells = [cell for cell in self._cells
+                     if lat_lo <= cell[0] <= lat_hi and lon_lo <= cell[1] <= lon_hi]
+        else:
+            cells = [(i, j) for i in range(lat_lo, lat_hi + 1) for j in range(lon_lo, lon_hi + 1)]
+        slots = self._gather(cells)
+        if not len(slots):
+            return []
+
+        distances = haversine_m(lat, lon, self._lat[slots], self._lon[slots])
+        inside = distances <= radius_m
+        slots, distances = slots[inside], distances[inside]
+        if limit is not None and len(slots) > limit:
+            top = np.argpartition(distances, limit - 1)[:limit]
+            slots, distances = slots[top], distances[top]
+        return self._results(slots, distances)
+
+    def nearest(self, lat: float, lon: float, k: int = 10, max_radius_m: Optional[float] = None) -> List[Tuple[str, float]]:
+        """The ``k`` closest points (optionally only within ``max_radius_m``), nearest first"""
+        if not self._slots or k <= 0:
+            return []
+        center = self._cell(lat, lon)
+        lat_lo, lat_hi, lon_lo, lon_hi = self._bounds
+        # Rings before ``first_ring`` lie entirely outside the indexed area
+        first_ring = max(0, lat_lo - center[0], center[0] - lat_hi, lon_lo - center[1], center[1] - lon_hi)
+        max_ring = max(abs(center[0] - lat_lo), abs(center[0] - lat_hi), abs(center[1] - lon_lo), abs(center[1] - lon_hi))
+
+        slots = np.empty(0, dtype=np.int64)
+        distances = np.empty(0, dtype=np.float64)
+        looked_up = 0
+        for ring in range(first_ring, max_ring + 1):
+            if (looked_up + len(slots)) * 8 > len(self._slots):
+                slots, distances = self._all_distances(lat, lon)
+                break
+            cells = self._ring(center, ring)
+            looked_up += len(cells)
+            found = self._gather(cells)
+            if len(found):
+                slots = np.concatenate([slots, found])
+                distances = np.concatenate([distances, haversine_m(lat, lon, self._lat[found], self._lon[found])])
+            if len(slots) >= len(self._slots):
+                break
+            # Every point outside the rings searched so far is at least ``covered`` meters away;
+            # cells are narrowest in meters on their side furthest from the equator
+            furthest_lat = min(abs(lat) + (ring + 1) * self.cell_degrees, 89.9)
+            covered = ring * self.cell_degrees * METERS_PER_DEGREE_LAT * math.cos(math.radians(furthest_lat))
+            if max_radius_m is not None and covered >= max_radius_m:
+                break
+            if len(slots) >= k and np.partition(distances, k - 1)[k - 1] <= covered:
+                break
+
+        if max_radius_m is not None:
+            inside = distances <= max_radius_m
+            slots, distances = slots[inside], distances[inside]
+        if len(slots) > k:
+            top = np.argpartition(distances, k - 1)[:k]
+            slots, distances = slots[top], distances[top]
+        return self._results(slots, distances)
+
+    def _ring(self, center: Cell, ring: int) -> List[Cell]:
+        """Cells on the square ring ``ring`` cells out from ``center``, clipped to the indexed area"""
+        if ring == 0:
+            return [center]
+        lat_lo, lat_hi, lon_lo, lon_hi = self._bounds
+        row_lo, row_hi = max(center[0] - ring, lat_lo), min(center[0] + ring, lat_hi)
+        col_lo, col_hi = max(center[1] - ring, lon_lo), min(center[1] + ring, lon_hi)
+        cells = []
+        for row in (center[0] - ring, center[0] + ring):
+            if lat_lo <= row <= lat_hi:
+                cells.extend((row, col) for col in range(col_lo, col_hi + 1))
+        # The sides, without the corners already in the top and bottom rows
+        row_lo, row_hi = max(row_lo, center[0] - ring + 1), min(row_hi, center[0] + ring - 1)
+        for col in (center[1] - ring, center[1] + ring):
+            if lon_lo <= col <= lon_hi:
+                cells.extend((row, col) for row in range(row_lo, row_hi + 1))
+        return cells
+
+    def _all_distances(self, lat: float, lon: float) -> Tuple[np.ndarray, np.ndarray]:
+        slots = np.arange(len(self._ids))
+        if self._free:
+            slots = np.delete(slots, self._free)
+        return slots, haversine_m(lat, lon, self._lat[slots], self._lon[slots])
@@ -0,0 +1,459 @@
+"""
+Async execution helpers for IBM Granite text generation.
+
+The watsonx.ai SDK is synchronous, so every generation call is pushed onto a
+dedicated thread pool.  A semaphore caps how many generations are in flight
+at once and every call gets its own timeout, which keeps the event loop free
+to serve auth, store and location requests while Granite is working.
+Streaming generations run the SDK's blocking token iterator on the same pool
+and hand each chunk back to the event loop as it arrives.
+
+``CircuitBreaker`` watches the error rate and latency of recent calls and,
+while Granite is unhealthy, rejects calls at once so callers go straight to
+their fallbacks instead of each waiting out a timeout.  ``hedged`` starts a
+second attempt when the first is slow or fails.
+"""
+import asyncio
+import functools
+import logging
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+# Section markers for single-call description + summary generation
+DESCRIPTION_MARKER = "### DESCRIPTION"
+SUMMARY_MARKER = "### SUMMARY"
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+def split_description_and_summary(text: str) -> Tuple[str, str]:
+    """
+    Split a single-call generation into (description, summary).
+
+    Models do not always follow the requested layout, so this is tolerant:
+    marker case is ignored, a missing description marker means the text
+    before the summary is the description, and a missing summary marker
+    falls back to the first two sentences of the description.
+    """
+    lowered = text.lower()
+    summary_at = lowered.rfind(SUMMARY_MARKER.lower())
+    if summary_at >= 0:
+        body = text[:summary_at]
+        summary = text[summary_at + len(SUMMARY_MARKER):].strip()
+    else:
+        body = text
+        summary = ""
+
+    description_at = body.lower().find(DESCRIPTION_MARKER.lower())
+    if description_at >= 0:
+        body = body[description_at + len(DESCRIPTION_MARKER):]
+    description = body.strip()
+
+    if not summary:
+        summary = " ".join(_SENTENCE_END.split(description.replace("\n", " "))[:2]).strip()
+    return description, summary
+
+
+class GraniteUnavailableError(Exception):
+    """A generation could not be produced (no client, error, timeout or open circuit)"""
+
+
+class CircuitOpenError(GraniteUnavailableError):
+    def __init__(self, retry_after: float):
+        super().__init__(f"circuit open, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker over the outcomes of recent calls.
+
+    Closed: the last ``window`` calls are tracked, and once there are at
+    least ``min_calls`` the circuit opens when the share of failures reaches
+    ``error_threshold`` or the share of calls slower than
+    ``slow_call_seconds`` reaches ``slow_threshold``.  Open: every call is
+    rejected for ``open_seconds``.  Half-open: ``half_open_probes`` calls go
+    through; if they all succeed in time the circuit closes, otherwise it
+    opens again.  Used from the event loop only, so there is no locking.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, window: int = 20, min_calls: int = 5, error_threshold: float = 0.5,
+                 slow_call_seconds: float = 20.0, slow_threshold: float = 0.8, open_seconds: float = 30.0,
+                 half_open_probes: int = 1, clock: Callable[[], float] = time.monotonic):
+        self.min_calls = max(1, min_calls)
+        self.error_threshold = error_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_threshold = slow_threshold
+        self.open_seconds = open_seconds
+        self.half_open_probes = max(1, half_open_probes)
+        self._clock = clock
+        self._outcomes: deque = deque(maxlen=max(window, self.min_calls))  # (failed, slow)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.trips = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+        return self._state
+
+    @property
+    def rejecting(self) -> bool:
+        """Whether a call started now would be rejected"""
+        state = self.state
+        return state == self.OPEN or (state == self.HALF_OPEN and self._probes_in_flight >= self.half_open_probes)
+
+    def retry_after(self) -> float:
+        return max(0.0, self._opened_at + self.open_seconds - self._clock()) if self._state == self.OPEN else 0.0
+
+    def try_acquire(self) -> Optional[str]:
+        """
+        Admit a call: returns "call" or "probe" (half-open), to be passed to
+        ``record`` or ``release``, or None if the call is rejected.
+        """
+        if self.rejecting:
+            self.rejected += 1
+            return None
+        if self.state == self.HALF_OPEN:
+            self._probes_in_flight += 1
+            return "probe"
+        return "call"
+
+    def release(self, ticket: str):
+        """The admitted call was abandoned without an outcome (e.g. cancelled)"""
+        if ticket == "probe" and self._state == self.HALF_OPEN:
+            self._probes_in_flight -= 1
+
+    def record(self, ticket: str, ok: bool, seconds: float):
+        slow = seconds >= self.slow_call_seconds
+        if ticket == "probe":
+            if self._state != self.HALF_OPEN:
+                return
+            self._probes_in_flight -= 1
+            if not ok or slow:
+                self._open()
+            else:
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_probes:
+                    logger.info("Granite circuit closed")
+                    self._state = self.CLOSED
+                    self._outcomes.clear()
+            return
+        if self._state != self.CLOSED:
+            return  # a call admitted before the circuit opened
+        self._outcomes.append((not ok, slow))
+        calls = len(self._outcomes)
+        if calls < self.min_calls:
+            return
+        failures = sum(failed for failed, _ in self._outcomes)
+        slow_calls = sum(slow for _, slow in self._outcomes)
+        if failures / calls >= self.error_threshold or slow_calls / calls >= self.slow_threshold:
+            self._open()
+
+    def _open(self):
+        logger.warning(f"Granite circuit open for {self.open_seconds:.0f}s")
+        self._state = self.OPEN
+        self._opened_at = self._clock()
+        self._outcomes.clear()
+        self.trips += 1
+
+    def stats(self) -> Dict[str, Any]:
+        calls = len(self._outcomes)
+        return {
+            "state": self.state,
+            "window_calls": calls,
+            "error_rate": round(sum(failed for failed, _ in self._outcomes) / calls, 3) if calls else 0.0,
+            "slow_rate": round(sum(slow for _, slow in self._outcomes) / calls, 3) if calls else 0.0,
+            "trips": self.trips,
+            "rejected": self.rejected
+        }
+
+
+async def hedged(attempt: Callable[[], Awaitable[T]], hedge_after: Optional[float] = None, max_attempts: int = 2,
+                 can_hedge: Callable[[], bool] = lambda: True, retry_delay: float = 0.25) -> T:
+    """
+    Await ``attempt()``, starting another one when the running attempts have
+    all failed or none has finished after ``hedge_after`` seconds, up to
+    ``max_attempts`` in total and only while ``can_hedge()``.  A retry after
+    a failure waits ``retry_delay`` seconds (with jitter) first.  The first
+    success wins and the other attempts are cancelled; if every attempt
+    fails the last error is raised.  Without ``hedge_after`` or with one
+    attempt this is a plain await.
+    """
+    if hedge_after is None or max_attempts <= 1:
+        return await attempt()
+    pending = {asyncio.ensure_future(attempt())}
+    started = 1
+    last_error: Optional[BaseException] = None
+    try:
+        while pending:
+            timeout = hedge_after if started < max_attempts else None
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                last_error = task.exception()
+            if started < max_attempts and (not done or not pending):
+                if not pending and retry_delay > 0:
+                    # Retrying straight away mostly runs into the same failure
+                    await asyncio.sleep(retry_delay * random.uniform(0.5, 1.5))
+                if can_hedge():
+                    pending.add(asyncio.ensure_future(attempt()))
+                    started += 1
+        raise last_error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+class GraniteRunner:
+    """Runs blocking Granite SDK calls off the event loop with a concurrency cap"""
+
+    def __init__(self, max_concurrency: int = 4, timeout_seconds: float = 60.0):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.timeout_seconds = timeout_seconds
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.waiting = 0
+
+    def start(self):
+        """Create the worker pool (called lazily on first use as well)"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrency,
+                thread_name_prefix="granite"
+            )
+
+    def shutdown(self):
+        """Release worker threads; calls still running are not waited for"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._semaphore = None
+
+    async def run(self, func: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Run ``func(*args, **kwargs)`` on the Granite pool.
+
+        The timeout covers both the wait for a free slot and the call itself.
+        Raises ``asyncio.TimeoutError`` when it expires; the worker thread is
+        left to finish in the background because SDK calls cannot be
+        interrupted, and it keeps its slot until it does, so ``in_flight``
+        and the concurrency cap count every call that is really running.
+        """
+        self.start()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or self.timeout_seconds)
+
+        semaphore = await self._acquire(deadline)
+        try:
+            future = loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+        except BaseException:
+            self._release(semaphore)
+            raise
+        future.add_done_callback(lambda done: self._release(semaphore, done))
+        # Shielded: a timed-out caller stops waiting, the call keeps its slot until the thread returns
+        return await asyncio.wait_for(asyncio.shield(future), deadline - loop.time())
+
+    async def _acquire(self, deadline: float) -> asyncio.Semaphore:
+        """Wait until ``deadline`` (loop time) for a slot; returns the semaphore to release it on"""
+        semaphore = self._semaphore
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(semaphore.acquire(), deadline - asyncio.get_running_loop().time())
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        return semaphore
+
+    def _release(self, semaphore: asyncio.Semaphore, done: Optional["asyncio.Future"] = None):
+        self.in_flight -= 1
+        semaphore.release()
+        # Nobody may be waiting for a call that outlived its timeout
+        if done is not None and not done.cancelled():
+            done.exception()
+
+    async def stream(self, func: Callable[..., Iterable[str]], *args, timeout: Optional[float] = None, **kwargs) -> AsyncIterator[str]:
+        """
+        Iterate over the chunks of the blocking iterator ``func(*args, **kwargs)``.
+
+        The iterator runs on the Granite pool and holds a concurrency slot
+        until its worker returns: when the iterator is exhausted, or at the
+        next chunk after the consumer stopped.  The timeout covers the wait
+        for a slot and the whole stream; on expiry ``asyncio.TimeoutError``
+        is raised and the worker stops at its next chunk.
+        """
+        self.start()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or self.timeout_seconds)
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        end = object()
+
+        def send(item):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                stop.set()  # event loop closed
+
+        def produce():
+            try:
+                for chunk in func(*args, **kwargs):
+                    if stop.is_set():
+                        return
+                    send((chunk, None))
+                send((end, None))
+            except Exception as e:
+                send((end, e))
+
+        semaphore = await self._acquire(deadline)
+        try:
+            worker = loop.run_in_executor(self._executor, produce)
+        except BaseException:
+            self._release(semaphore)
+            raise
+        # The slot is freed when the worker returns, after its current chunk
+        worker.add_done_callback(lambda done: self._release(semaphore, done))
+        try:
+            while True:
+                chunk, error = await asyncio.wait_for(queue.get(), deadline - loop.time())
+                if chunk is end:
+                    if error is not None:
+                        raise error
+                    return
+                yield chunk
+        finally:
+            stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "timeout_seconds": self.timeout_seconds,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting
+        }
+
+
+class _StubModels:
+    def __init__(self, owner: "StubGraniteClient"):
+        self._owner = owner
+
+    def generate_text(self, prompt: str, params: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, Any]:
+        return self._owner.generate(prompt, params or {})
+
+    def generate_text_stream(self, prompt: str, params: Optional[Dict[str, Any]] = None, **kwargs) -> Iterable[str]:
+        return self._owner.generate_stream(prompt, params or {})
+
+
+class StubGraniteClient:
+    """
+    Local stand-in for the watsonx.ai ``APIClient``.
+
+    It blocks for ``latency_seconds`` exactly like a real SDK round-trip, which
+    makes it useful for load testing the API without IBM Cloud credentials.
+    Both ``foundation_models`` and ``deployments`` support ``generate_text``
+    and ``generate_text_stream``; the stream spreads the same latency evenly
+    over its words.  ``max_new_tokens`` and ``stop_sequences`` are honoured
+    and responses carry the SDK's token counts and stop reason.
+
+    Faults can be injected to rehearse an outage: a share ``error_rate`` of
+    calls fails with ``ConnectionError`` after the normal latency, and a share
+    ``hang_rate`` hangs for ``hang_seconds`` before failing, like a request
+    that only ends at the HTTP timeout.
+    """
+
+    def __init__(self, latency_seconds: float = 1.0, error_rate: float = 0.0, hang_rate: float = 0.0,
+                 hang_seconds: float = 60.0, seed: Optional[int] = None):
+        self.latency_seconds = latency_seconds
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self._random = random.Random(seed)
+        self.foundation_models = _StubModels(self)
+        self.deployments = _StubModels(self)
+
+    def _text(self, prompt: str) -> str:
+        return f"[stub] Generated response for a {len(prompt)}-character prompt."
+
+    def _generation(self, prompt: str, params: Dict[str, Any]) -> Tuple[str, str]:
+        """Stub text cut at ``stop_sequences`` and ``max_new_tokens`` (one token per word), and the stop reason"""
+        text = self._text(prompt)
+        for stop in params.get("stop_sequences") or ():
+            if stop in text:
+                return text[:text.index(stop) + len(stop)], "stop_sequence"
+        words = text.split(" ")
+        max_new_tokens = params.get("max_new_tokens")
+        if max_new_tokens is not None and len(words) > max_new_tokens:
+            return " ".join(words[:max_new_tokens]), "max_tokens"
+        return text, "eos_token"
+
+    def _inject_fault(self):
+        roll = self._random.random()
+        if roll < self.hang_rate:
+            time.sleep(self.hang_seconds)
+            raise ConnectionError("[stub] injected fault: request timed out")
+        if roll < self.hang_rate + self.error_rate:
+            time.sleep(self.latency_seconds)
+            raise ConnectionError("[stub] injected fault: service unavailable")
+
+    def generate(self, prompt: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        self._inject_fault()
+        time.sleep(self.latency_seconds)
+        text, stop_reason = self._generation(prompt, params)
+        return {"results": [{
+            "generated_text": text,
+            "generated_token_count": len(text.split()),
+            "input_token_count": len(prompt.split()),
+            "stop_reason": stop_reason
+        }]}
+
+    def generate_stream(self, prompt: str, params: Dict[str, Any]) -> Iterable[str]:
+        self._inject_fault()
+        words = self._generation(prompt, params)[0].split(" ")
+        for i, word in enumerate(words):
+            time.sleep(self.latency_seconds / len(words))
+            yield word if i == 0 else " " + word
+
+
+class LatencyWindow:
+    """Percentiles of the most recent ``size`` samples of one latency (seconds)"""
+
+    def __init__(self, size: int = 1000):
+        self._samples: deque = deque(maxlen=size)
+        self.count = 0
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+        self.count += 1
+
+    def stats(self) -> Dict[str, Any]:
+        samples = sorted(self._samples)
+        if not samples:
+            return {"count": 0}
+
+        def percentile(q: float) -> float:
+            return round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 1)
+
+        return {"count": self.count, "p50_ms": percentile(0.5), "p95_ms": percentile(0.95), "max_ms": percentile(1.0)}
@@ -1,38 +1,133 @@
 import asyncio
 import json
 import logging
+import time
 from typing import List, Dict, Any, Optional
-from ibm_watson_machine_learning import APIClient
-from sentence_transformers import SentenceTransformer
 import numpy as np
 from app.core.config import settings
+from embeddings import EmbeddingBatcher, EmbeddingStore
+from llm_cache import LLMResponseCache, SingleFlight, make_cache_key
+from granite_runtime import (
+    GraniteRunner, CircuitBreaker, GraniteUnavailableError, CircuitOpenError, hedged,
+    DESCRIPTION_MARKER, SUMMARY_MARKER, split_description_and_summary
+)
+from generation_profiles import GENERATION_PROFILES, TaskProfile, TaskMetrics, task_profile, fill_prompt, estimate_tokens
+from match_analysis import MATCH_ANALYSIS_SCHEMA, parse_match_analysis
 
 logger = logging.getLogger(__name__)
 
 class GraniteService:
+    # Store job prompt templates; each generation task's sampling parameters and budgets are in GENERATION_PROFILES
+    store_job_template = """
+            You are a professional job posting writer. Create a clear, complete, and industry-appropriate job description for a local store/business based on the following information:
+
+            Job Title: {job_title}
+            Store/Business: {store_name}
+            Location: {location}
+            Key Responsibilities: {key_responsibilities}
+            Skills Required: {skills_required}
+            Working Hours: {working_hours}
+            Working Days: {working_days}
+            Salary: {salary}
+            Job Type: {job_type}
+            Contact Info: {contact_info}
+            Additional Info: {additional_info}
+
+            Create a professional job posting that includes:
+            1. A clear job title and company name
+            2. Job overview and main responsibilities
+            3. Required skills and qualifications
+            4. Working hours and schedule
+            5. Salary information
+            6. Location details
+            7. How to apply
+
+            Format it as a complete, ready-to-post job description that would attract suitable candidates for a local store position.
+            Make it professional but accessible, suitable for local job seekers.
+            """
+    
+    combined_store_job_template = store_job_template + f"""
+            After the job description, write a brief, engaging summary (1-2 sentences, under 100 words)
+            that highlights the key role, location, and main appeal for mobile job browsing.
+
+            Use exactly this layout:
+            {DESCRIPTION_MARKER}
+            <the full job description>
+            {SUMMARY_MARKER}
+            <the summary>
+            """
+    
+    description_summary_template = """
+            Create a brief, engaging summary (1-2 sentences) for this job posting:
+            
+            {enhanced_description}
+            
+            The summary should highlight the key role, location, and main appeal to job seekers.
+            Keep it under 100 words and make it attractive for mobile job browsing.
+            """
+    
+    field_summary_template = """
+            Create a brief, engaging summary (1-2 sentences) for a job posting with these details:
+            
+            Job Title: {job_title}
+            Store/Business: {store_name}
+            Location: {location}
+            Key Responsibilities: {key_responsibilities}
+            Working Hours: {working_hours}
+            Salary: {salary}
+            Job Type: {job_type}
+            
+            The summary should highlight the key role, location, and main appeal to job seekers.
+            Keep it under 100 words and make it attractive for mobile job browsing.
+            """
+    
+    # Form fields of the store job templates and what the prompt says when one is missing
+    store_job_defaults = {
+        'job_title': '', 'store_name': '', 'location': '', 'key_responsibilities': 'Not specified',
+        'skills_required': 'Not specified', 'working_hours': 'Not specified', 'working_days': 'Not specified',
+        'salary': 'Competitive salary', 'job_type': 'Full-time', 'contact_info': 'Apply in person', 'additional_info': ''
+    }
+    
     def __init__(self):
         self.client = None
         self.embedding_model = None
         self.is_ready = False
+        self.runner = GraniteRunner(
+            max_concurrency=getattr(settings, 'GRANITE_MAX_CONCURRENCY', 4),
+            timeout_seconds=getattr(settings, 'GRANITE_TIMEOUT_SECONDS', 60.0)
+        )
+        self.cache = LLMResponseCache(
+            max_entries=getattr(settings, 'LLM_CACHE_MAX_ENTRIES', 1024),
+            ttl_seconds=getattr(settings, 'LLM_CACHE_TTL_SECONDS', 3600.0),
+            sqlite_path=getattr(settings, 'LLM_CACHE_SQLITE_PATH', None),
+            max_disk_entries=getattr(settings, 'LLM_CACHE_SQLITE_MAX_ENTRIES', 100000)
+        )
+        self.inflight = SingleFlight()
+        self.task_metrics = TaskMetrics(GENERATION_PROFILES)
+        self.breaker = CircuitBreaker(
+            window=getattr(settings, 'GRANITE_BREAKER_WINDOW', 20),
+            min_calls=getattr(settings, 'GRANITE_BREAKER_MIN_CALLS', 5),
+            error_threshold=getattr(settings, 'GRANITE_BREAKER_ERROR_RATE', 0.5),
+            slow_call_seconds=getattr(settings, 'GRANITE_BREAKER_SLOW_CALL_SECONDS', 20.0),
+            slow_threshold=getattr(settings, 'GRANITE_BREAKER_SLOW_RATE', 0.8),
+            open_seconds=getattr(settings, 'GRANITE_BREAKER_OPEN_SECONDS', 30.0),
+            half_open_probes=getattr(settings, 'GRANITE_BREAKER_PROBES', 1)
+        )
+        self.embeddings = EmbeddingBatcher(
+            store=EmbeddingStore(max_entries=getattr(settings, 'EMBEDDING_CACHE_MAX_ENTRIES', 10000)),
+            window_ms=getattr(settings, 'EMBEDDING_BATCH_WINDOW_MS', 5.0),
+            max_batch_size=getattr(settings, 'EMBEDDING_MAX_BATCH_SIZE', 64)
+        )
         
     async def initialize(self):
-        """Initialize IBM Watson ML client and embedding model"""
+        """Initialize IBM Watson ML client and embedding model; the heavy imports and loads run in threads"""
+        self.runner.start()
         try:
-            # Initialize IBM Watson ML client
-            wml_credentials = {
-                "url": settings.IBM_URL,
-                "apikey": settings.IBM_API_KEY
-            }
-            
-            self.client = APIClient(wml_credentials)
-            
-            if settings.IBM_SPACE_ID:
-                self.client.set.default_space(settings.IBM_SPACE_ID)
-            elif settings.IBM_PROJECT_ID:
-                self.client.set.default_project(settings.IBM_PROJECT_ID)
-            
-            # Initialize sentence transformer for embeddings
-            self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+            self.client, self.embedding_model = await asyncio.gather(
+                asyncio.to_thread(self._create_client),
+                asyncio.to_thread(self._create_embedding_model)
+            )
+            self.embeddings.attach(self.embedding_model)
             
             self.is_ready = True
             logger.info("Granite service initialized successfully")
@@ -41,59 +136,75 @@ class GraniteService:
             logger.error(f"Failed to initialize Granite service: {str(e)}")
             self.is_ready = False
     
+    def _create_client(self):
+        from ibm_watson_machine_learning import APIClient
+        
+        # Initialize IBM Watson ML client
+        wml_credentials = {
+            "url": settings.IBM_URL,
+            "apikey": settings.IBM_API_KEY
+        }
+        
+        client = APIClient(wml_credentials)
+        
+        if settings.IBM_SPACE_ID:
+            client.set.default_space(settings.IBM_SPACE_ID)
+        elif settings.IBM_PROJECT_ID:
+            client.set.default_project(settings.IBM_PROJECT_ID)
+        return client
+    
+    def _create_embedding_model(self):
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer('all-MiniLM-L6-v2')
+    
     async def cleanup(self):
         """Cleanup resources"""
         self.is_ready = False
+        self.runner.shutdown()
+        self.cache.close()
+        self.embeddings.shutdown()
         logger.info("Granite service cleaned up")
     
     async def generate_store_job_description(self, store_job_input: Dict[str, Any]) -> Dict[str, str]:
         """
         Generate a professional job description for store owners using IBM Granite 3.3
+
+        settings.JOB_GENERATION_MODE selects "sequential" (description, then its summary),
+        "single_call" (both from one structured prompt) or "parallel" (summary from the
+        raw input, generated alongside the description).
         """
         try:
-            # Create a structured prompt for store job posting
-            prompt = f"""
-            You are a professional job posting writer. Create a clear, complete, and industry-appropriate job description for a local store/business based on the following information:
-
-            Job Title: {store_job_input.get('job_title', '')}
-            Store/Business: {store_job_input.get('store_name', '')}
-            Location: {store_job_input.get('location', '')}
-            Key Responsibilities: {store_job_input.get('key_responsibilities', 'Not specified')}
-            Skills Required: {store_job_input.get('skills_required', 'Not specified')}
-            Working Hours: {store_job_input.get('working_hours', 'Not specified')}
-            Working Days: {store_job_input.get('working_days', 'Not specified')}
-            Salary: {store_job_input.get('salary', 'Competitive salary')}
-            Job Type: {store_job_input.get('job_type', 'Full-time')}
-            Contact Info: {store_job_input.get('contact_info', 'Apply in person')}
-            Additional Info: {store_job_input.get('additional_info', '')}
-
-            Create a professional job posting that includes:
-            1. A clear job title and company name
-            2. Job overview and main responsibilities
-            3. Required skills and qualifications
-            4. Working hours and schedule
-            5. Salary information
-            6. Location details
-            7. How to apply
-
-            Format it as a complete, ready-to-post job description that would attract suitable candidates for a local store position.
-            Make it professional but accessible, suitable for local job seekers.
-            """
-            
-            # Generate the job description
-            enhanced_description = await self._generate_text(prompt)
+            mode = getattr(settings, 'JOB_GENERATION_MODE', 'parallel')
             
-            # Generate a summary
-            summary_prompt = f"""
-            Create a brief, engaging summary (1-2 sentences) for this job posting:
-            
-            {enhanced_description}
-            
-            The summary should highlight the key role, location, and main appeal to job seekers.
-            Keep it under 100 words and make it attractive for mobile job browsing.
-            """
-            
-            summary = await self._generate_text(summary_prompt)
+            if mode == "single_call":
+                # One round-trip: ask for description and summary in a fixed layout
+                combined_prompt = self._fill_prompt(
+                    "description_and_summary", self.combined_store_job_template, **self._store_job_fields(store_job_input)
+                )
+                enhanced_description, summary = split_description_and_summary(
+                    await self._generate_text("description_and_summary", combined_prompt)
+                )
+            elif mode == "parallel":
+                # Summarize the raw input while the full description is being written
+                prompt = self._fill_prompt("description", self.store_job_template, **self._store_job_fields(store_job_input))
+                summary_prompt = self._fill_prompt("summary", self.field_summary_template, **self._store_job_fields(
+                    store_job_input, 'job_title', 'store_name', 'location', 'key_responsibilities', 'working_hours',
+                    'salary', 'job_type'
+                ))
+                enhanced_description, summary = await asyncio.gather(
+                    self._generate_text("description", prompt),
+                    self._generate_summary(store_job_input, summary_prompt)
+                )
+            else:
+                # Generate the job description
+                prompt = self._fill_prompt("description", self.store_job_template, **self._store_job_fields(store_job_input))
+                enhanced_description = await self._generate_text("description", prompt)
+                
+                # Generate a summary (of at most as much description as the summary's prompt budget allows)
+                summary_prompt = self._fill_prompt(
+                    "summary", self.description_summary_template, enhanced_description=enhanced_description
+                )
+                summary = await self._generate_summary(store_job_input, summary_prompt)
             
             # Create a formatted job post
             formatted_post = self._format_job_post(store_job_input, enhanced_description)
@@ -108,10 +219,25 @@ class GraniteService:
             logger.error(f"Error generating store job description: {str(e)}")
             return {
                 'enhanced_description': self._create_fallback_description(store_job_input),
-                'summary': f"{store_job_input.get('job_title', 'Job')} position available at {store_job_input.get('store_name', 'local store')}",
+                'summary': self._create_fallback_summary(store_job_input),
                 'formatted_post': self._create_fallback_description(store_job_input)
             }
     
+    async def _generate_summary(self, input_data: Dict[str, Any], prompt: str) -> str:
+        """The summary, or the template one if Granite is unavailable (the description may still have worked)"""
+        try:
+            return await self._generate_text("summary", prompt)
+        except GraniteUnavailableError as e:
+            logger.warning(f"Using the template summary: {str(e)}")
+            return self._create_fallback_summary(input_data)
+    
+    def _create_fallback_summary(self, input_data: Dict[str, Any]) -> str:
+        return f"{input_data.get('job_title', 'Job')} position available at {input_data.get('store_name', 'local store')}"
+    
+    def _store_job_fields(self, input_data: Dict[str, Any], *names: str) -> Dict[str, Any]:
+        """``names`` (default: every store job field) from the form, with the prompt defaults for missing ones"""
+        return {name: input_data.get(name, self.store_job_defaults[name]) for name in names or self.store_job_defaults}
+    
     def _format_job_post(self, input_data: Dict[str, Any], ai_description: str) -> str:
         """Format the job post in a structured, mobile-friendly way"""
         
@@ -165,16 +291,16 @@ We are looking for a {input_data.get('job_title', 'team member')} to join our te
         Generate an enhanced job description using IBM Granite 3.3
         """
         try:
-            prompt = f"""
+            prompt = self._fill_prompt("smart_description", """
             Create a comprehensive and engaging job description based on the following information:
             
-            Job Title: {job_data.get('title', '')}
-            Company: {job_data.get('company', '')}
-            Location: {job_data.get('location', '')}
-            Basic Description: {job_data.get('description', '')}
-            Requirements: {job_data.get('requirements', '')}
-            Experience Level: {job_data.get('experience_level', '')}
-            Job Type: {job_data.get('job_type', '')}
+            Job Title: {title}
+            Company: {company}
+            Location: {location}
+            Basic Description: {description}
+            Requirements: {requirements}
+            Experience Level: {experience_level}
+            Job Type: {job_type}
             
             Please create a professional, detailed job description that includes:
             1. An engaging overview of the role
@@ -185,10 +311,12 @@ We are looking for a {input_data.get('job_title', 'team member')} to join our te
             6. Growth opportunities
             
             Make it attractive to potential candidates while being clear about expectations.
-            """
+            """, **{field: job_data.get(field, '') for field in (
+                'title', 'company', 'location', 'description', 'requirements', 'experience_level', 'job_type'
+            )})
             
             # Generate using IBM Granite
-            response = await self._generate_text(prompt)
+            response = await self._generate_text("smart_description", prompt)
             return response
             
         except Exception as e:
@@ -200,7 +328,7 @@ We are looking for a {input_data.get('job_title', 'team member')} to join our te
         Generate an AI-powered job summary using IBM Granite 3.3
         """
         try:
-            prompt = f"""
+            prompt = self._fill_prompt("summary", """
             Create a concise, engaging summary (2-3 sentences) of the following job description:
             
             {job_description}
@@ -210,9 +338,9 @@ We are looking for a {input_data.get('job_title', 'team member')} to join our te
             2. Mention the most important qualifications
             3. Be appealing to job seekers
             4. Be under 150 words
-            """
+            """, job_description=job_description)
             
-            response = await self._generate_text(prompt)
+            response = await self._generate_text("summary", prompt)
             return response
             
         except Exception as e:
@@ -228,19 +356,16 @@ We are looking for a {input_data.get('job_title', 'team member')} to join our te
             user_text = self._create_user_profile_text(user_profile)
             job_text = self._create_job_text(job_data)
             
-            user_embedding = self.embedding_model.encode([user_text])
-            job_embedding = self.embedding_model.encode([job_text])
+            user_vector, job_vector = await self.embeddings.encode([user_text, job_text])
             
-            # Calculate cosine similarity
-            similarity = np.dot(user_embedding[0], job_embedding[0]) / (
-                np.linalg.norm(user_embedding[0]) * np.linalg.norm(job_embedding[0])
-            )
+            # Calculate cosine similarity (vectors are already unit length)
+            similarity = np.dot(user_vector, job_vector)
             
             # Convert to percentage
             base_score = float(similarity) * 100
             
             # Use Granite for detailed analysis
-            analysis_prompt = f"""
+            analysis_prompt = self._fill_prompt("match_analysis", """
             Analyze the job match between this candidate and job posting:
             
             CANDIDATE PROFILE:
@@ -249,23 +374,25 @@ We are looking for a {input_data.get('job_title', 'team member')} to join our te
             JOB POSTING:
             {job_text}
             
-            Provide a detailed analysis including:
-            1. Overall match percentage (0-100)
-            2. Strengths (what matches well)
-            3. Gaps (what's missing)
-            4. Recommendations for the candidate
+            Respond with only a JSON object, keys in this order, that follows this JSON schema:
+            """ + json.dumps(MATCH_ANALYSIS_SCHEMA).replace("{", "{{").replace("}", "}}") + """
             
-            Format as JSON with keys: match_score, strengths, gaps, recommendations
-            """
-            
-            analysis = await self._generate_text(analysis_prompt)
+            match_score is the overall match percentage (0-100). strengths are what matches well, gaps
+            what's missing and recommendations are for the candidate. summary is one or two sentences.
+            """, user_text=user_text, job_text=job_text)
             
             try:
-                # Try to parse as JSON
-                detailed_analysis = json.loads(analysis)
-                match_score = detailed_analysis.get('match_score', base_score)
-            except:
-                # Fallback to base score if JSON parsing fails
+                analysis = await self._generate_text("match_analysis", analysis_prompt)
+            except GraniteUnavailableError as e:
+                logger.warning(f"Match analysis unavailable, using the embedding score: {str(e)}")
+                analysis = ""
+            
+            # Tolerant of prose around the object, trailing commas and output cut off by the token cap
+            detailed_analysis = parse_match_analysis(analysis)
+            if detailed_analysis is not None:
+                match_score = detailed_analysis['match_score']
+            else:
+                # Fallback to base score if no usable analysis came back
                 match_score = base_score
                 detailed_analysis = {
                     'match_score': match_score,
@@ -291,41 +418,123 @@ We are looking for a {input_data.get('job_title', 'team member')} to join our te
                 }
             }
     
-    async def _generate_text(self, prompt: str) -> str:
+    def _fill_prompt(self, task: str, template: str, **fields: Any) -> str:
+        """``template`` filled in, with the longest fields trimmed to fit the task's prompt budget"""
+        prompt, truncated = fill_prompt(task_profile(task), template, **fields)
+        if truncated:
+            self.task_metrics.record_truncation(task)
+        return prompt
+    
+    async def _generate_text(self, task: str, prompt: str, deadline: Optional[float] = None) -> str:
         """
-        Generate text using IBM Granite model
+        Generate text for ``task`` (a GENERATION_PROFILES key) using IBM Granite model.
+
+        Raises GraniteUnavailableError when there is no client, the prompt is
+        over the task's token budget, the circuit breaker is open, or the call
+        fails or misses its ``deadline`` (seconds, default
+        GRANITE_TIMEOUT_SECONDS); callers then use their fallbacks.
         """
+        if not self.client:
+            raise GraniteUnavailableError("IBM Watson ML client not initialized")
+        
+        # Token cap, stop sequences and sampling come from the task's profile
+        profile = task_profile(task)
+        prompt_tokens = estimate_tokens(prompt)
+        if prompt_tokens > profile.max_prompt_tokens:
+            self.task_metrics.record_error(task)
+            raise GraniteUnavailableError(
+                f"{task} prompt is about {prompt_tokens} tokens, over its {profile.max_prompt_tokens}-token budget"
+            )
+        
+        # Identical model + params + prompt reuse an earlier generation
+        cache_key = make_cache_key(settings.GRANITE_DEPLOYMENT_ID or settings.GRANITE_MODEL_ID, profile.params(), prompt)
+        cached = await self.cache.get(cache_key)
+        if cached is not None:
+            self.task_metrics.record_cache_hit(task)
+            return cached
+        if self.breaker.rejecting:
+            raise CircuitOpenError(self.breaker.retry_after())
+        
         try:
-            # Prepare the generation parameters
-            generation_params = {
-                "max_new_tokens": 800,
-                "temperature": 0.7,
-                "top_p": 0.9,
-                "repetition_penalty": 1.1
-            }
-            
-            # Generate text using the model
+            # Identical requests already in flight share a single Granite call; the
+            # deadline only ends this caller's wait, the call itself still fills the cache
+            return await asyncio.wait_for(
+                self.inflight.do(cache_key, lambda: self._call_granite(profile, cache_key, prompt)),
+                deadline or self.runner.timeout_seconds
+            )
+        except GraniteUnavailableError:
+            raise
+        except asyncio.TimeoutError:
+            logger.error(f"Granite generation missed its {deadline or self.runner.timeout_seconds}s deadline")
+            raise GraniteUnavailableError("deadline exceeded")
+        except Exception as e:
+            logger.error(f"Error generating text with Granite: {str(e)}")
+            raise GraniteUnavailableError(str(e)) from e
+    
+    async def _call_granite(self, profile: TaskProfile, cache_key: str, prompt: str) -> str:
+        """
+        Run one Granite generation, hedged if GRANITE_HEDGE_AFTER_SECONDS is
+        set, record its tokens and latency under the task and cache the result
+        """
+        started = time.monotonic()
+        try:
+            response = await hedged(
+                lambda: self._granite_attempt(profile, prompt),
+                hedge_after=getattr(settings, 'GRANITE_HEDGE_AFTER_SECONDS', None),
+                max_attempts=getattr(settings, 'GRANITE_HEDGE_MAX_ATTEMPTS', 2),
+                retry_delay=getattr(settings, 'GRANITE_HEDGE_RETRY_DELAY_SECONDS', 0.25),
+                # Hedges add load, so only while the pool has room and Granite is healthy
+                can_hedge=lambda: self.runner.waiting == 0 and self.breaker.state == CircuitBreaker.CLOSED
+            )
+        except Exception:
+            self.task_metrics.record_error(profile.name)
+            raise
+        
+        result = response.get('results', [{}])[0]
+        generated_text = result.get('generated_text', '').strip()
+        self.task_metrics.record_call(
+            profile.name,
+            time.monotonic() - started,
+            result.get('input_token_count') or estimate_tokens(prompt),
+            result.get('generated_token_count') or estimate_tokens(generated_text),
+            result.get('stop_reason')
+        )
+        if generated_text:
+            await self.cache.set(cache_key, generated_text)
+        return generated_text
+    
+    async def _granite_attempt(self, profile: TaskProfile, prompt: str) -> Dict[str, Any]:
+        """One SDK call on the Granite worker pool, with its outcome recorded by the circuit breaker"""
+        ticket = self.breaker.try_acquire()
+        if ticket is None:
+            raise CircuitOpenError(self.breaker.retry_after())
+        started = time.monotonic()
+        try:
+            # Generate text using the model (on the Granite worker pool, the SDK is blocking)
             if settings.GRANITE_DEPLOYMENT_ID:
                 # Use deployment if available
-                response = self.client.deployments.generate_text(
+                response = await self.runner.run(
+                    self.client.deployments.generate_text,
                     deployment_id=settings.GRANITE_DEPLOYMENT_ID,
                     prompt=prompt,
-                    params=generation_params
+                    params=profile.params()
                 )
             else:
                 # Use foundation model directly
-                response = self.client.foundation_models.generate_text(
+                response = await self.runner.run(
+                    self.client.foundation_models.generate_text,
                     model_id=settings.GRANITE_MODEL_ID,
                     prompt=prompt,
-                    params=generation_params
+                    params=profile.params()
                 )
-            
-            return response.get('results', [{}])[0].get('generated_text', '').strip()
-            
-        except Exception as e:
-            logger.error(f"Error generating text with Granite: {str(e)}")
-            # Fallback to a simple response
-            return "AI generation temporarily unavailable. Please try again later."
+        except asyncio.CancelledError:
+            self.breaker.release(ticket)
+            raise
+        except Exception:
+            self.breaker.record(ticket, False, time.monotonic() - started)
+            raise
+        self.breaker.record(ticket, True, time.monotonic() - started)
+        return response
     
     def _create_user_profile_text(self, user_profile: Dict[str, Any]) -> str:
         """Create a text representation of user profile for embedding"""
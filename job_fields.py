@@ -0,0 +1,194 @@
+"""
+Typed numeric fields parsed from the free-text wage and distance strings.
+
+Wages arrive as strings such as ``"$18/hour"``, ``"₹15,000 - 18,000 per
+month"`` or ``"20-25 USD/hr"``; distances as ``"5 km"`` or, in the demo
+stores, ``"15$"``.  They are parsed once when a record is written
+(``normalize_job`` / ``normalize_distance``), which adds ``wage_min`` and
+``wage_max`` (per hour), ``wage_currency`` and ``distance_m``.
+``JobColumns`` keeps those values for every indexed job in numpy arrays, so a
+filter such as "under 5 km and over 20/hour" is one vectorized mask.
+"""
+import re
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+HOURS_PER_PERIOD = {
+    "hour": 1.0, "hr": 1.0, "h": 1.0,
+    "shift": 8.0, "day": 8.0,
+    "week": 40.0, "wk": 40.0,
+    "month": 2080.0 / 12, "mo": 2080.0 / 12,
+    "year": 2080.0, "yr": 2080.0, "annum": 2080.0
+}
+
+CURRENCIES = {
+    "$": "USD", "usd": "USD",
+    "₹": "INR", "rs": "INR", "inr": "INR",
+    "€": "EUR", "eur": "EUR",
+    "£": "GBP", "gbp": "GBP"
+}
+
+_AMOUNT = re.compile(r"(\d[\d,]*(?:\.\d+)?)\s*(k\b)?", re.IGNORECASE)
+_PERIOD = re.compile(r"(?:/|\bper\b|\ban?\b|\bevery\b)\s*(hour|hr|h|shift|day|week|wk|month|mo|year|yr|annum)\b", re.IGNORECASE)
+_PERIOD_SUFFIX = re.compile(r"\b(hourly|daily|weekly|monthly|yearly|annually)\b", re.IGNORECASE)
+_CURRENCY = re.compile(r"[$₹€£]|\b(?:usd|inr|rs|eur|gbp)\b", re.IGNORECASE)
+
+_SUFFIX_PERIODS = {
+    "hourly": "hour", "daily": "day", "weekly": "week",
+    "monthly": "month", "yearly": "year", "annually": "year"
+}
+
+WageRange = Tuple[float, float, Optional[str]]  # hourly min, hourly max, currency code
+
+
+def parse_wage(text: Optional[str]) -> Optional[WageRange]:
+    """
+    Hourly wage range and currency of a wage string, or None if it has no
+    amount.  A missing period means per hour; a single amount gives min == max.
+    """
+    if not text:
+        return None
+    amounts = []
+    for number, thousands in _AMOUNT.findall(text):
+        value = float(number.replace(",", ""))
+        amounts.append(value * 1000 if thousands else value)
+    if not amounts:
+        return None
+
+    period = _PERIOD.search(text)
+    if period:
+        hours = HOURS_PER_PERIOD[period.group(1).lower()]
+    else:
+        suffix = _PERIOD_SUFFIX.search(text)
+        hours = HOURS_PER_PERIOD[_SUFFIX_PERIODS[suffix.group(1).lower()]] if suffix else 1.0
+
+    currency = _CURRENCY.search(text)
+    code = CURRENCIES[currency.group(0).lower()] if currency else None
+
+    low, high = min(amounts[:2]), max(amounts[:2])
+    return round(low / hours, 2), round(high / hours, 2), code
+
+
+_DISTANCE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(km|kms|kilometers?|kilometres?|m|meters?|metres?|mi|miles?)?\s*$", re.IGNORECASE)
+_METERS_PER_UNIT = {"k": 1000.0, "m": 1.0, "mi": 1609.344}
+
+
+def parse_distance(text: Optional[str]) -> Optional[float]:
+    """
+    Distance in meters.  A bare number is taken as kilometers, the unit used
+    throughout the app; anything else (e.g. the "15$" placeholders) is None.
+    """
+    if text is None:
+        return None
+    match = _DISTANCE.match(str(text))
+    if not match:
+        return None
+    unit = (match.group(2) or "km").lower()
+    if unit.startswith("mi"):
+        factor = _METERS_PER_UNIT["mi"]
+    elif unit.startswith("k"):
+        factor = _METERS_PER_UNIT["k"]
+    else:
+        factor = _METERS_PER_UNIT["m"]
+    return round(float(match.group(1)) * factor, 1)
+
+
+def normalize_distance(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Add ``distance_m`` parsed from ``distance`` (stores, locations)"""
+    record["distance_m"] = parse_distance(record.get("distance"))
+    return record
+
+
+def normalize_job(job: Dict[str, Any], location_distances: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """
+    Add the typed wage fields, and ``distance_m`` from the job's own distance
+    or else from its location (``location_distances``: lowercased name -> meters).
+    """
+    wage = parse_wage(job.get("wage"))
+    job["wage_min"], job["wage_max"], job["wage_currency"] = wage if wage else (None, None, None)
+    distance = parse_distance(job.get("distance"))
+    if distance is None and location_distances:
+        distance = location_distances.get((job.get("location") or "").strip().lower())
+    job["distance_m"] = distance
+    return job
+
+
+class JobColumns:
+    """
+    Filter columns for indexed jobs, one array row per slot (the slot numbers
+    of the BM25 index).  Unknown numbers are NaN, so every comparison on them
+    is False and such jobs drop out of any filter on that column.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.location = np.full(capacity, -1, dtype=np.int32)
+        self.currency = np.full(capacity, -1, dtype=np.int16)
+        self.wage_min = np.full(capacity, np.nan, dtype=np.float32)
+        self.wage_max = np.full(capacity, np.nan, dtype=np.float32)
+        self.distance_m = np.full(capacity, np.nan, dtype=np.float32)
+        self.live = np.zeros(capacity, dtype=bool)
+        self._codes: Dict[str, Dict[str, int]] = {"location": {}, "currency": {}}
+
+    def _code(self, column: str, value: Optional[str], create: bool = True) -> int:
+        if not value:
+            return -1
+        codes = self._codes[column]
+        key = value.strip().lower()
+        if key not in codes:
+            if not create:
+                return -2  # matches no row
+            codes[key] = len(codes)
+        return codes[key]
+
+    def _ensure(self, slot: int):
+        size = len(self.location)
+        if slot < size:
+            return
+        grow = max(size, slot + 1 - size)
+        self.location = np.concatenate([self.location, np.full(grow, -1, dtype=np.int32)])
+        self.currency = np.concatenate([self.currency, np.full(grow, -1, dtype=np.int16)])
+        self.wage_min = np.concatenate([self.wage_min, np.full(grow, np.nan, dtype=np.float32)])
+        self.wage_max = np.concatenate([self.wage_max, np.full(grow, np.nan, dtype=np.float32)])
+        self.distance_m = np.concatenate([self.distance_m, np.full(grow, np.nan, dtype=np.float32)])
+        self.live = np.concatenate([self.live, np.zeros(grow, dtype=bool)])
+
+    def set(self, slot: int, job: Dict[str, Any]):
+        """Store the typed fields of a job that went through ``normalize_job``"""
+        self._ensure(slot)
+        self.location[slot] = self._code("location", job.get("location"))
+        self.currency[slot] = self._code("currency", job.get("wage_currency"))
+        self.wage_min[slot] = np.nan if job.get("wage_min") is None else job["wage_min"]
+        self.wage_max[slot] = np.nan if job.get("wage_max") is None else job["wage_max"]
+        self.distance_m[slot] = np.nan if job.get("distance_m") is None else job["distance_m"]
+        self.live[slot] = True
+
+    def clear(self, slot: int):
+        self.set(slot, {})
+        self.live[slot] = False
+
+    def mask(self, size: int, location: Optional[str] = None, currency: Optional[str] = None,
+             min_wage: Optional[float] = None, max_wage: Optional[float] = None,
+             max_distance_m: Optional[float] = None) -> Optional[np.ndarray]:
+        """
+        Boolean mask over the first ``size`` slots; None when no filter is set.
+        A wage filter keeps jobs whose hourly range overlaps [min_wage, max_wage].
+        """
+        self._ensure(size - 1)
+        mask = None
+
+        def both(condition):
+            return condition if mask is None else mask & condition
+
+        if location is not None:
+            mask = both(self.location[:size] == self._code("location", location, create=False))
+        if currency is not None:
+            mask = both(self.currency[:size] == self._code("currency", currency, create=False))
+        with np.errstate(invalid="ignore"):
+            if min_wage is not None:
+                mask = both(self.wage_max[:size] >= min_wage)
+            if max_wage is not None:
+                mask = both(self.wage_min[:size] <= max_wage)
+            if max_distance_m is not None:
+                mask = both(self.distance_m[:size] <= max_distance_m)
+        return mask
@@ -0,0 +1,178 @@
+"""
+Hybrid lexical + semantic job search.
+
+``JobSearch`` ranks jobs for a free-text query twice: BM25 over position,
+store name, requirements and responsibilities (text_search.BM25Index), and
+cosine similarity of MiniLM embeddings (the job vector index).  The two
+rankings are merged with reciprocal-rank fusion, which needs no score
+calibration between the two: a job scores sum(1 / (rrf_k + rank)) over the
+rankings it appears in.  Filters (location, currency, wage, distance) are a
+vectorized mask over the typed columns in job_fields.JobColumns, applied
+before each ranking is cut at ``depth`` jobs, so at most ``depth`` results per
+side can be paged through.  Jobs with coordinates are also kept in a grid
+spatial index (geo_index.GeoIndex) for "nearby" queries.
+
+Pages are addressed by a keyset cursor (fused score and id of the last
+result) instead of an offset, and results are ordered by (score, id) so the
+order is total and repeatable.
+"""
+import base64
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from geo_index import GeoIndex
+from job_fields import JobColumns, normalize_job
+from text_search import BM25Index, tokenize
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def job_search_text(job: Dict[str, Any]) -> str:
+    return " | ".join(
+        str(job[field]) for field in ("position", "store_name", "requirements", "responsibilities") if job.get(field)
+    )
+
+
+def encode_cursor(score: float, job_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([score, job_id]).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        score, job_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return float(score), str(job_id)
+    except (ValueError, TypeError):
+        raise InvalidCursorError(cursor)
+
+
+class JobSearch:
+    def __init__(self, keyword_index: BM25Index, vector_index, depth: int = 1000, rrf_k: int = 60):
+        self.keywords = keyword_index
+        self.vectors = vector_index
+        self.depth = depth
+        self.rrf_k = rrf_k
+        # Typed filter fields, row = the job's slot in the keyword index
+        self.columns = JobColumns()
+        self.geo = GeoIndex()
+
+    def upsert(self, job_id: Any, job: Dict[str, Any]):
+        job_id = str(job_id)
+        if "wage_min" not in job:
+            job = normalize_job(dict(job))
+        self.keywords.add(job_id, job_search_text(job))
+        self.columns.set(self.keywords.slot(job_id), job)
+        if job.get("lat") is not None and job.get("lon") is not None:
+            self.geo.add(job_id, job["lat"], job["lon"])
+        else:
+            self.geo.remove(job_id)
+
+    def remove(self, job_id: Any):
+        slot = self.keywords.slot(job_id)
+        if slot is not None:
+            self.keywords.remove(str(job_id))
+            self.columns.clear(slot)
+        self.geo.remove(str(job_id))
+
+    def _lexical_ranking(self, query: str, mask: Optional[np.ndarray]) -> List[str]:
+        scores = self.keywords.scores(tokenize(query))
+        if mask is not None:
+            scores[~mask] = 0.0
+        slots = np.flatnonzero(scores > 0)
+        if len(slots) > self.depth:
+            slots = slots[np.argpartition(-scores[slots], self.depth - 1)[:self.depth]]
+        slots = slots[np.lexsort((slots, -scores[slots]))]
+        return [self.keywords.id_at(int(slot)) for slot in slots]
+
+    def _semantic_ranking(self, query_vector: Optional[np.ndarray], mask: Optional[np.ndarray]) -> List[str]:
+        if query_vector is None or not len(self.vectors):
+            return []
+        if mask is None:
+            return [job_id for job_id, _ in self.vectors.search(query_vector, self.depth)]
+        # Over-fetch so the filtered ranking is still about ``depth`` long
+        ranking = []
+        for job_id, _ in self.vectors.search(query_vector, self.depth * 4):
+            slot = self.keywords.slot(job_id)
+            if slot is not None and mask[slot]:
+                ranking.append(job_id)
+        return ranking[:self.depth]
+
+    def search(self, query: str, query_vector: Optional[np.ndarray] = None,
+               limit: int = 20, cursor: Optional[str] = None, **filters) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        One page of results as dicts with ``id``, ``score`` (fused) and the
+        1-based ``lexical_rank`` / ``semantic_rank`` (None when the job is not
+        in that ranking), plus the cursor for the next page (None on the last page).
+        ``filters`` are the keyword arguments of ``JobColumns.mask``.
+        """
+        mask = self.columns.mask(self.keywords.size, **filters)
+        lexical = self._lexical_ranking(query, mask)
+        semantic = self._semantic_ranking(query_vector, mask)
+
+        fused: Dict[str, Dict[str, Any]] = {}
+        for field, ranking in (("lexical_rank", lexical), ("semantic_rank", semantic)):
+            for rank, job_id in enumerate(ranking, start=1):
+                entry = fused.setdefault(job_id, {"id": job_id, "score": 0.0, "lexical_rank": None, "semantic_rank": None})
+                entry["score"] += 1.0 / (self.rrf_k + rank)
+                entry[field] = rank
+
+        results = sorted(fused.values(), key=lambda entry: (-entry["score"], entry["id"]))
+        if cursor is not None:
+            after = decode_cursor(cursor)
+            results = [entry for entry in results if (-entry["score"], entry["id"]) > (-after[0], after[1])]
+
+        page = results[:limit]
+        next_cursor = encode_cursor(page[-1]["score"], page[-1]["id"]) if len(results) > limit else None
+        return page, next_cursor
+
+    def browse(self, sort: str = "wage", limit: int = 20, offset: int = 0, **filters) -> Tuple[List[str], int]:
+        """
+        Filter and sort without a query: ``sort`` is "wage" (highest first) or
+        "distance" (nearest first); anything else keeps index order.  Jobs with
+        an unknown sort value come last.  Returns one page of ids and the total.
+        """
+        size = self.keywords.size
+        mask = self.columns.live[:size].copy()
+        extra = self.columns.mask(size, **filters)
+        if extra is not None:
+            mask &= extra
+        slots = np.flatnonzero(mask)
+
+        if sort == "wage":
+            keys = -self.columns.wage_max[slots]
+        elif sort == "distance":
+            keys = self.columns.distance_m[slots]
+        else:
+            keys = np.zeros(len(slots), dtype=np.float32)
+        # NaN sorts last under lexsort; the slot number breaks ties
+        slots = slots[np.lexsort((slots, keys))]
+        page = slots[offset:offset + limit]
+        return [self.keywords.id_at(int(slot)) for slot in page], len(slots)
+
+    def nearby(self, lat: float, lon: float, radius_m: Optional[float] = None,
+               limit: int = 20, **filters) -> List[Tuple[str, float]]:
+        """
+        (id, meters) of the closest jobs to a point, nearest first: every job
+        within ``radius_m`` up to ``limit``, or the ``limit`` nearest without a
+        radius.  ``filters`` are the keyword arguments of ``JobColumns.mask``.
+        """
+        mask = self.columns.mask(self.keywords.size, **filters)
+        if mask is None:
+            if radius_m is not None:
+                return self.geo.within(lat, lon, radius_m, limit=limit)
+            return self.geo.nearest(lat, lon, limit)
+        if radius_m is not None:
+            hits = self.geo.within(lat, lon, radius_m)
+            return [(job_id, meters) for job_id, meters in hits if mask[self.keywords.slot(job_id)]][:limit]
+        # Over-fetch and drop the jobs the filters exclude, widening until
+        # ``limit`` jobs pass or every job has been looked at
+        fetch = limit * 4
+        while True:
+            hits = self.geo.nearest(lat, lon, fetch)
+            matches = [(job_id, meters) for job_id, meters in hits if mask[self.keywords.slot(job_id)]]
+            if len(matches) >= limit or len(hits) < fetch:
+                return matches[:limit]
+            fetch *= 4
@@ -0,0 +1,230 @@
+"""
+Content-addressed cache for Granite generations.
+
+Keys are a SHA-256 of the model id, the generation parameters and the
+whitespace-normalized prompt, so re-posted jobs and repeated match analyses
+hit the cache even when the prompt template indentation differs.  Entries
+live in an in-memory LRU tier with a TTL and, optionally, in a SQLite file
+that survives restarts.  The SQLite tier is only touched from worker
+threads (``get`` and ``set`` are coroutines), holds at most
+``max_disk_entries`` rows and drops expired ones every
+``purge_interval_seconds``.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so formatting-only differences share a cache entry"""
+    return " ".join(prompt.split())
+
+
+def make_cache_key(model_id: str, params: Dict[str, Any], prompt: str) -> str:
+    payload = json.dumps(
+        {"model": model_id, "params": params, "prompt": normalize_prompt(prompt)},
+        sort_keys=True,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """Two-tier (memory LRU + optional SQLite) cache of generated text"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600.0, sqlite_path: Optional[str] = None,
+                 max_disk_entries: int = 100000, purge_interval_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_entries = max(1, max_disk_entries)
+        self.purge_interval_seconds = purge_interval_seconds
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        # Serializes the SQLite connection between worker threads; never held on the event loop
+        self._db_lock = threading.Lock()
+        self._writes_since_purge = 0
+        self._purged_at = 0.0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.disk_purged = 0
+
+        if sqlite_path:
+            self._open_disk_tier(sqlite_path)
+
+    def _open_disk_tier(self, sqlite_path: str):
+        try:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS llm_cache_expires_at ON llm_cache (expires_at)")
+            self._purge_disk()
+        except sqlite3.Error as e:
+            logger.error(f"LLM cache disk tier disabled: {str(e)}")
+            self._db = None
+
+    async def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+            self.expirations += 1
+
+        if self._db is not None:
+            row = await asyncio.to_thread(self._disk_get, key, now)
+            if row is not None:
+                self._store_memory(key, row[0], row[1])
+                self.hits += 1
+                self.disk_hits += 1
+                return row[0]
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: str, ttl_seconds: Optional[float] = None):
+        expires_at = time.time() + (ttl_seconds if ttl_seconds is not None else self.ttl_seconds)
+        self._store_memory(key, value, expires_at)
+        if self._db is not None:
+            await asyncio.to_thread(self._disk_set, key, value, expires_at)
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[str, float]]:
+        with self._db_lock:
+            if self._db is None:
+                return None
+            try:
+                return self._db.execute(
+                    "SELECT value, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?",
+                    (key, now)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.error(f"LLM cache disk read failed: {str(e)}")
+                return None
+
+    def _disk_set(self, key: str, value: str, expires_at: float):
+        with self._db_lock:
+            if self._db is None:
+                return
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, value, expires_at)
+                )
+                self._db.commit()
+                self._writes_since_purge += 1
+                # Often enough that the table never grows far past its cap
+                if (self._writes_since_purge >= max(1, self.max_disk_entries // 10)
+                        or time.monotonic() - self._purged_at >= self.purge_interval_seconds):
+                    self._purge_disk()
+            except sqlite3.Error as e:
+                logger.error(f"LLM cache disk write failed: {str(e)}")
+
+    def _purge_disk(self):
+        """Drop expired rows, then the soonest-expiring ones over ``max_disk_entries``; holds ``_db_lock``"""
+        purged = self._db.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+        excess = self._db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_disk_entries
+        if excess > 0:
+            purged += self._db.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY expires_at LIMIT ?)",
+                (excess,)
+            ).rowcount
+        self._db.commit()
+        self.disk_purged += purged
+        self._writes_since_purge = 0
+        self._purged_at = time.monotonic()
+
+    def _store_memory(self, key: str, value: str, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        with self._db_lock:
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+
+    def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "disk_tier": self._db is not None,
+            "max_disk_entries": self.max_disk_entries,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "disk_purged": self.disk_purged,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one underlying call.
+
+    The first caller starts the work as its own task; later callers with the
+    same key await that task.  Every caller waits through ``asyncio.shield``,
+    so a disconnecting client only cancels its own wait and the shared call
+    keeps running for everyone else (its result still lands in the cache).
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, "asyncio.Future"] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._calls[key] = task
+            task.add_done_callback(lambda done, key=key: self._forget(key, done))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: "asyncio.Future"):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception as retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._calls),
+            "started": self.started,
+            "coalesced": self.coalesced
+        }
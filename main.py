@@ -1,28 +1,49 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Request, status
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple, Union, Callable, Awaitable, AsyncIterator
 from datetime import datetime, timedelta
 import uvicorn
 import json
 import uuid
-from passlib.context import CryptContext
 import jwt
 from functools import wraps
-import random
 import asyncio
+import time
 import logging
+import os
 from contextlib import asynccontextmanager
+import numpy as np
+from importlib.util import find_spec
+from embeddings import EmbeddingBatcher, EmbeddingStore
+from embedding_sidecar import EmbeddingClient
+from vector_index import create_vector_index
+from text_search import BM25Index, tokenize
+from job_search import JobSearch, InvalidCursorError
+from job_fields import normalize_job, normalize_distance
+from geo_index import GeoIndex
+from task_queue import TaskQueue, TaskWorkerPool, Task, RetryLater
+from change_tracker import ChangeTracker, ReembedWorker
+from repositories import UserRepository, DuplicateEmailError, USER_INDEXES, JOB_INDEXES
+from storage import open_storage
+from security import PasswordHasher, HasherBusyError, TokenCache
+from llm_cache import LLMResponseCache, SingleFlight, make_cache_key
+from metrics import REGISTRY, CONTENT_TYPE, Counter, Histogram, CallbackMetric, RequestMetricsMiddleware, register_route_series
+from generation_profiles import GENERATION_PROFILES, TaskProfile, TaskMetrics, task_profile, fill_prompt, estimate_tokens
+from match_analysis import (
+    ANALYSIS_FORMAT, MATCH_ANALYSIS_SCHEMA, MATCH_ANALYSIS_INDEXES, IncrementalJSONParser, MatchAnalysisStore,
+    normalize_match_analysis, text_version
+)
+from granite_runtime import (
+    GraniteRunner, StubGraniteClient, LatencyWindow, CircuitBreaker, GraniteUnavailableError, CircuitOpenError, hedged,
+    DESCRIPTION_MARKER, SUMMARY_MARKER, split_description_and_summary
+)
 
-# IBM Watson ML and AI imports
-try:
-    from ibm_watson_machine_learning import APIClient
-    from sentence_transformers import SentenceTransformer
-    import numpy as np
-    IBM_AVAILABLE = True
-except ImportError:
-    IBM_AVAILABLE = False
+# IBM Watson ML and AI imports happen in GraniteService.initialize; only check they are installed here
+IBM_AVAILABLE = find_spec("ibm_watson_machine_learning") is not None and find_spec("sentence_transformers") is not None
+if not IBM_AVAILABLE:
     print("Warning: IBM Watson ML or sentence-transformers not installed. AI features will use fallback implementations.")
 
 # Configuration
@@ -33,6 +54,52 @@ class Settings:
     IBM_PROJECT_ID: Optional[str] = None  # Your IBM Project ID
     GRANITE_MODEL_ID: str = "ibm/granite-3-3b-instruct"  # Granite model ID
     GRANITE_DEPLOYMENT_ID: Optional[str] = None  # Optional deployment ID
+    GRANITE_MAX_CONCURRENCY: int = 4  # Max Granite generations in flight at once
+    GRANITE_TIMEOUT_SECONDS: float = 60.0  # Per-call generation timeout
+    LLM_CACHE_MAX_ENTRIES: int = 1024  # In-memory LRU size for generated text
+    LLM_CACHE_TTL_SECONDS: float = 3600.0  # How long a cached generation stays valid
+    LLM_CACHE_SQLITE_PATH: Optional[str] = None  # e.g. "llm_cache.db" to keep the cache across restarts
+    LLM_CACHE_SQLITE_MAX_ENTRIES: int = 100000  # Rows kept in the SQLite tier; the soonest to expire go first
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 10000  # Cached sentence embeddings (LRU)
+    EMBEDDING_BATCH_WINDOW_MS: float = 5.0  # How long to collect concurrent encode requests into one batch
+    EMBEDDING_MAX_BATCH_SIZE: int = 64  # Flush a batch early once this many texts are waiting
+    EMBEDDING_SIDECAR_SOCKET: Optional[str] = None  # Unix socket of embedding_sidecar.py; workers then share its model
+    SEARCH_DEPTH: int = 1000  # Jobs taken from each of the lexical and semantic rankings before fusion
+    SEARCH_RRF_K: int = 60  # Reciprocal-rank fusion constant
+    NEARBY_RADIUS_KM: float = 3.0  # Default radius of the "nearby" store and job queries
+    ENHANCEMENT_QUEUE_PATH: Optional[str] = None  # SQLite file of the job enhancement queue; None: "<SQLITE_PATH>-queue.db" with the sqlite backend, in memory otherwise
+    ENHANCEMENT_WORKERS: int = 2  # Job enhancements running at once
+    ENHANCEMENT_MAX_ATTEMPTS: int = 5  # Tries before a listing is published with the template description
+    ENHANCEMENT_RETRY_BASE_SECONDS: float = 2.0  # First retry delay, doubled on every further attempt
+    ENHANCEMENT_RETRY_MAX_SECONDS: float = 300.0  # Cap on the retry delay
+    ENHANCEMENT_POLL_SECONDS: float = 2.0  # How often job event streams re-check storage (other workers' results)
+    VECTOR_INDEX_BACKEND: str = "flat"  # "flat" (exact) or "hnsw" (approximate, needs hnswlib)
+    STORAGE_BACKEND: str = "memory"  # "memory" or "sqlite" (persistent, shareable between workers)
+    SQLITE_PATH: str = "fljobs.db"  # Database file for the sqlite backend
+    SQLITE_POOL_SIZE: int = 4  # Connections (and threads) in the sqlite pool
+    AI_LOAD_IN_BACKGROUND: bool = True  # Serve requests while the Granite client and embedding model load
+    AI_LOADING_RETRY_AFTER_SECONDS: int = 5  # Retry-After sent by AI endpoints that wait for the models
+    TOKEN_CACHE_MAX_ENTRIES: int = 10000  # Validated bearer tokens kept in memory
+    TOKEN_CACHE_TTL_SECONDS: float = 300.0  # Upper bound on how long a validated token is trusted without re-decoding
+    BCRYPT_ROUNDS: int = 12  # bcrypt cost; stored hashes are upgraded on the next login when this changes
+    PASSWORD_HASH_WORKERS: int = 2  # Threads running bcrypt
+    PASSWORD_HASH_MAX_PENDING: int = 100  # Queued hash/verify calls before returning 503
+    GRANITE_STUB_LATENCY: Optional[float] = None  # Set (seconds) to use the local stub model instead of IBM Cloud
+    JOB_GENERATION_MODE: str = "parallel"  # "sequential", "single_call" or "parallel" description + summary generation
+    GRANITE_STUB_ERROR_RATE: float = 0.0  # Share of stub calls that fail, to rehearse outages
+    GRANITE_STUB_HANG_RATE: float = 0.0  # Share of stub calls that hang for GRANITE_STUB_HANG_SECONDS and then fail
+    GRANITE_STUB_HANG_SECONDS: float = 60.0
+    GRANITE_INTERACTIVE_DEADLINE_SECONDS: float = 10.0  # Deadline of Granite calls made while a client waits
+    GRANITE_HEDGE_AFTER_SECONDS: Optional[float] = None  # Start a second attempt when a call is this slow (None: no hedging)
+    GRANITE_HEDGE_MAX_ATTEMPTS: int = 2  # Attempts per call including hedges
+    GRANITE_HEDGE_RETRY_DELAY_SECONDS: float = 0.25  # Pause (jittered) before retrying a failed attempt
+    GRANITE_BREAKER_WINDOW: int = 20  # Recent calls the circuit breaker judges Granite by
+    GRANITE_BREAKER_MIN_CALLS: int = 5  # Calls needed in the window before the breaker can open
+    GRANITE_BREAKER_ERROR_RATE: float = 0.5  # Failure share that opens the breaker
+    GRANITE_BREAKER_SLOW_CALL_SECONDS: float = 20.0  # A call at least this slow counts as slow
+    GRANITE_BREAKER_SLOW_RATE: float = 0.8  # Slow-call share that opens the breaker
+    GRANITE_BREAKER_OPEN_SECONDS: float = 30.0  # How long an open breaker sends everything to the fallbacks
+    GRANITE_BREAKER_PROBES: int = 1  # Successful half-open probe calls needed to close the breaker
 
 settings = Settings()
 
@@ -40,65 +107,37 @@ settings = Settings()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Metrics (GET /metrics); component metrics are declared in their own modules
+FALLBACK_ACTIVATIONS = Counter(
+    "fallback_activations_total", "Results served by a non-Granite fallback, by what was being produced",
+    labelnames=("kind",),
+    label_sets=[(kind,) for kind in ("job_description", "summary", "match_analysis", "match_score", "candidate_ranking", "recommendations")]
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by method, route template and status class",
+    labelnames=("method", "route", "status")
+)
+JWT_VERIFY_SECONDS = Histogram(
+    "jwt_verify_seconds", "Bearer token signature checks (tokens not yet in the token cache)",
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.01)
+)
+
+class ModelsLoadingError(Exception):
+    """The AI models are still loading in the background"""
+
 # Granite Service Integration
 class GraniteService:
-    def __init__(self):
-        self.client = None
-        self.embedding_model = None
-        self.is_ready = False
-        
-    async def initialize(self):
-        """Initialize IBM Watson ML client and embedding model"""
-        if not IBM_AVAILABLE:
-            logger.warning("IBM Watson ML not available. Using fallback implementations.")
-            self.is_ready = False
-            return
-            
-        try:
-            # Initialize IBM Watson ML client
-            wml_credentials = {
-                "url": settings.IBM_URL,
-                "apikey": settings.IBM_API_KEY
-            }
-            
-            self.client = APIClient(wml_credentials)
-            
-            if settings.IBM_SPACE_ID:
-                self.client.set.default_space(settings.IBM_SPACE_ID)
-            elif settings.IBM_PROJECT_ID:
-                self.client.set.default_project(settings.IBM_PROJECT_ID)
-            
-            # Initialize sentence transformer for embeddings
-            self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-            
-            self.is_ready = True
-            logger.info("Granite service initialized successfully")
-            
-        except Exception as e:
-            logger.error(f"Failed to initialize Granite service: {str(e)}")
-            self.is_ready = False
-    
-    async def cleanup(self):
-        """Cleanup resources"""
-        self.is_ready = False
-        logger.info("Granite service cleaned up")
-    
-    async def generate_enhanced_job_description(self, job_data: Dict[str, Any]) -> Dict[str, str]:
-        """Generate enhanced job description using IBM Granite"""
-        try:
-            if not self.is_ready:
-                return self._create_fallback_description(job_data)
-                
-            prompt = f"""
+    # Prompt templates; each generation task's sampling parameters and budgets are in GENERATION_PROFILES
+    job_description_template = """
             Create a comprehensive and professional job description based on the following information:
             
-            Job Title: {job_data.get('position', '')}
-            Store/Company: {job_data.get('store_name', '')}
-            Location: {job_data.get('location', '')}
-            Work Hours: {job_data.get('work_hours', '')}
-            Wage: {job_data.get('wage', '')}
-            Basic Responsibilities: {job_data.get('responsibilities', '')}
-            Basic Requirements: {job_data.get('requirements', '')}
+            Job Title: {position}
+            Store/Company: {store_name}
+            Location: {location}
+            Work Hours: {work_hours}
+            Wage: {wage}
+            Basic Responsibilities: {responsibilities}
+            Basic Requirements: {requirements}
             
             Please create a professional, detailed job description that includes:
             1. An engaging job overview
@@ -111,11 +150,19 @@ class GraniteService:
             Make it attractive to potential candidates while being clear about expectations.
             Format it professionally for a job posting.
             """
+    
+    combined_job_template = job_description_template + f"""
+            After the job description, write a brief, engaging summary (2-3 sentences, under 100 words)
+            highlighting the key role, location, and main appeal to job seekers.
             
-            enhanced_description = await self._generate_text(prompt)
-            
-            # Generate summary
-            summary_prompt = f"""
+            Use exactly this layout:
+            {DESCRIPTION_MARKER}
+            <the full job description>
+            {SUMMARY_MARKER}
+            <the summary>
+            """
+    
+    description_summary_template = """
             Create a brief, engaging summary (2-3 sentences) for this job posting:
             
             {enhanced_description}
@@ -123,107 +170,761 @@ class GraniteService:
             The summary should highlight the key role, location, and main appeal to job seekers.
             Keep it under 100 words.
             """
+    
+    field_summary_template = """
+            Create a brief, engaging summary (2-3 sentences) for a job posting with these details:
             
-            summary = await self._generate_text(summary_prompt)
+            Job Title: {position}
+            Store/Company: {store_name}
+            Location: {location}
+            Work Hours: {work_hours}
+            Wage: {wage}
+            Responsibilities: {responsibilities}
+            Requirements: {requirements}
             
-            return {
-                'enhanced_description': enhanced_description,
-                'summary': summary,
-                'formatted_post': self._format_job_post(job_data, enhanced_description)
-            }
+            The summary should highlight the key role, location, and main appeal to job seekers.
+            Keep it under 100 words.
+            """
+    
+    match_analysis_template = """
+            Analyze the job match between this candidate and job requirements:
+            
+            CANDIDATE PROFILE:
+            {candidate_text}
+            
+            JOB REQUIREMENTS:
+            {job_requirements}
+            
+            Respond with only a JSON object, keys in this order, that follows this JSON schema:
+            """ + json.dumps(MATCH_ANALYSIS_SCHEMA).replace("{", "{{").replace("}", "}}") + """
+            
+            match_score is how well the candidate fits the job (0-100). strengths are what matches well,
+            gaps what might be missing and recommendations how the candidate could improve; keep each item
+            short and specific to this candidate and job. summary is one or two sentences.
+            """
+    
+    def __init__(self):
+        self.client = None
+        self.embedding_model = None
+        self.is_ready = False
+        # pending -> loading -> ready | failed | unavailable (package or credentials missing)
+        self.component_status: Dict[str, str] = {"granite": "pending", "embeddings": "pending"}
+        self.runner = GraniteRunner(
+            max_concurrency=settings.GRANITE_MAX_CONCURRENCY,
+            timeout_seconds=settings.GRANITE_TIMEOUT_SECONDS
+        )
+        self.cache = LLMResponseCache(
+            max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+            sqlite_path=settings.LLM_CACHE_SQLITE_PATH,
+            max_disk_entries=settings.LLM_CACHE_SQLITE_MAX_ENTRIES
+        )
+        self.inflight = SingleFlight()
+        self.task_metrics = TaskMetrics(GENERATION_PROFILES)
+        self.breaker = CircuitBreaker(
+            window=settings.GRANITE_BREAKER_WINDOW,
+            min_calls=settings.GRANITE_BREAKER_MIN_CALLS,
+            error_threshold=settings.GRANITE_BREAKER_ERROR_RATE,
+            slow_call_seconds=settings.GRANITE_BREAKER_SLOW_CALL_SECONDS,
+            slow_threshold=settings.GRANITE_BREAKER_SLOW_RATE,
+            open_seconds=settings.GRANITE_BREAKER_OPEN_SECONDS,
+            half_open_probes=settings.GRANITE_BREAKER_PROBES
+        )
+        self.embeddings = EmbeddingBatcher(
+            store=EmbeddingStore(max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES),
+            window_ms=settings.EMBEDDING_BATCH_WINDOW_MS,
+            max_batch_size=settings.EMBEDDING_MAX_BATCH_SIZE
+        )
+        self.job_index = create_vector_index(settings.VECTOR_INDEX_BACKEND)
+        self.keyword_index = BM25Index()
+        self.job_search = JobSearch(self.keyword_index, self.job_index, depth=settings.SEARCH_DEPTH, rrf_k=settings.SEARCH_RRF_K)
+        self.profile_vectors: Dict[str, Any] = {}
+        self.changes = ChangeTracker()
+        # Structured match analyses per (candidate, job) version; attached once storage is open
+        self.analyses: Optional[MatchAnalysisStore] = None
+        self.analysis_stats = {"stored": 0, "generated": 0, "unparsable": 0, "fallback": 0}
+        
+    async def initialize(self):
+        """
+        Initialize IBM Watson ML client and embedding model
+
+        The heavy imports and the model load run in threads, concurrently, so
+        this can run as a background task while the API already serves requests.
+        """
+        self.runner.start()
+        self.component_status["granite"] = "loading"
+        embeddings_available = IBM_AVAILABLE or settings.EMBEDDING_SIDECAR_SOCKET
+        self.component_status["embeddings"] = "loading" if embeddings_available else "unavailable"
+        
+        await asyncio.gather(self._load_granite(), self._load_embeddings())
+        
+        self.is_ready = self.component_status["granite"] == "ready" and self.component_status["embeddings"] != "failed"
+        if self.is_ready:
+            logger.info("Granite service initialized successfully")
+    
+    async def _load_granite(self):
+        if settings.GRANITE_STUB_LATENCY is not None:
+            logger.warning("Using local stub Granite model (latency %.2fs)", settings.GRANITE_STUB_LATENCY)
+            self.client = StubGraniteClient(
+                latency_seconds=settings.GRANITE_STUB_LATENCY,
+                error_rate=settings.GRANITE_STUB_ERROR_RATE,
+                hang_rate=settings.GRANITE_STUB_HANG_RATE,
+                hang_seconds=settings.GRANITE_STUB_HANG_SECONDS
+            )
+            self.component_status["granite"] = "ready"
+            return
+        
+        if not IBM_AVAILABLE:
+            logger.warning("IBM Watson ML not available. Using fallback implementations.")
+            self.component_status["granite"] = "unavailable"
+            return
+        
+        try:
+            self.client = await asyncio.to_thread(self._create_client)
+            self.component_status["granite"] = "ready"
+        except Exception as e:
+            logger.error(f"Failed to initialize Granite service: {str(e)}")
+            self.component_status["granite"] = "failed"
+    
+    def _create_client(self):
+        from ibm_watson_machine_learning import APIClient
+        
+        # Initialize IBM Watson ML client
+        wml_credentials = {
+            "url": settings.IBM_URL,
+            "apikey": settings.IBM_API_KEY
+        }
+        
+        client = APIClient(wml_credentials)
+        
+        if settings.IBM_SPACE_ID:
+            client.set.default_space(settings.IBM_SPACE_ID)
+        elif settings.IBM_PROJECT_ID:
+            client.set.default_project(settings.IBM_PROJECT_ID)
+        return client
+    
+    async def _load_embeddings(self):
+        if settings.EMBEDDING_SIDECAR_SOCKET:
+            try:
+                client = EmbeddingClient(settings.EMBEDDING_SIDECAR_SOCKET)
+                await asyncio.to_thread(client.connect)
+                self.embedding_model = client
+                self.embeddings.attach(client)
+                self.component_status["embeddings"] = "ready"
+            except Exception as e:
+                logger.error(f"Embedding sidecar unreachable at {settings.EMBEDDING_SIDECAR_SOCKET}: {str(e)}")
+                self.component_status["embeddings"] = "failed"
+            return
+        
+        if not IBM_AVAILABLE:
+            return
+        
+        try:
+            # Initialize sentence transformer for embeddings
+            self.embedding_model = await asyncio.to_thread(self._create_embedding_model)
+            self.embeddings.attach(self.embedding_model)
+            self.component_status["embeddings"] = "ready"
+        except Exception as e:
+            logger.error(f"Failed to load embedding model: {str(e)}")
+            self.component_status["embeddings"] = "failed"
+    
+    def _create_embedding_model(self):
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer('all-MiniLM-L6-v2')
+    
+    @property
+    def embeddings_ready(self) -> bool:
+        """An embedding model is attached (none with the stub client or without sentence-transformers), whatever Granite's state"""
+        return self.embeddings.model is not None
+    
+    def components(self) -> Dict[str, str]:
+        """Readiness per AI component, including the job vector index built from the embeddings"""
+        if not len(self.changes):
+            job_index = "ready"
+        elif self.embeddings.model is not None:
+            job_index = "indexing"
+        else:
+            job_index = "pending" if self.loading else "unavailable"
+        return {**self.component_status, "job_index": job_index}
+    
+    @property
+    def loading(self) -> bool:
+        return any(state in ("pending", "loading") for state in self.component_status.values())
+    
+    async def cleanup(self):
+        """Cleanup resources"""
+        self.is_ready = False
+        self.runner.shutdown()
+        self.cache.close()
+        self.embeddings.shutdown()
+        logger.info("Granite service cleaned up")
+    
+    async def generate_enhanced_job_description(self, job_data: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Generate enhanced job description using IBM Granite
+
+        settings.JOB_GENERATION_MODE picks the strategy:
+        - "sequential": description first, then a summary of that description (two round-trips)
+        - "single_call": one structured prompt returns both description and summary
+        - "parallel": the summary is written from the raw form fields while the description generates
+        """
+        try:
+            if not self.is_ready or self.breaker.rejecting:
+                FALLBACK_ACTIVATIONS.labels("job_description").inc()
+                return self._create_fallback_description(job_data)
+            return await self.enhance_job_description(job_data)
             
         except Exception as e:
             logger.error(f"Error generating enhanced job description: {str(e)}")
+            FALLBACK_ACTIVATIONS.labels("job_description").inc()
             return self._create_fallback_description(job_data)
     
+    async def enhance_job_description(self, job_data: Dict[str, Any]) -> Dict[str, str]:
+        """
+        The Granite part of generate_enhanced_job_description.  Raises
+        GraniteUnavailableError if the description cannot be generated, so a
+        background worker can retry it; a failed summary falls back to the template.
+        """
+        mode = settings.JOB_GENERATION_MODE
+        
+        if mode == "single_call":
+            combined = await self._generate_text("description_and_summary", self._build_combined_job_prompt(job_data))
+            enhanced_description, summary = split_description_and_summary(combined)
+        elif mode == "parallel":
+            enhanced_description, summary = await asyncio.gather(
+                self._generate_text("description", self._build_job_description_prompt(job_data)),
+                self._generate_text("summary", self._build_field_summary_prompt(job_data)),
+                return_exceptions=True
+            )
+            if isinstance(enhanced_description, BaseException):
+                raise enhanced_description
+        else:
+            enhanced_description = await self._generate_text("description", self._build_job_description_prompt(job_data))
+            try:
+                summary = await self._generate_text("summary", self._build_description_summary_prompt(enhanced_description))
+            except GraniteUnavailableError as e:
+                summary = e
+        
+        if not enhanced_description:
+            raise GraniteUnavailableError("Granite returned an empty description")
+        if not summary or isinstance(summary, BaseException):
+            FALLBACK_ACTIVATIONS.labels("summary").inc()
+            summary = self._create_fallback_description(job_data)['summary']
+        
+        return {
+            'enhanced_description': enhanced_description,
+            'summary': summary,
+            'formatted_post': self._format_job_post(job_data, enhanced_description)
+        }
+    
+    async def stream_enhanced_job_description(self, job_data: Dict[str, Any]) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Streaming variant of generate_enhanced_job_description.
+
+        Yields ("token", text) while the description is generated, then
+        ("result", dict) with the same keys as the non-streaming call.  The
+        summary is written from the form fields alongside the description (as
+        in "parallel" mode), so it is ready when the stream ends.  Without
+        Granite the fallback description is sent as a single token; if Granite
+        fails midway, ("replace", text) carries the fallback that replaces the
+        tokens already sent.
+        """
+        fallback = self._create_fallback_description(job_data)
+        if not self.is_ready or self.breaker.rejecting:
+            FALLBACK_ACTIVATIONS.labels("job_description").inc()
+            yield "token", fallback['enhanced_description']
+            yield "result", fallback
+            return
+        
+        summary_task = asyncio.create_task(self._generate_text("summary", self._build_field_summary_prompt(job_data)))
+        parts = []
+        try:
+            async for chunk in self._stream_text("description", self._build_job_description_prompt(job_data)):
+                parts.append(chunk)
+                yield "token", chunk
+            enhanced_description = "".join(parts).strip()
+            if not enhanced_description:
+                raise Exception("empty generation")
+        except Exception as e:
+            logger.error(f"Error streaming enhanced job description: {str(e)}")
+            summary_task.cancel()
+            FALLBACK_ACTIVATIONS.labels("job_description").inc()
+            yield ("replace" if parts else "token"), fallback['enhanced_description']
+            yield "result", fallback
+            return
+        except BaseException:
+            # The consumer stopped early
+            summary_task.cancel()
+            raise
+        
+        try:
+            summary = await summary_task
+        except GraniteUnavailableError:
+            summary = None
+        if not summary:
+            FALLBACK_ACTIVATIONS.labels("summary").inc()
+            summary = fallback['summary']
+        yield "result", {
+            'enhanced_description': enhanced_description,
+            'summary': summary,
+            'formatted_post': self._format_job_post(job_data, enhanced_description)
+        }
+    
+    def _fill_prompt(self, task: str, template: str, **fields: Any) -> str:
+        """``template`` filled in, with the longest fields trimmed to fit the task's prompt budget"""
+        prompt, truncated = fill_prompt(task_profile(task), template, **fields)
+        if truncated:
+            self.task_metrics.record_truncation(task)
+        return prompt
+    
+    def _job_prompt_fields(self, job_data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            field: job_data.get(field, '')
+            for field in ('position', 'store_name', 'location', 'work_hours', 'wage', 'responsibilities', 'requirements')
+        }
+    
+    def _build_job_description_prompt(self, job_data: Dict[str, Any]) -> str:
+        """Prompt for the full job description"""
+        return self._fill_prompt("description", self.job_description_template, **self._job_prompt_fields(job_data))
+    
+    def _build_description_summary_prompt(self, enhanced_description: str) -> str:
+        """Prompt summarizing an already generated description (cut to the summary's prompt budget)"""
+        return self._fill_prompt("summary", self.description_summary_template, enhanced_description=enhanced_description)
+    
+    def _build_field_summary_prompt(self, job_data: Dict[str, Any]) -> str:
+        """Prompt summarizing the raw form fields, so it can run alongside the description"""
+        return self._fill_prompt("summary", self.field_summary_template, **self._job_prompt_fields(job_data))
+    
+    def _build_combined_job_prompt(self, job_data: Dict[str, Any]) -> str:
+        """Prompt returning description and summary in one response"""
+        return self._fill_prompt("description_and_summary", self.combined_job_template, **self._job_prompt_fields(job_data))
+    
     async def calculate_advanced_match_score(self, job_requirements: str, candidate_profile: Dict[str, Any]) -> Dict[str, Any]:
         """Calculate advanced job matching score using AI analysis"""
         try:
-            if not self.is_ready:
+            if not self.embeddings_ready:
+                FALLBACK_ACTIVATIONS.labels("match_score").inc()
                 return self._calculate_simple_match(job_requirements, candidate_profile)
             
             # Create text representations
             candidate_text = self._create_candidate_text(candidate_profile)
             
-            # Generate embeddings
-            candidate_embedding = self.embedding_model.encode([candidate_text])
-            job_embedding = self.embedding_model.encode([job_requirements])
+            # Generate embeddings (cached, micro-batched with concurrent requests, unit length)
+            candidate_vector, job_vector = await self.embeddings.encode([candidate_text, job_requirements])
             
-            # Calculate similarity
-            similarity = np.dot(candidate_embedding[0], job_embedding[0]) / (
-                np.linalg.norm(candidate_embedding[0]) * np.linalg.norm(job_embedding[0])
-            )
+            # Cosine similarity of normalized vectors is a plain dot product
+            similarity = np.dot(candidate_vector, job_vector)
             
             base_score = float(similarity) * 100
             
-            # Generate detailed analysis using Granite
-            analysis_prompt = f"""
-            Analyze the job match between this candidate and job requirements:
-            
-            CANDIDATE PROFILE:
-            {candidate_text}
-            
-            JOB REQUIREMENTS:
-            {job_requirements}
-            
-            Provide analysis including:
-            1. Match score (0-100)
-            2. Key strengths (what matches well)
-            3. Potential gaps (what might be missing)
-            4. Recommendations for improvement
-            
-            Be specific and helpful in your analysis.
-            """
-            
-            analysis_text = await self._generate_text(analysis_prompt)
-            
             return {
                 'match_score': min(100, max(0, int(base_score))),
                 'compatibility': self._get_compatibility_level(base_score),
-                'analysis': {
-                    'detailed_analysis': analysis_text,
-                    'embedding_score': base_score,
-                    'strengths': self._extract_strengths(analysis_text),
-                    'gaps': self._extract_gaps(analysis_text),
-                    'recommendations': self._extract_recommendations(analysis_text)
-                }
+                'analysis': await self._analyze_match(candidate_text, job_requirements, base_score)
             }
             
         except Exception as e:
             logger.error(f"Error calculating advanced match score: {str(e)}")
+            FALLBACK_ACTIVATIONS.labels("match_score").inc()
             return self._calculate_simple_match(job_requirements, candidate_profile)
     
-    async def _generate_text(self, prompt: str) -> str:
-        """Generate text using IBM Granite model"""
+    async def rank_candidates(self, job_requirements: str, candidates: List[Dict[str, Any]],
+                              top_k: int = 10, analyze_top: int = 0, job_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Rank many candidates against one job.
+
+        The job is embedded once and all candidates are scored with a single
+        matrix-vector product; the Granite analysis only runs for the best
+        ``analyze_top`` candidates, and is stored per candidate and ``job_id``.
+        """
+        if not candidates or top_k <= 0:
+            return []
+        
         try:
-            if not self.client:
-                raise Exception("IBM Watson ML client not initialized")
-                
-            generation_params = {
-                "max_new_tokens": 800,
-                "temperature": 0.7,
-                "top_p": 0.9,
-                "repetition_penalty": 1.1
-            }
+            if not self.embeddings_ready:
+                FALLBACK_ACTIVATIONS.labels("candidate_ranking").inc()
+                return self._rank_candidates_simple(job_requirements, candidates, top_k)
+            
+            candidate_texts = [self._create_candidate_text(c) for c in candidates]
+            vectors = await self.embeddings.encode([job_requirements] + candidate_texts)
+            scores = (vectors[1:] @ vectors[0]) * 100
+            
+            k = min(top_k, len(candidates))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            
+            ranked = [
+                {
+                    'candidate_id': candidates[i].get('id'),
+                    'name': candidates[i].get('name'),
+                    'match_score': min(100, max(0, int(scores[i]))),
+                    'compatibility': self._get_compatibility_level(float(scores[i])),
+                    'embedding_score': float(scores[i])
+                }
+                for i in top
+            ]
             
+            n_analyze = min(analyze_top, len(ranked))
+            if n_analyze:
+                analyses = await asyncio.gather(*[
+                    self._analyze_match(
+                        candidate_texts[i], job_requirements, float(scores[i]), candidates[i].get('id'), job_id
+                    )
+                    for i in top[:n_analyze]
+                ])
+                for entry, analysis in zip(ranked, analyses):
+                    entry['analysis'] = analysis
+            
+            return ranked
+            
+        except Exception as e:
+            logger.error(f"Error ranking candidates: {str(e)}")
+            FALLBACK_ACTIVATIONS.labels("candidate_ranking").inc()
+            return self._rank_candidates_simple(job_requirements, candidates, top_k)
+    
+    def mark_job_changed(self, job_id: Any, job: Optional[Dict[str, Any]] = None):
+        """
+        Flag a created, edited or deleted job for re-embedding and update the
+        keyword index right away; pass the job record, or None if it was deleted.
+        """
+        if job is None:
+            self.job_search.remove(job_id)
+        else:
+            self.job_search.upsert(job_id, job)
+        self.changes.mark("job", job_id)
+    
+    def mark_profile_changed(self, user_id: str):
+        """Flag a registered or edited profile for re-embedding"""
+        self.changes.mark("profile", user_id)
+    
+    async def run_reembed_worker(self, load_text: Callable[[str, str], Awaitable[Optional[str]]]):
+        """Background task keeping the job index and profile vectors in sync with the data"""
+        worker = ReembedWorker(
+            self.changes,
+            encode=self.embeddings.encode,
+            load_text=load_text,
+            apply=self._apply_reembedded,
+            ready=lambda: self.embeddings_ready,
+            batch_size=settings.EMBEDDING_MAX_BATCH_SIZE
+        )
+        await worker.run()
+    
+    def _apply_reembedded(self, upserts: List[Tuple[str, str, Any]], deletes: List[Tuple[str, str]]):
+        # Runs without awaiting, so readers see the whole batch or none of it
+        job_ids = [record_id for kind, record_id, _ in upserts if kind == "job"]
+        if job_ids:
+            self.job_index.add_many(job_ids, [vector for kind, _, vector in upserts if kind == "job"])
+        for kind, record_id, vector in upserts:
+            if kind == "profile":
+                self.profile_vectors[record_id] = vector
+        for kind, record_id in deletes:
+            if kind == "job":
+                self.job_index.remove(record_id)
+            elif kind == "profile":
+                self.profile_vectors.pop(record_id, None)
+    
+    async def recommend_jobs(self, user_id: str, profile: Dict[str, Any], top_k: int = 10) -> List[Tuple[str, float]]:
+        """Return (job_id, cosine similarity) pairs for the jobs closest to a user profile"""
+        query = self.profile_vectors.get(user_id)
+        if query is None or self.changes.is_dirty("profile", user_id):
+            # Not re-embedded yet; encode the current profile directly
+            query = await self.embeddings.encode_one(self._create_candidate_text(profile))
+        return self.job_index.search(query, top_k)
+    
+    async def search_jobs(self, query: str, **options) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Hybrid job search; lexical only until the embedding model and job vectors are available"""
+        query_vector = None
+        if self.embeddings_ready and len(self.job_index):
+            try:
+                query_vector = await self.embeddings.encode_one(query)
+            except Exception as e:
+                logger.error(f"Error embedding search query: {str(e)}")
+        return self.job_search.search(query, query_vector, **options)
+    
+    def recommend_jobs_by_keywords(self, profile: Dict[str, Any], top_k: int = 10) -> List[Tuple[str, float]]:
+        """
+        Fallback for recommend_jobs: BM25 retrieves the jobs sharing the most
+        weighted terms with the profile, which are then scored (0-100) and
+        reordered by how much of each job the profile covers, like
+        _calculate_simple_match.
+        """
+        candidate_text = self._create_candidate_text(profile)
+        hits = self.keyword_index.search(candidate_text, max(top_k * 3, 50))
+        scored = []
+        for job_id, _ in hits:
+            scored.append((job_id, self._keyword_match_percentage(self.keyword_index.terms(job_id), candidate_text)))
+        scored.sort(key=lambda pair: pair[1], reverse=True)
+        return scored[:top_k]
+    
+    def _rank_candidates_simple(self, job_requirements: str, candidates: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        """Keyword-based ranking used when embeddings are unavailable"""
+        ranked = []
+        for candidate in candidates:
+            result = self._calculate_simple_match(job_requirements, candidate)
+            ranked.append({
+                'candidate_id': candidate.get('id'),
+                'name': candidate.get('name'),
+                'match_score': result['match_score'],
+                'compatibility': result['compatibility'],
+                'embedding_score': result['analysis']['embedding_score']
+            })
+        ranked.sort(key=lambda entry: entry['match_score'], reverse=True)
+        return ranked[:top_k]
+    
+    async def _analyze_match(self, candidate_text: str, job_requirements: str, base_score: float,
+                             candidate_id: Any = None, job_id: Any = None) -> Dict[str, Any]:
+        """
+        Structured Granite analysis of one candidate/job pair.
+
+        Analyses are stored per (candidate, job) with the versions of both
+        texts, and served from the store until either side changes; without
+        ids the texts' versions identify the pair.  Falls back to the keyword
+        analysis when Granite is unavailable or returns nothing usable.
+        """
+        candidate_version, job_version = text_version(candidate_text), text_version(job_requirements)
+        candidate_key = str(candidate_id) if candidate_id is not None else candidate_version
+        job_key = str(job_id) if job_id is not None else job_version
+        analyzer = f"{settings.GRANITE_DEPLOYMENT_ID or settings.GRANITE_MODEL_ID}:{ANALYSIS_FORMAT}"
+        
+        try:
+            if self.analyses is not None:
+                stored = await self.analyses.get(candidate_key, candidate_version, job_key, job_version, analyzer)
+                if stored is not None:
+                    self.analysis_stats["stored"] += 1
+                    return self._analysis_result(stored, base_score, "stored")
+            
+            # Concurrent views of the same pair share one generation; it keeps
+            # running (and is stored) if this caller's deadline passes first
+            analysis = await asyncio.wait_for(
+                self.inflight.do(
+                    f"analysis:{candidate_key}:{candidate_version}:{job_key}:{job_version}",
+                    lambda: self._generate_match_analysis(
+                        candidate_text, job_requirements, (candidate_key, candidate_version, job_key, job_version, analyzer)
+                    )
+                ),
+                settings.GRANITE_INTERACTIVE_DEADLINE_SECONDS
+            )
+        except Exception as e:
+            if not isinstance(e, (GraniteUnavailableError, asyncio.TimeoutError)):
+                logger.error(f"Error analyzing match: {str(e)}")
+            self.analysis_stats["fallback"] += 1
+            FALLBACK_ACTIVATIONS.labels("match_analysis").inc()
+            # Keyword analysis, keeping the embedding score
+            return {**self._keyword_analysis(job_requirements, candidate_text), 'embedding_score': base_score, 'source': 'keywords'}
+        
+        return self._analysis_result(analysis, base_score, "granite")
+    
+    async def _generate_match_analysis(self, candidate_text: str, job_requirements: str,
+                                       store_key: Tuple[str, str, str, str, str]) -> Dict[str, Any]:
+        """Stream the analysis through the JSON parser, stopping as soon as the object is complete, and store it"""
+        prompt = self._fill_prompt(
+            "match_analysis", self.match_analysis_template, candidate_text=candidate_text, job_requirements=job_requirements
+        )
+        parser = IncrementalJSONParser()
+        chunks = self._stream_text("match_analysis", prompt)
+        try:
+            async for chunk in chunks:
+                if parser.feed(chunk):
+                    break
+        finally:
+            await chunks.aclose()
+        
+        analysis = normalize_match_analysis(parser.value())
+        if analysis is None:
+            self.analysis_stats["unparsable"] += 1
+            raise GraniteUnavailableError("Granite returned no usable match analysis")
+        self.analysis_stats["generated"] += 1
+        if self.analyses is not None:
+            await self.analyses.put(*store_key, analysis)
+        return analysis
+    
+    def _analysis_result(self, analysis: Dict[str, Any], base_score: float, source: str) -> Dict[str, Any]:
+        return {
+            'detailed_analysis': analysis['summary'],
+            'embedding_score': base_score,
+            'ai_match_score': analysis['match_score'],
+            'strengths': analysis['strengths'],
+            'gaps': analysis['gaps'],
+            'recommendations': analysis['recommendations'],
+            'source': source
+        }
+    
+    async def _generate_text(self, task: str, prompt: str, deadline: Optional[float] = None) -> str:
+        """
+        Generate text for ``task`` (a GENERATION_PROFILES key) using IBM Granite model.
+
+        Raises GraniteUnavailableError when there is no client, the prompt is
+        over the task's token budget, the circuit breaker is open, or the call
+        fails or misses its ``deadline`` (seconds, default
+        GRANITE_TIMEOUT_SECONDS); callers then use their fallbacks.
+        """
+        if not self.client:
+            raise GraniteUnavailableError("IBM Watson ML client not initialized")
+        
+        profile = task_profile(task)
+        self._check_prompt(profile, prompt)
+        cache_key = self._cache_key(profile, prompt)
+        cached = await self.cache.get(cache_key)
+        if cached is not None:
+            self.task_metrics.record_cache_hit(task)
+            return cached
+        if self.breaker.rejecting:
+            raise CircuitOpenError(self.breaker.retry_after())
+        
+        try:
+            # Concurrent callers with the same key share one Granite call; the
+            # deadline only ends this caller's wait, the call itself still fills the cache
+            return await asyncio.wait_for(
+                self.inflight.do(cache_key, lambda: self._call_granite(profile, cache_key, prompt)),
+                deadline or self.runner.timeout_seconds
+            )
+        except GraniteUnavailableError:
+            raise
+        except asyncio.TimeoutError:
+            logger.error(f"Granite generation missed its {deadline or self.runner.timeout_seconds}s deadline")
+            raise GraniteUnavailableError("deadline exceeded")
+        except Exception as e:
+            logger.error(f"Error generating text with Granite: {str(e)}")
+            raise GraniteUnavailableError(str(e)) from e
+    
+    def _check_prompt(self, profile: TaskProfile, prompt: str):
+        tokens = estimate_tokens(prompt)
+        if tokens > profile.max_prompt_tokens:
+            self.task_metrics.record_error(profile.name)
+            raise GraniteUnavailableError(
+                f"{profile.name} prompt is about {tokens} tokens, over its {profile.max_prompt_tokens}-token budget"
+            )
+    
+    def _cache_key(self, profile: TaskProfile, prompt: str) -> str:
+        return make_cache_key(settings.GRANITE_DEPLOYMENT_ID or settings.GRANITE_MODEL_ID, profile.params(), prompt)
+    
+    async def _stream_text(self, task: str, prompt: str) -> AsyncIterator[str]:
+        """Chunks of a Granite generation for ``task`` as they arrive; a cached generation comes as one chunk"""
+        if not self.client:
+            raise GraniteUnavailableError("IBM Watson ML client not initialized")
+        
+        profile = task_profile(task)
+        self._check_prompt(profile, prompt)
+        cache_key = self._cache_key(profile, prompt)
+        cached = await self.cache.get(cache_key)
+        if cached is not None:
+            self.task_metrics.record_cache_hit(task)
+            yield cached
+            return
+        
+        ticket = self.breaker.try_acquire()
+        if ticket is None:
+            raise CircuitOpenError(self.breaker.retry_after())
+        if settings.GRANITE_DEPLOYMENT_ID:
+            chunks = self.runner.stream(
+                self.client.deployments.generate_text_stream,
+                deployment_id=settings.GRANITE_DEPLOYMENT_ID,
+                prompt=prompt,
+                params=profile.params()
+            )
+        else:
+            chunks = self.runner.stream(
+                self.client.foundation_models.generate_text_stream,
+                model_id=settings.GRANITE_MODEL_ID,
+                prompt=prompt,
+                params=profile.params()
+            )
+        # The breaker judges a stream by its time to the first chunk
+        started = time.monotonic()
+        parts = []
+        try:
+            async for chunk in chunks:
+                if not parts:
+                    self.breaker.record(ticket, True, time.monotonic() - started)
+                    ticket = None
+                parts.append(chunk)
+                yield chunk
+        except GeneratorExit:
+            # The consumer stopped early (it had what it needed, or the client left); nothing is cached
+            self._record_stream(task, prompt, parts, started)
+            raise
+        except Exception:
+            self.task_metrics.record_error(task)
+            if ticket is not None:
+                self.breaker.record(ticket, False, time.monotonic() - started)
+                ticket = None
+            raise
+        finally:
+            if ticket is not None and not parts:
+                self.breaker.release(ticket)
+            # Stops the SDK iterator and frees its pool slot right away
+            await chunks.aclose()
+        generated_text = self._record_stream(task, prompt, parts, started)
+        if generated_text:
+            await self.cache.set(cache_key, generated_text)
+    
+    def _record_stream(self, task: str, prompt: str, parts: List[str], started: float) -> str:
+        generated_text = "".join(parts).strip()
+        # Streams carry no token counts, so both sides are estimates
+        self.task_metrics.record_call(task, time.monotonic() - started, estimate_tokens(prompt), estimate_tokens(generated_text))
+        return generated_text
+    
+    async def _call_granite(self, profile: TaskProfile, cache_key: str, prompt: str) -> str:
+        """
+        Run one Granite generation, hedged if GRANITE_HEDGE_AFTER_SECONDS is
+        set, record its tokens and latency under the task and cache the result
+        """
+        started = time.monotonic()
+        try:
+            response = await hedged(
+                lambda: self._granite_attempt(profile, prompt),
+                hedge_after=settings.GRANITE_HEDGE_AFTER_SECONDS,
+                max_attempts=settings.GRANITE_HEDGE_MAX_ATTEMPTS,
+                retry_delay=settings.GRANITE_HEDGE_RETRY_DELAY_SECONDS,
+                # Hedges add load, so only while the pool has room and Granite is healthy
+                can_hedge=lambda: self.runner.waiting == 0 and self.breaker.state == CircuitBreaker.CLOSED
+            )
+        except Exception:
+            self.task_metrics.record_error(profile.name)
+            raise
+        
+        result = response.get('results', [{}])[0]
+        generated_text = result.get('generated_text', '').strip()
+        self.task_metrics.record_call(
+            profile.name,
+            time.monotonic() - started,
+            result.get('input_token_count') or estimate_tokens(prompt),
+            result.get('generated_token_count') or estimate_tokens(generated_text),
+            result.get('stop_reason')
+        )
+        if generated_text:
+            await self.cache.set(cache_key, generated_text)
+        return generated_text
+    
+    async def _granite_attempt(self, profile: TaskProfile, prompt: str) -> Dict[str, Any]:
+        """One SDK call on the Granite worker pool, with its outcome recorded by the circuit breaker"""
+        ticket = self.breaker.try_acquire()
+        if ticket is None:
+            raise CircuitOpenError(self.breaker.retry_after())
+        started = time.monotonic()
+        try:
             if settings.GRANITE_DEPLOYMENT_ID:
-                response = self.client.deployments.generate_text(
+                response = await self.runner.run(
+                    self.client.deployments.generate_text,
                     deployment_id=settings.GRANITE_DEPLOYMENT_ID,
                     prompt=prompt,
-                    params=generation_params
+                    params=profile.params()
                 )
             else:
-                response = self.client.foundation_models.generate_text(
+                response = await self.runner.run(
+                    self.client.foundation_models.generate_text,
                     model_id=settings.GRANITE_MODEL_ID,
                     prompt=prompt,
-                    params=generation_params
+                    params=profile.params()
                 )
-            
-            return response.get('results', [{}])[0].get('generated_text', '').strip()
-            
-        except Exception as e:
-            logger.error(f"Error generating text with Granite: {str(e)}")
-            return "AI generation temporarily unavailable. Please try again later."
+        except asyncio.CancelledError:
+            self.breaker.release(ticket)
+            raise
+        except Exception:
+            self.breaker.record(ticket, False, time.monotonic() - started)
+            raise
+        self.breaker.record(ticket, True, time.monotonic() - started)
+        return response
     
     def _create_fallback_description(self, job_data: Dict[str, Any]) -> Dict[str, str]:
         """Create fallback job description when AI is unavailable"""
@@ -289,28 +990,49 @@ We are looking for a dedicated team member to join our growing business.
         
         return " | ".join(parts)
     
-    def _calculate_simple_match(self, job_requirements: str, candidate_profile: Dict[str, Any]) -> Dict[str, Any]:
-        """Simple keyword-based matching as fallback"""
-        job_keywords = set(job_requirements.lower().split())
+    def _create_job_text(self, job_data: Dict[str, Any]) -> str:
+        """Create text representation of a job listing"""
+        parts = []
         
-        candidate_text = self._create_candidate_text(candidate_profile)
-        candidate_keywords = set(candidate_text.lower().split())
+        if job_data.get('position'):
+            parts.append(f"Position: {job_data['position']}")
+        
+        if job_data.get('store_name'):
+            parts.append(f"Store: {job_data['store_name']}")
+        
+        if job_data.get('requirements'):
+            parts.append(f"Requirements: {job_data['requirements']}")
         
-        common_keywords = job_keywords.intersection(candidate_keywords)
-        match_percentage = (len(common_keywords) / len(job_keywords)) * 100 if job_keywords else 0
-        match_percentage += random.randint(-5, 15)  # Add some variance
-        match_percentage = max(0, min(100, int(match_percentage)))
+        if job_data.get('location'):
+            parts.append(f"Location: {job_data['location']}")
+        
+        return " | ".join(parts)
+    
+    def _keyword_match_percentage(self, job_text: Union[str, Tuple[str, ...]], candidate_text: str) -> int:
+        """BM25 of the candidate text for the job's terms, scaled so covering every term once scores 100"""
+        best = self.keyword_index.max_score(job_text)
+        if not best:
+            return 0
+        return max(0, min(100, int(100 * self.keyword_index.score_text(job_text, candidate_text) / best)))
+    
+    def _calculate_simple_match(self, job_requirements: str, candidate_profile: Dict[str, Any]) -> Dict[str, Any]:
+        """Deterministic keyword matching (stemmed BM25, IDF from the job catalog) as fallback"""
+        candidate_text = self._create_candidate_text(candidate_profile)
+        match_percentage = self._keyword_match_percentage(job_requirements, candidate_text)
         
         return {
             'match_score': match_percentage,
             'compatibility': self._get_compatibility_level(match_percentage),
-            'analysis': {
-                'detailed_analysis': f"Based on keyword matching, found {len(common_keywords)} matching terms.",
-                'embedding_score': match_percentage,
-                'strengths': ['Profile contains relevant keywords'],
-                'gaps': ['Some requirements may not be covered'],
-                'recommendations': ['Review job requirements and highlight relevant experience']
-            }
+            'analysis': {**self._keyword_analysis(job_requirements, candidate_text), 'embedding_score': match_percentage}
+        }
+    
+    def _keyword_analysis(self, job_requirements: str, candidate_text: str) -> Dict[str, Any]:
+        common_keywords = set(tokenize(job_requirements)) & set(tokenize(candidate_text))
+        return {
+            'detailed_analysis': f"Based on keyword matching, found {len(common_keywords)} matching terms.",
+            'strengths': ['Profile contains relevant keywords'],
+            'gaps': ['Some requirements may not be covered'],
+            'recommendations': ['Review job requirements and highlight relevant experience']
         }
     
     def _get_compatibility_level(self, score: float) -> str:
@@ -323,19 +1045,6 @@ We are looking for a dedicated team member to join our growing business.
             return "Fair"
         else:
             return "Limited"
-    
-    def _extract_strengths(self, analysis_text: str) -> List[str]:
-        """Extract strengths from analysis text"""
-        # Simple extraction - in production, use more sophisticated NLP
-        return ["Relevant experience", "Good skill match"] if "strength" in analysis_text.lower() else ["Profile matches some requirements"]
-    
-    def _extract_gaps(self, analysis_text: str) -> List[str]:
-        """Extract gaps from analysis text"""
-        return ["Some specialized skills needed"] if "gap" in analysis_text.lower() else ["Minor skill gaps"]
-    
-    def _extract_recommendations(self, analysis_text: str) -> List[str]:
-        """Extract recommendations from analysis text"""
-        return ["Highlight relevant experience", "Consider additional training"] if "recommend" in analysis_text.lower() else ["Review and tailor application"]
 
 # Global service instance
 granite_service = GraniteService()
@@ -344,10 +1053,34 @@ granite_service = GraniteService()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    await granite_service.initialize()
+    await seed_storage()
+    if settings.AI_LOAD_IN_BACKGROUND:
+        load_task = asyncio.create_task(granite_service.initialize())
+    else:
+        load_task = None
+        await granite_service.initialize()
+    for job in await all_jobs():
+        granite_service.mark_job_changed(job["id"], job)
+    reembed_task = asyncio.create_task(granite_service.run_reembed_worker(embedding_text_for))
+    await asyncio.to_thread(enhancement_queue.open)
+    # Queue again any listing whose task was lost, e.g. a crash between saving it and queueing it
+    for job in await job_listings_db.all():
+        if job.get("status") == "pending_enhancement":
+            await asyncio.to_thread(enhancement_queue.enqueue, ENHANCE_JOB, job["id"], job_generation_input(JobFormData(**job)))
+    enhancement_workers.start()
     yield
     # Shutdown
+    if load_task is not None:
+        load_task.cancel()
+    reembed_task.cancel()
+    if job_streams:
+        # Let streaming job creations save their listings
+        await asyncio.wait(job_streams, timeout=settings.GRANITE_TIMEOUT_SECONDS)
+    await enhancement_workers.stop()
+    enhancement_queue.close()
     await granite_service.cleanup()
+    password_hasher.shutdown()
+    await storage.close()
 
 # Initialize FastAPI app with lifespan
 app = FastAPI(
@@ -366,11 +1099,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so the time includes CORS and error handling
+app.add_middleware(RequestMetricsMiddleware, histogram=HTTP_REQUEST_SECONDS)
+
+@app.exception_handler(ModelsLoadingError)
+async def models_loading_handler(request: Request, exc: ModelsLoadingError):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "AI models are still loading, please retry shortly"},
+        headers={"Retry-After": str(settings.AI_LOADING_RETRY_AFTER_SECONDS)}
+    )
+
+@app.exception_handler(HasherBusyError)
+async def hasher_busy_handler(request: Request, exc: HasherBusyError):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Too many login attempts in progress, please retry shortly"},
+        headers={"Retry-After": "1"}
+    )
+
 # Security
 security = HTTPBearer()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_hasher = PasswordHasher(
+    rounds=settings.BCRYPT_ROUNDS,
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING
+)
 SECRET_KEY = "your-secret-key-here"  # In production, use environment variable
 ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = 15
+token_cache = TokenCache(
+    max_entries=settings.TOKEN_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.TOKEN_CACHE_TTL_SECONDS,
+    max_token_lifetime_seconds=ACCESS_TOKEN_EXPIRE_MINUTES * 60
+)
 
 # Pydantic Models (keeping all your existing models)
 class UserProfile(BaseModel):
@@ -393,6 +1155,9 @@ class Store(BaseModel):
     image: str
     street: str
     distance: str
+    distance_m: Optional[float] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
     owner: Dict[str, str]
 
 class Location(BaseModel):
@@ -400,6 +1165,9 @@ class Location(BaseModel):
     name: str
     area: str
     distance: str
+    distance_m: Optional[float] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
 
 class JobListing(BaseModel):
     id: Optional[str] = None
@@ -436,6 +1204,12 @@ class LocationJob(BaseModel):
     wage: str
     requirements: str
     match_score: int
+    wage_min: Optional[float] = None
+    wage_max: Optional[float] = None
+    wage_currency: Optional[str] = None
+    distance_m: Optional[float] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
 
 class JobFormData(BaseModel):
     store_name: str
@@ -450,10 +1224,20 @@ class MatchScoreRequest(BaseModel):
     job_id: int
     candidate_id: int
 
+class BatchMatchRequest(BaseModel):
+    job_id: str  # job_listings_db id or location_jobs id
+    candidate_ids: Optional[List[int]] = None  # Defaults to every candidate in candidates_db
+    top_k: int = 10
+    analyze_top: int = 0  # Run the Granite narrative analysis for this many of the best matches
+
 class LoginRequest(BaseModel):
     email: EmailStr
     password: str
 
+class PasswordChangeRequest(BaseModel):
+    current_password: str
+    new_password: str
+
 class RegisterRequest(BaseModel):
     name: str
     email: EmailStr
@@ -471,14 +1255,19 @@ class AIJobGenerationRequest(BaseModel):
     basic_requirements: Optional[str] = None
 
 # Keep all your existing data structures
-users_db = {}
-stores_db = [
+# Storage backend (see storage.py): in-memory by default, SQLite to persist and share between workers
+storage = open_storage(settings.STORAGE_BACKEND, settings.SQLITE_PATH, settings.SQLITE_POOL_SIZE)
+
+users_db = UserRepository(storage.collection("users", USER_INDEXES, unique=["email"]))
+default_stores = [
     {
         "id": 1,
         "name": "Weymans-Palo",
         "image": "https://readdy.ai/api/search-image?query=Grocery%20store%20front",
         "street": "Street No.7",
         "distance": "15$",
+        "lat": 17.4123,
+        "lon": 78.4389,
         "owner": {
             "name": "Alex",
             "avatar": "https://readdy.ai/api/search-image?query=Professional%20headshot"
@@ -490,6 +1279,8 @@ stores_db = [
         "image": "https://readdy.ai/api/search-image?query=Small%20convenience%20store",
         "street": "Street No.8",
         "distance": "15$",
+        "lat": 17.4138,
+        "lon": 78.4412,
         "owner": {
             "name": "Sarah",
             "avatar": "https://readdy.ai/api/search-image?query=Professional%20headshot"
@@ -501,6 +1292,8 @@ stores_db = [
         "image": "https://readdy.ai/api/search-image?query=Clothing%20store",
         "street": "JUBILEE HILLS/HYDERABAD",
         "distance": "15$",
+        "lat": 17.4312,
+        "lon": 78.4089,
         "owner": {
             "name": "Mike",
             "avatar": "https://readdy.ai/api/search-image?query=Professional%20headshot"
@@ -512,6 +1305,8 @@ stores_db = [
         "image": "https://readdy.ai/api/search-image?query=Colorful%20toy%20store",
         "street": "S.R ROAD/HYDERABAD",
         "distance": "15$",
+        "lat": 17.4402,
+        "lon": 78.4461,
         "owner": {
             "name": "Priya",
             "avatar": "https://readdy.ai/api/search-image?query=Professional%20headshot"
@@ -520,15 +1315,22 @@ stores_db = [
 ]
 
 hyderabad_locations = [
-    {"id": 1, "name": "Jubilee Hills", "area": "Western Hyderabad", "distance": "5 km"},
-    {"id": 2, "name": "Banjara Hills", "area": "Central Hyderabad", "distance": "7 km"},
-    {"id": 3, "name": "Hitech City", "area": "IT Hub", "distance": "12 km"},
-    {"id": 4, "name": "Gachibowli", "area": "Financial District", "distance": "15 km"},
-    {"id": 5, "name": "Secunderabad", "area": "Twin City", "distance": "10 km"},
-    {"id": 6, "name": "Madhapur", "area": "IT Corridor", "distance": "11 km"},
-    {"id": 7, "name": "Kukatpally", "area": "Residential Area", "distance": "18 km"},
-    {"id": 8, "name": "Ameerpet", "area": "Commercial Center", "distance": "8 km"}
+    {"id": 1, "name": "Jubilee Hills", "area": "Western Hyderabad", "distance": "5 km", "lat": 17.4326, "lon": 78.4071},
+    {"id": 2, "name": "Banjara Hills", "area": "Central Hyderabad", "distance": "7 km", "lat": 17.4156, "lon": 78.4347},
+    {"id": 3, "name": "Hitech City", "area": "IT Hub", "distance": "12 km", "lat": 17.4435, "lon": 78.3772},
+    {"id": 4, "name": "Gachibowli", "area": "Financial District", "distance": "15 km", "lat": 17.4401, "lon": 78.3489},
+    {"id": 5, "name": "Secunderabad", "area": "Twin City", "distance": "10 km", "lat": 17.4399, "lon": 78.4983},
+    {"id": 6, "name": "Madhapur", "area": "IT Corridor", "distance": "11 km", "lat": 17.4483, "lon": 78.3915},
+    {"id": 7, "name": "Kukatpally", "area": "Residential Area", "distance": "18 km", "lat": 17.4948, "lon": 78.3996},
+    {"id": 8, "name": "Ameerpet", "area": "Commercial Center", "distance": "8 km", "lat": 17.4375, "lon": 78.4483}
 ]
+for location in hyderabad_locations:
+    normalize_distance(location)
+# Jobs without their own distance take the distance of their location
+location_distances = {
+    location["name"].lower(): location["distance_m"]
+    for location in hyderabad_locations if location["distance_m"] is not None
+}
 
 location_stores = [
     {
@@ -536,6 +1338,9 @@ location_stores = [
         "name": "Raymond-Zainor",
         "image": "https://readdy.ai/api/search-image?query=Upscale%20clothing%20store",
         "rating": "20$",
+        "location": "Jubilee Hills",
+        "lat": 17.4298,
+        "lon": 78.4102,
         "owner": {"name": "Raymond", "avatar": "https://readdy.ai/api/search-image?query=Professional%20headshot"}
     },
     {
@@ -543,12 +1348,43 @@ location_stores = [
         "name": "Original-zainor",
         "image": "https://readdy.ai/api/search-image?query=Modern%20clothing%20boutique",
         "rating": "30$",
+        "location": "Jubilee Hills",
+        "lat": 17.4341,
+        "lon": 78.4047,
         "owner": {"name": "Original", "avatar": "https://readdy.ai/api/search-image?query=Professional%20headshot"}
     }
 ]
 
-job_listings_db = {}
-candidates_db = [
+# Coordinates of each location's centre and of the known stores; a job is placed at its store, else its location
+location_coordinates = {location["name"].lower(): (location["lat"], location["lon"]) for location in hyderabad_locations}
+store_coordinates = {store["name"].lower(): (store["lat"], store["lon"]) for store in default_stores + location_stores}
+
+location_store_geo = GeoIndex()
+for store in location_stores:
+    location_store_geo.add(store["id"], store["lat"], store["lon"])
+# Stores in stores_db, filled by seed_storage
+store_geo = GeoIndex()
+
+def place_store(store: Dict[str, Any]) -> Dict[str, Any]:
+    """Set ``lat``/``lon`` of a store that has none from the known store positions"""
+    if store.get("lat") is None or store.get("lon") is None:
+        store["lat"], store["lon"] = store_coordinates.get((store.get("name") or "").strip().lower(), (None, None))
+    return store
+
+def place_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Set ``lat``/``lon`` of a job that has none: its store's position, else its location's centre"""
+    if job.get("lat") is None or job.get("lon") is None:
+        point = store_coordinates.get((job.get("store_name") or "").strip().lower())
+        if point is None:
+            point = location_coordinates.get((job.get("location") or "").strip().lower(), (None, None))
+        job["lat"], job["lon"] = point
+    return job
+
+def prepare_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Typed wage/distance fields and coordinates, added once when a job is written"""
+    return place_job(normalize_job(job, location_distances))
+
+default_candidates = [
     {
         "id": 1,
         "name": "Priya Sharma",
@@ -569,7 +1405,7 @@ candidates_db = [
     }
 ]
 
-location_jobs = [
+default_location_jobs = [
     {
         "id": 1,
         "store_name": "Raymond-Zainor",
@@ -590,84 +1426,216 @@ location_jobs = [
     }
 ]
 
+stores_db = storage.collection("stores")
+candidates_db = storage.collection("candidates")
+location_jobs = storage.collection("location_jobs", JOB_INDEXES)
+job_listings_db = storage.collection("job_listings", JOB_INDEXES)
+granite_service.analyses = MatchAnalysisStore(storage.collection("match_analyses", MATCH_ANALYSIS_INDEXES))
+
+async def seed_storage():
+    """Create the tables and load the demo stores, candidates and location jobs on first run"""
+    await storage.connect()
+    for collection, defaults in (
+        (stores_db, default_stores),
+        (candidates_db, default_candidates),
+        (location_jobs, default_location_jobs)
+    ):
+        if not await collection.count():
+            await collection.put_many(defaults)
+    
+    # Parse wages and distances into typed fields and add coordinates once, including records stored before they existed
+    for collection, normalize, marker in (
+        (stores_db, lambda store: place_store(normalize_distance(store)), "lat"),
+        (location_jobs, prepare_job, "lat"),
+        (job_listings_db, prepare_job, "lat")
+    ):
+        stale = [normalize(dict(doc)) for doc in await collection.all() if marker not in doc]
+        if stale:
+            await collection.put_many(stale)
+    
+    for store in await stores_db.all():
+        if store.get("lat") is not None and store.get("lon") is not None:
+            store_geo.add(store["id"], store["lat"], store["lon"])
+
+
 # Utility functions
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    # Fractional iat so a token issued right after "log out everywhere" is not revoked with the old ones
+    to_encode.update({"exp": expire, "iat": time.time()})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        return user_id
-    except jwt.PyJWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+def credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+def token_claims(token: str) -> Dict[str, Any]:
+    """Validated claims of a bearer token; the signature is checked once per token, not per request"""
+    payload = token_cache.get(token)
+    cached = payload is not None
+    if not cached:
+        started = time.perf_counter()
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except jwt.PyJWTError:
+            raise credentials_exception()
+        finally:
+            JWT_VERIFY_SECONDS.observe(time.perf_counter() - started)
+    if token_cache.is_revoked(token, payload):
+        raise credentials_exception()
+    if not cached:
+        token_cache.put(token, payload)
+    return payload
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    user_id: str = token_claims(credentials.credentials).get("sub")
+    if user_id is None:
+        raise credentials_exception()
+    return user_id
 
-# Enhanced AI-powered job creation
-async def generate_job_description_ai(job_data: JobFormData) -> dict:
-    """Generate enhanced job description using IBM Granite AI"""
-    try:
-        # Use Granite service for enhanced job generation
-        ai_result = await granite_service.generate_enhanced_job_description({
-            'position': job_data.position,
-            'store_name': job_data.store_name,
-            'location': job_data.location,
-            'work_hours': job_data.work_hours,
-            'wage': job_data.wage,
-            'responsibilities': job_data.responsibilities,
-            'requirements': job_data.requirements
-        })
-        
-        return {
-            "store_name": job_data.store_name,
-            "location": job_data.location,
-            "position": job_data.position,
-            "work_hours": job_data.work_hours,
-            "wage": job_data.wage,
+def require_ai_models():
+    """
+    Guard for AI endpoints whose fallback results are much worse than waiting:
+    503 with Retry-After while the models load; once loading has finished
+    (even unsuccessfully) the endpoint runs and uses its own fallback.
+    """
+    if granite_service.loading:
+        raise ModelsLoadingError()
+
+async def hash_password(password: str) -> str:
+    return await password_hasher.hash(password)
+
+async def verify_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Returns (valid, new_hash); new_hash is set when the stored hash uses an outdated bcrypt cost"""
+    return await password_hasher.verify_and_update(plain_password, hashed_password)
+
+# Time to the first byte of job creation responses: the whole response for
+# POST /jobs, the first description token for POST /jobs/stream
+job_generation_latency = {
+    "post_jobs": LatencyWindow(),
+    "stream_ttfb": LatencyWindow(),
+    "stream_total": LatencyWindow()
+}
+
+def job_generation_input(job_data: JobFormData) -> Dict[str, Any]:
+    return {
+        'position': job_data.position,
+        'store_name': job_data.store_name,
+        'location': job_data.location,
+        'work_hours': job_data.work_hours,
+        'wage': job_data.wage,
+        'responsibilities': job_data.responsibilities,
+        'requirements': job_data.requirements
+    }
+
+def enhanced_job_listing(job_data: JobFormData, ai_result: Dict[str, str]) -> dict:
+    return {
+        "store_name": job_data.store_name,
+        "location": job_data.location,
+        "position": job_data.position,
+        "work_hours": job_data.work_hours,
+        "wage": job_data.wage,
+        "responsibilities": ai_result['enhanced_description'],
+        "requirements": job_data.requirements,
+        "summary": ai_result['summary'],
+        "formatted_post": ai_result['formatted_post'],
+        "created_at": datetime.now(),
+        "ai_enhanced": True,
+        "status": "enhanced"
+    }
+
+# Background AI enhancement of new listings: POST /jobs saves the form as is
+# and queues a task; the workers fill in the generated fields later
+ENHANCE_JOB = "enhance_job"
+def enhancement_queue_path() -> str:
+    """The queue lives next to the database; with in-memory storage it is not kept either"""
+    if settings.ENHANCEMENT_QUEUE_PATH:
+        return settings.ENHANCEMENT_QUEUE_PATH
+    if settings.STORAGE_BACKEND == "sqlite":
+        return os.path.splitext(settings.SQLITE_PATH)[0] + "-queue.db"
+    return ":memory:"
+
+enhancement_queue = TaskQueue(enhancement_queue_path(), lease_seconds=settings.GRANITE_TIMEOUT_SECONDS * 3)
+# Job id -> event set when this process finishes enhancing that job
+enhancement_waiters: Dict[str, asyncio.Event] = {}
+
+def raw_job_listing(job_data: JobFormData) -> dict:
+    """The listing as submitted, saved before its AI enhancement"""
+    return {
+        "store_name": job_data.store_name,
+        "location": job_data.location,
+        "position": job_data.position,
+        "work_hours": job_data.work_hours,
+        "wage": job_data.wage,
+        "responsibilities": job_data.responsibilities,
+        "requirements": job_data.requirements,
+        "summary": None,
+        "formatted_post": None,
+        "created_at": datetime.now(),
+        "ai_enhanced": False,
+        "status": "pending_enhancement"
+    }
+
+async def enhance_job_listing(task: Task):
+    """Worker handler: generate the description of a queued listing"""
+    job = await job_listings_db.get(task.key)
+    if job is None or job.get("status") != "pending_enhancement":
+        return  # deleted, or already enhanced by another worker
+    if granite_service.loading:
+        raise RetryLater(settings.AI_LOADING_RETRY_AFTER_SECONDS)
+    if granite_service.is_ready:
+        try:
+            ai_result = await granite_service.enhance_job_description(task.payload)
+        except CircuitOpenError as e:
+            # Granite is known to be down; wait for the breaker instead of using up attempts
+            raise RetryLater(max(e.retry_after, 1.0))
+        await finish_enhancement(task.key, ai_result, ai_enhanced=True)
+    else:
+        FALLBACK_ACTIVATIONS.labels("job_description").inc()
+        await finish_enhancement(task.key, granite_service._create_fallback_description(task.payload), ai_enhanced=False)
+
+async def enhancement_failed(task: Task, error: Exception):
+    """Retries used up: publish the listing with the template description"""
+    FALLBACK_ACTIVATIONS.labels("job_description").inc()
+    await finish_enhancement(task.key, granite_service._create_fallback_description(task.payload), ai_enhanced=False)
+
+async def finish_enhancement(job_id: str, ai_result: Dict[str, str], ai_enhanced: bool):
+    job = await job_listings_db.get(job_id)
+    if job is not None:
+        job.update({
             "responsibilities": ai_result['enhanced_description'],
-            "requirements": job_data.requirements,
             "summary": ai_result['summary'],
             "formatted_post": ai_result['formatted_post'],
-            "created_at": datetime.now(),
-            "ai_enhanced": True
-        }
-        
-    except Exception as e:
-        logger.error(f"Error in AI job generation: {str(e)}")
-        # Fallback to basic generation
-        return {
-            "store_name": job_data.store_name,
-            "location": job_data.location,
-            "position": job_data.position,
-            "work_hours": job_data.work_hours,
-            "wage": job_data.wage,
-            "responsibilities": job_data.responsibilities or "Various duties as assigned",
-            "requirements": job_data.requirements or "Relevant experience preferred",
-            "created_at": datetime.now(),
-            "ai_enhanced": False
-        }
+            "ai_enhanced": ai_enhanced,
+            "status": "enhanced" if ai_enhanced else "fallback"
+        })
+        await job_listings_db.put(job)
+        granite_service.mark_job_changed(job_id, job)
+    event = enhancement_waiters.pop(job_id, None)
+    if event is not None:
+        event.set()
+
+enhancement_workers = TaskWorkerPool(
+    enhancement_queue,
+    enhance_job_listing,
+    concurrency=settings.ENHANCEMENT_WORKERS,
+    max_attempts=settings.ENHANCEMENT_MAX_ATTEMPTS,
+    retry_base_seconds=settings.ENHANCEMENT_RETRY_BASE_SECONDS,
+    retry_max_seconds=settings.ENHANCEMENT_RETRY_MAX_SECONDS,
+    on_failure=enhancement_failed
+)
+
+async def queue_enhancement(job_id: str, job_input: Dict[str, Any]):
+    await asyncio.to_thread(enhancement_queue.enqueue, ENHANCE_JOB, job_id, job_input)
+    enhancement_workers.notify()
 
 # Enhanced match score calculation
 async def calculate_match_score_ai(job_requirements: str, candidate_profile: Dict[str, Any]) -> Dict[str, Any]:
@@ -678,16 +1646,29 @@ async def calculate_match_score_ai(job_requirements: str, candidate_profile: Dic
     except Exception as e:
         logger.error(f"Error in AI match calculation: {str(e)}")
         # Fallback to simple matching
-        return {
-            'match_score': random.randint(50, 90),
-            'compatibility': 'Good',
-            'analysis': {
-                'detailed_analysis': 'Match calculation temporarily unavailable',
-                'strengths': ['Profile review needed'],
-                'gaps': ['Unable to analyze'],
-                'recommendations': ['Please try again later']
-            }
-        }
+        FALLBACK_ACTIVATIONS.labels("match_score").inc()
+        return granite_service._calculate_simple_match(job_requirements, candidate_profile)
+
+async def all_jobs() -> List[Dict[str, Any]]:
+    """Every job the API knows about: posted listings plus location jobs"""
+    return await job_listings_db.all() + await location_jobs.all()
+
+async def find_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Look up a job in the posted listings first, then in the location jobs"""
+    job = await job_listings_db.get(job_id)
+    if job is not None:
+        return job
+    return await location_jobs.get(job_id)
+
+async def embedding_text_for(kind: str, record_id: str) -> Optional[str]:
+    """Current text to embed for a tracked record, or None once it has been deleted"""
+    if kind == "job":
+        job = await find_job(record_id)
+        return granite_service._create_job_text(job) if job else None
+    if kind == "profile":
+        user = await users_db.get_by_id(record_id)
+        return granite_service._create_candidate_text(user) if user else None
+    return None
 
 # API Endpoints (keeping all your existing endpoints)
 
@@ -696,107 +1677,507 @@ async def root():
     return {
         "message": "FL Jobs API with IBM Granite AI is running",
         "version": "2.0.0",
-        "ai_status": "Available" if granite_service.is_ready else "Limited (Fallback mode)"
+        "ai_status": "Available" if granite_service.is_ready else ("Loading" if granite_service.loading else "Limited (Fallback mode)"),
+        "components": {"api": "ready", **granite_service.components()},
+        "ai_cache": granite_service.cache.stats(),
+        "ai_inflight": granite_service.inflight.stats(),
+        "ai_circuit": granite_service.breaker.stats(),
+        "ai_tasks": granite_service.task_metrics.stats(),
+        "match_analysis": granite_service.analysis_stats,
+        "embeddings": granite_service.embeddings.stats(),
+        "reembedding": granite_service.changes.stats(),
+        "password_hashing": password_hasher.stats(),
+        "token_cache": token_cache.stats(),
+        "job_generation": {name: window.stats() for name, window in job_generation_latency.items()},
+        # Counts queued tasks with a query, so off the event loop
+        "job_enhancement": await asyncio.to_thread(enhancement_workers.stats)
     }
 
+def cache_lookups():
+    llm = granite_service.cache
+    vectors = granite_service.embeddings.store
+    analyses = granite_service.analysis_stats
+    return [
+        (("llm_response", "hit"), llm.hits - llm.disk_hits),
+        (("llm_response", "disk_hit"), llm.disk_hits),
+        (("llm_response", "miss"), llm.misses),
+        (("embeddings", "hit"), vectors.hits),
+        (("embeddings", "miss"), vectors.misses),
+        (("token", "hit"), token_cache.hits),
+        (("token", "miss"), token_cache.misses),
+        (("match_analysis", "hit"), analyses["stored"]),
+        (("match_analysis", "miss"), analyses["generated"] + analyses["fallback"])
+    ]
+
+CallbackMetric(
+    "cache_lookups_total", "Lookups in the LLM response, embedding, token and match analysis caches by result",
+    "counter", ("cache", "result"), cache_lookups
+)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics of this process"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
 # Authentication endpoints (unchanged)
 @app.post("/auth/register")
 async def register(request: RegisterRequest):
-    if request.email in users_db:
+    if await users_db.email_exists(request.email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
     user_id = str(uuid.uuid4())
-    users_db[request.email] = {
-        "id": user_id,
-        "name": request.name,
-        "email": request.email,
-        "password": hash_password(request.password),
-        "phone": request.phone,
-        "location": request.location,
-        "experience": "",
-        "education": "",
-        "skills": [],
-        "languages": [],
-        "availability": "",
-        "preferred_location": request.location,
-        "avatar": "https://readdy.ai/api/search-image?query=Professional%20headshot"
-    }
+    try:
+        await users_db.add({
+            "id": user_id,
+            "name": request.name,
+            "email": request.email,
+            "password": await hash_password(request.password),
+            "phone": request.phone,
+            "location": request.location,
+            "experience": "",
+            "education": "",
+            "skills": [],
+            "languages": [],
+            "availability": "",
+            "preferred_location": request.location,
+            "avatar": "https://readdy.ai/api/search-image?query=Professional%20headshot"
+        })
+    except DuplicateEmailError:
+        # Registered concurrently by another request
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
+    
+    granite_service.mark_profile_changed(user_id)
     
     access_token = create_access_token(data={"sub": user_id})
     return {"access_token": access_token, "token_type": "bearer", "user_id": user_id}
 
 @app.post("/auth/login")
 async def login(request: LoginRequest):
-    user = users_db.get(request.email)
-    if not user or not verify_password(request.password, user["password"]):
+    user = await users_db.get_by_email(request.email)
+    valid, new_hash = await verify_password(request.password, user["password"]) if user else (False, None)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
     
+    if new_hash:
+        # BCRYPT_ROUNDS changed since this password was stored
+        await users_db.update(user["id"], {"password": new_hash})
+    
     access_token = create_access_token(data={"sub": user["id"]})
     return {"access_token": access_token, "token_type": "bearer", "user_id": user["id"]}
 
+@app.post("/auth/logout")
+async def logout(all_sessions: bool = False, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Revoke the presented token, or with all_sessions every token issued to this user so far"""
+    claims = token_claims(credentials.credentials)
+    if all_sessions:
+        token_cache.revoke_subject(claims["sub"])
+    else:
+        token_cache.revoke(credentials.credentials, claims.get("exp"))
+    return {"message": "Logged out"}
+
+@app.post("/auth/password")
+async def change_password(request: PasswordChangeRequest, user_id: str = Depends(verify_token)):
+    """Set a new password, revoke every token issued so far and return a fresh one"""
+    user = await users_db.get_by_id(user_id)
+    valid, _ = await verify_password(request.current_password, user["password"]) if user else (False, None)
+    if not valid:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect password"
+        )
+    
+    await users_db.update(user_id, {"password": await hash_password(request.new_password)})
+    token_cache.revoke_subject(user_id)
+    
+    access_token = create_access_token(data={"sub": user_id})
+    return {"access_token": access_token, "token_type": "bearer", "user_id": user_id}
+
 # Profile endpoints (unchanged)
 @app.get("/profile", response_model=UserProfile)
 async def get_profile(user_id: str = Depends(verify_token)):
-    for user_data in users_db.values():
-        if user_data["id"] == user_id:
-            return UserProfile(**user_data)
-    
-    raise HTTPException(status_code=404, detail="User not found")
+    user_data = await users_db.get_by_id(user_id)
+    if user_data is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return UserProfile(**user_data)
 
 @app.put("/profile")
 async def update_profile(profile: UserProfile, user_id: str = Depends(verify_token)):
-    for email, user_data in users_db.items():
-        if user_data["id"] == user_id:
-            user_data.update(profile.dict(exclude_unset=True))
-            return {"message": "Profile updated successfully"}
+    try:
+        user_data = await users_db.update(user_id, profile.dict(exclude_unset=True))
+    except DuplicateEmailError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
+    if user_data is None:
+        raise HTTPException(status_code=404, detail="User not found")
     
-    raise HTTPException(status_code=404, detail="User not found")
+    granite_service.mark_profile_changed(user_id)
+    return {"message": "Profile updated successfully"}
 
 # Store endpoints (unchanged)
 @app.get("/stores", response_model=List[Store])
-async def get_stores():
-    return stores_db
+async def get_stores(max_distance_km: Optional[float] = None):
+    stores = await stores_db.all()
+    if max_distance_km is not None:
+        stores = [store for store in stores if store.get("distance_m") is not None and store["distance_m"] <= max_distance_km * 1000]
+    return stores
+
+def resolve_point(lat: Optional[float], lon: Optional[float], location: Optional[str]) -> Tuple[float, float]:
+    """The query point of a nearby search: explicit coordinates, or the centre of a named location"""
+    if lat is not None and lon is not None:
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise HTTPException(status_code=400, detail="Invalid coordinates")
+        return lat, lon
+    if location:
+        point = location_coordinates.get(location.strip().lower())
+        if point is None:
+            raise HTTPException(status_code=404, detail="Location not found")
+        return point
+    raise HTTPException(status_code=400, detail="Pass lat and lon, or location")
+
+@app.get("/stores/nearby")
+async def get_nearby_stores(
+    lat: Optional[float] = None,
+    lon: Optional[float] = None,
+    location: Optional[str] = None,
+    radius_km: Optional[float] = None,
+    limit: int = 20
+):
+    """Stores within ``radius_km`` of a point or location centre, nearest first, with ``meters_away``"""
+    lat, lon = resolve_point(lat, lon, location)
+    radius_m = (radius_km if radius_km is not None else settings.NEARBY_RADIUS_KM) * 1000
+    results = []
+    for store_id, meters in store_geo.within(lat, lon, radius_m, limit=max(1, min(limit, 100))):
+        store = await stores_db.get(int(store_id))
+        if store is not None:
+            results.append({**store, "meters_away": round(meters, 1)})
+    return results
 
 @app.get("/stores/{store_id}")
 async def get_store(store_id: int):
-    store = next((s for s in stores_db if s["id"] == store_id), None)
+    store = await stores_db.get(store_id)
     if not store:
         raise HTTPException(status_code=404, detail="Store not found")
     return store
 
 # Location endpoints (unchanged)
 @app.get("/locations", response_model=List[Location])
-async def get_locations():
-    return hyderabad_locations
+async def get_locations(max_distance_km: Optional[float] = None):
+    if max_distance_km is None:
+        return hyderabad_locations
+    return [
+        location for location in hyderabad_locations
+        if location["distance_m"] is not None and location["distance_m"] <= max_distance_km * 1000
+    ]
 
 @app.get("/locations/{location_name}/stores")
-async def get_location_stores(location_name: str):
-    return location_stores
+async def get_location_stores(location_name: str, radius_km: Optional[float] = None):
+    """Stores within ``radius_km`` of the location's centre, nearest first; every store for a location without coordinates"""
+    point = location_coordinates.get(location_name.strip().lower())
+    if point is None:
+        return location_stores
+    lat, lon = point
+    radius_m = (radius_km if radius_km is not None else settings.NEARBY_RADIUS_KM) * 1000
+    stores = {str(store["id"]): store for store in location_stores}
+    return [
+        {**stores[store_id], "meters_away": round(meters, 1)}
+        for store_id, meters in location_store_geo.within(lat, lon, radius_m)
+    ]
 
 @app.get("/locations/{location_name}/jobs", response_model=List[LocationJob])
 async def get_location_jobs(location_name: str):
-    return [job for job in location_jobs if job["location"] == location_name]
+    return await location_jobs.find("location", location_name)
 
 # Enhanced Job listing endpoints with AI
 @app.get("/jobs")
 async def get_job_listings(user_id: str = Depends(verify_token)):
-    user_jobs = [job for job in job_listings_db.values() if job.get("created_by") == user_id]
+    user_jobs = await job_listings_db.find("created_by", user_id)
     return user_jobs
 
-@app.post("/jobs")
-async def create_job_listing(job_data: JobFormData, user_id: str = Depends(verify_token)):
-    """Create job listing with AI enhancement"""
-    # Generate enhanced job description using AI
-    enhanced_job = await generate_job_description_ai(job_data)
+@app.get("/jobs/search")
+async def search_jobs(
+    q: str,
+    location: Optional[str] = None,
+    min_wage: Optional[float] = None,
+    max_wage: Optional[float] = None,
+    currency: Optional[str] = None,
+    max_distance_km: Optional[float] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None
+):
+    """
+    Keyword + semantic job search.  Wages are hourly (in ``currency`` if
+    given); pass the returned next_cursor to get the following page.
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Search query is required")
+    
+    try:
+        page, next_cursor = await granite_service.search_jobs(
+            q,
+            location=location,
+            min_wage=min_wage,
+            max_wage=max_wage,
+            currency=currency,
+            max_distance_m=max_distance_km * 1000 if max_distance_km is not None else None,
+            limit=max(1, min(limit, 50)),
+            cursor=cursor
+        )
+    except InvalidCursorError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    results = []
+    for hit in page:
+        job = await find_job(hit["id"])
+        if job is not None:
+            results.append({**job, "search_score": hit["score"], "lexical_rank": hit["lexical_rank"], "semantic_rank": hit["semantic_rank"]})
+    return {"results": results, "next_cursor": next_cursor}
+
+@app.get("/jobs/filter")
+async def filter_jobs(
+    location: Optional[str] = None,
+    min_wage: Optional[float] = None,
+    max_wage: Optional[float] = None,
+    currency: Optional[str] = None,
+    max_distance_km: Optional[float] = None,
+    sort: str = "wage",
+    limit: int = 20,
+    offset: int = 0
+):
+    """Jobs matching the filters, sorted by hourly wage (highest first) or distance (nearest first)"""
+    if sort not in ("wage", "distance"):
+        raise HTTPException(status_code=400, detail="sort must be 'wage' or 'distance'")
     
+    job_ids, total = granite_service.job_search.browse(
+        sort=sort,
+        limit=max(1, min(limit, 100)),
+        offset=max(0, offset),
+        location=location,
+        min_wage=min_wage,
+        max_wage=max_wage,
+        currency=currency,
+        max_distance_m=max_distance_km * 1000 if max_distance_km is not None else None
+    )
+    results = [job for job in [await find_job(job_id) for job_id in job_ids] if job is not None]
+    return {"total": total, "results": results}
+
+@app.get("/jobs/nearby")
+async def get_nearby_jobs(
+    lat: Optional[float] = None,
+    lon: Optional[float] = None,
+    location: Optional[str] = None,
+    radius_km: Optional[float] = None,
+    min_wage: Optional[float] = None,
+    max_wage: Optional[float] = None,
+    currency: Optional[str] = None,
+    limit: int = 20
+):
+    """
+    Jobs closest to a point (or a location's centre), nearest first, with
+    ``meters_away``.  With ``radius_km`` only jobs inside it are returned;
+    without it, the ``limit`` nearest jobs at any distance.
+    """
+    lat, lon = resolve_point(lat, lon, location)
+    hits = granite_service.job_search.nearby(
+        lat, lon,
+        radius_m=radius_km * 1000 if radius_km is not None else None,
+        limit=max(1, min(limit, 100)),
+        min_wage=min_wage,
+        max_wage=max_wage,
+        currency=currency
+    )
+    results = []
+    for job_id, meters in hits:
+        job = await find_job(job_id)
+        if job is not None:
+            results.append({**job, "meters_away": round(meters, 1)})
+    return results
+
+async def save_job_listing(enhanced_job: Dict[str, Any], user_id: str) -> Dict[str, Any]:
     job_id = str(uuid.uuid4())
     enhanced_job["id"] = job_id
     enhanced_job["created_by"] = user_id
+    prepare_job(enhanced_job)
     
-    job_listings_db[job_id]
\ No newline at end of file
+    await job_listings_db.put(enhanced_job)
+    granite_service.mark_job_changed(job_id, enhanced_job)
+    return enhanced_job
+
+@app.post("/jobs")
+async def create_job_listing(job_data: JobFormData, user_id: str = Depends(verify_token)):
+    """
+    Create a job listing and queue its AI enhancement.  The listing is
+    returned right away with status "pending_enhancement"; poll GET
+    /jobs/{id} or subscribe to GET /jobs/{id}/events until the status is
+    "enhanced" (or "fallback" when Granite could not be used).
+    """
+    started = time.perf_counter()
+    job = await save_job_listing(raw_job_listing(job_data), user_id)
+    await queue_enhancement(job["id"], job_generation_input(job_data))
+    job_generation_latency["post_jobs"].record(time.perf_counter() - started)
+    return job
+
+# Streaming job creations still generating; they finish and save even if the client has gone
+job_streams: set = set()
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def stream_job_listing(job_data: JobFormData, user_id: str, events: asyncio.Queue):
+    """Generate a listing, putting (event, data) pairs on ``events``, then save it"""
+    try:
+        ai_result = None
+        async for kind, payload in granite_service.stream_enhanced_job_description(job_generation_input(job_data)):
+            if kind == "result":
+                ai_result = payload
+            else:
+                events.put_nowait((kind, {"text": payload}))
+        job = await save_job_listing(enhanced_job_listing(job_data, ai_result), user_id)
+        events.put_nowait(("job", job))
+    except Exception as e:
+        logger.error(f"Error in streaming job generation: {str(e)}")
+        events.put_nowait(("error", {"detail": "Job creation failed"}))
+
+@app.post("/jobs/stream")
+async def create_job_listing_stream(job_data: JobFormData, user_id: str = Depends(verify_token)):
+    """
+    Create a job listing like POST /jobs, sending the description as
+    Server-Sent Events while it is generated: "token" events ({"text": ...}),
+    a "replace" event if generation failed midway and the fallback
+    description replaces what was sent, then a "job" event with the saved
+    listing (or "error").  The listing is saved even if the client disconnects.
+    """
+    started = time.perf_counter()
+    events: asyncio.Queue = asyncio.Queue()
+    task = asyncio.create_task(stream_job_listing(job_data, user_id, events))
+    job_streams.add(task)
+    task.add_done_callback(job_streams.discard)
+    
+    async def send():
+        first = True
+        while True:
+            event, data = await events.get()
+            if first:
+                job_generation_latency["stream_ttfb"].record(time.perf_counter() - started)
+                first = False
+            yield sse_event(event, data)
+            if event in ("job", "error"):
+                job_generation_latency["stream_total"].record(time.perf_counter() - started)
+                return
+    
+    return StreamingResponse(
+        send(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def owned_job(job_id: str, user_id: str) -> Dict[str, Any]:
+    job = await job_listings_db.get(job_id)
+    if not job or job.get("created_by") != user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}")
+async def get_job_listing(job_id: str, user_id: str = Depends(verify_token)):
+    return await owned_job(job_id, user_id)
+
+@app.get("/jobs/{job_id}/events")
+async def job_listing_events(job_id: str, user_id: str = Depends(verify_token)):
+    """
+    Server-Sent Events for a listing: a "status" event while its enhancement
+    is pending, then a "job" event with the finished listing.
+    """
+    job = await owned_job(job_id, user_id)
+    
+    async def send():
+        current = job
+        if current.get("status") == "pending_enhancement":
+            yield sse_event("status", {"id": job_id, "status": "pending_enhancement"})
+        while current is not None and current.get("status") == "pending_enhancement":
+            event = enhancement_waiters.setdefault(job_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(event.wait(), settings.ENHANCEMENT_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                # Another process may have finished it; the comment also keeps proxies from closing the stream
+                yield ": waiting\n\n"
+            current = await job_listings_db.get(job_id)
+        if current is not None:
+            yield sse_event("job", current)
+    
+    return StreamingResponse(
+        send(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.delete("/jobs/{job_id}")
+async def delete_job_listing(job_id: str, user_id: str = Depends(verify_token)):
+    job = await job_listings_db.get(job_id)
+    if not job or job.get("created_by") != user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    await job_listings_db.delete(job_id)
+    granite_service.mark_job_changed(job_id)
+    await granite_service.analyses.forget_job(job_id)
+    return {"message": "Job deleted successfully"}
+
+@app.get("/recommendations", dependencies=[Depends(require_ai_models)])
+async def get_recommendations(top_k: int = 10, user_id: str = Depends(verify_token)):
+    """Jobs that best fit the authenticated user's profile"""
+    user = await users_db.get_by_id(user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    top_k = max(1, min(top_k, 50))
+    profile = UserProfile(**user).dict()
+    
+    if granite_service.embeddings_ready and len(granite_service.job_index):
+        hits = await granite_service.recommend_jobs(user_id, profile, top_k)
+        scored = [(await find_job(job_id), similarity * 100) for job_id, similarity in hits]
+    else:
+        FALLBACK_ACTIVATIONS.labels("recommendations").inc()
+        hits = granite_service.recommend_jobs_by_keywords(profile, top_k)
+        scored = [(await find_job(job_id), score) for job_id, score in hits]
+    
+    return [
+        {**job, "match_score": max(0, min(100, int(score)))}
+        for job, score in scored if job is not None
+    ]
+
+@app.post("/match-score/batch", dependencies=[Depends(require_ai_models)])
+async def batch_match_candidates(request: BatchMatchRequest, user_id: str = Depends(verify_token)):
+    """Rank candidates for one job; the embedding pass is vectorized across all of them"""
+    job = await find_job(request.job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if request.candidate_ids is None:
+        candidates = await candidates_db.all()
+    else:
+        wanted = set(request.candidate_ids)
+        candidates = [c for c in await candidates_db.all() if c["id"] in wanted]
+    
+    top_k = max(1, min(request.top_k, 100))
+    analyze_top = max(0, min(request.analyze_top, 5))
+    
+    ranked = await granite_service.rank_candidates(job.get("requirements", ""), candidates, top_k, analyze_top, request.job_id)
+    return {
+        "job_id": request.job_id,
+        "total_candidates": len(candidates),
+        "matches": ranked
+    }
+
+register_route_series(HTTP_REQUEST_SECONDS, app.routes)
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,245 @@
+"""
+Structured candidate/job match analysis.
+
+Granite is asked for a single JSON object following ``MATCH_ANALYSIS_SCHEMA``.
+The watsonx.ai text generation API has no constrained decoding, so the
+schema goes into the prompt and ``normalize_match_analysis`` enforces it on
+the way out: the score is clamped to 0-100 and the lists are trimmed,
+deduplicated and capped.
+
+``IncrementalJSONParser`` is fed the generation chunk by chunk.  It skips
+prose or a code fence before the object, ignores anything after it, drops
+trailing commas and escapes raw newlines inside strings.  An object cut off
+by the token cap is closed at its last complete element.  Because the
+parser knows when the object is complete, the caller can stop reading the
+stream there instead of waiting for commentary the model adds after it.
+
+``MatchAnalysisStore`` keeps one analysis per (candidate, job) pair with the
+versions it was computed from.  A version is a fingerprint of the text that
+was analyzed, so a stored analysis is served until either side changes,
+across restarts and API processes.
+"""
+import hashlib
+import json
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from storage import field_index
+
+ANALYSIS_FORMAT = "match-analysis/1"
+MAX_ITEMS = 5
+MAX_ITEM_CHARS = 200
+MAX_SUMMARY_CHARS = 400
+LIST_FIELDS = ("strengths", "gaps", "recommendations")
+
+# Keys in generation order: if the token cap cuts the object short, the summary goes first
+MATCH_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "match_score": {"type": "integer", "minimum": 0, "maximum": 100},
+        "strengths": {"type": "array", "items": {"type": "string"}, "maxItems": MAX_ITEMS},
+        "gaps": {"type": "array", "items": {"type": "string"}, "maxItems": MAX_ITEMS},
+        "recommendations": {"type": "array", "items": {"type": "string"}, "maxItems": MAX_ITEMS},
+        "summary": {"type": "string", "maxLength": MAX_SUMMARY_CHARS}
+    },
+    "required": ["match_score", "strengths", "gaps", "recommendations", "summary"],
+    "additionalProperties": False
+}
+
+_CLOSERS = {"{": "}", "[": "]"}
+_STRING_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+class IncrementalJSONParser:
+    """Tolerant streaming parser for one top-level JSON object"""
+
+    def __init__(self):
+        self._out: List[str] = []
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        # (length of _out, closing brackets) at the last point where the document can be cut and closed
+        self._safe: Optional[Tuple[int, str]] = None
+        self.started = False
+        self.done = False
+
+    def feed(self, chunk: str) -> bool:
+        """Consume the next piece of generated text; True once the object is complete"""
+        out = self._out
+        for char in chunk:
+            if self.done:
+                break
+            if not self.started:
+                if char == "{":
+                    self.started = True
+                    self._open(char)
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                    out.append(char)
+                elif char == "\\":
+                    self._escape = True
+                    out.append(char)
+                elif char == '"':
+                    self._in_string = False
+                    out.append(char)
+                else:
+                    out.append(_STRING_ESCAPES.get(char, char))
+            elif char == '"':
+                self._in_string = True
+                out.append(char)
+            elif char in _CLOSERS:
+                self._open(char)
+            elif char in "}]":
+                self._close()
+            elif char == ",":
+                # Skip repeated and leading commas; the text before a comma is a complete element
+                if out[-1] not in "{[,:":
+                    self._mark_safe()
+                    out.append(char)
+            elif not char.isspace():
+                out.append(char)
+        return self.done
+
+    def _open(self, bracket: str):
+        self._stack.append(bracket)
+        self._out.append(bracket)
+        self._mark_safe()
+
+    def _close(self):
+        if self._out[-1] == ",":
+            self._out.pop()
+        # The closer always matches its opener, whichever bracket the model wrote
+        self._out.append(_CLOSERS[self._stack.pop()])
+        if self._stack:
+            self._mark_safe()
+        else:
+            self.done = True
+
+    def _mark_safe(self):
+        self._safe = (len(self._out), "".join(_CLOSERS[bracket] for bracket in reversed(self._stack)))
+
+    def value(self) -> Any:
+        """
+        The parsed object: the complete document, or the document closed at
+        its last complete element while it is still open; None if nothing parses
+        """
+        text = "".join(self._out)
+        candidates = [text] if self.done else []
+        if self._safe is not None:
+            length, closers = self._safe
+            candidates.append(text[:length] + closers)
+        for candidate in candidates:
+            try:
+                return json.loads(candidate)
+            except ValueError:
+                continue
+        return None
+
+
+def _score(value: Any) -> Optional[int]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return max(0, min(100, int(round(value))))
+    if isinstance(value, str):
+        # "85", "85%", "85/100"
+        match = _NUMBER.search(value)
+        return _score(float(match.group())) if match else None
+    return None
+
+
+def _items(value: Any) -> List[str]:
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list):
+        return []
+    items = []
+    seen = set()
+    for item in value:
+        if not isinstance(item, str):
+            continue
+        item = " ".join(item.split())[:MAX_ITEM_CHARS]
+        if item and item.lower() not in seen:
+            seen.add(item.lower())
+            items.append(item)
+        if len(items) == MAX_ITEMS:
+            break
+    return items
+
+
+def normalize_match_analysis(value: Any) -> Optional[Dict[str, Any]]:
+    """
+    A parsed analysis brought into the schema, or None if it has no score or
+    no list items at all (not worth keeping over the keyword analysis)
+    """
+    if not isinstance(value, dict):
+        return None
+    score = _score(value.get("match_score"))
+    lists = {field: _items(value.get(field)) for field in LIST_FIELDS}
+    if score is None or not any(lists.values()):
+        return None
+    summary = value.get("summary")
+    summary = " ".join(summary.split())[:MAX_SUMMARY_CHARS] if isinstance(summary, str) else ""
+    return {"match_score": score, **lists, "summary": summary}
+
+
+def parse_match_analysis(text: str) -> Optional[Dict[str, Any]]:
+    """Parse and normalize a complete generation"""
+    parser = IncrementalJSONParser()
+    parser.feed(text)
+    return normalize_match_analysis(parser.value())
+
+
+def text_version(text: str) -> str:
+    """Version of an analyzed input: changes exactly when its text does"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+MATCH_ANALYSIS_INDEXES = {
+    "candidate_key": field_index("candidate_key"),
+    "job_key": field_index("job_key")
+}
+
+
+class MatchAnalysisStore:
+    """Analyses in a storage collection, one document per (candidate, job) pair"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    @staticmethod
+    def _pair_id(candidate_key: str, job_key: str) -> str:
+        return json.dumps([candidate_key, job_key])
+
+    async def get(self, candidate_key: str, candidate_version: str, job_key: str, job_version: str,
+                  analyzer: str) -> Optional[Dict[str, Any]]:
+        """The stored analysis if it was made from these versions by ``analyzer``, else None"""
+        doc = await self.collection.get(self._pair_id(candidate_key, job_key))
+        if (doc is None or doc["candidate_version"] != candidate_version
+                or doc["job_version"] != job_version or doc["analyzer"] != analyzer):
+            return None
+        return doc["analysis"]
+
+    async def put(self, candidate_key: str, candidate_version: str, job_key: str, job_version: str,
+                  analyzer: str, analysis: Dict[str, Any]):
+        """Store an analysis, replacing the one made from earlier versions of the pair"""
+        await self.collection.put({
+            "id": self._pair_id(candidate_key, job_key),
+            "candidate_key": candidate_key,
+            "candidate_version": candidate_version,
+            "job_key": job_key,
+            "job_version": job_version,
+            "analyzer": analyzer,
+            "analysis": analysis,
+            "analyzed_at": datetime.utcnow().isoformat()
+        })
+
+    async def forget_job(self, job_key: str) -> int:
+        """Drop every analysis of a deleted job"""
+        docs = await self.collection.find("job_key", job_key)
+        for doc in docs:
+            await self.collection.delete(doc["id"])
+        return len(docs)
@@ -0,0 +1,261 @@
+"""
+Prometheus metrics at a small, constant cost per observation.
+
+Counters and histograms are plain Python objects without locks.  Every
+observation in this API is made on the event loop thread (work that runs on
+thread pools is timed around the await), so updates never race.  Each label
+combination is a child object created up front: hot paths keep a reference
+to their child, or look it up with one dict access, and then pay one
+addition (counter) or one bisect and two additions (histogram).  Numbers
+that components already count themselves, such as cache hits, breaker trips
+or queue depth, are read by callbacks at scrape time and cost nothing per
+request.
+
+``RequestMetricsMiddleware`` times HTTP requests per route.
+``REGISTRY.render()`` returns the Prometheus text exposition format (0.0.4).
+Each API process has its own registry, so scrape every uvicorn worker.
+"""
+from bisect import bisect_left
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+# Seconds; request and call latencies from sub-millisecond to a minute
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_string(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List["_Family"] = []
+        self._names = set()
+
+    def register(self, metric: "_Family"):
+        if metric.name in self._names:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._names.add(metric.name)
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            metric.collect(lines)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Family:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, registry: Optional[Registry]):
+        self.name = name
+        self.documentation = documentation
+        if registry is not None:
+            registry.register(self)
+
+    def collect(self, lines: List[str]):
+        raise NotImplementedError
+
+
+class _Labelled(_Family):
+    """A metric family with one child per label combination"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 label_sets: Iterable[Sequence[str]] = (), registry: Optional[Registry] = REGISTRY):
+        super().__init__(name, documentation, registry)
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[LabelValues, object] = {}
+        for values in label_sets:
+            self.labels(*values)
+        # The only child of an unlabelled metric
+        self._default = self.labels() if not self.labelnames else None
+
+    def labels(self, *values: str):
+        """
+        The child for these label values (strings).  Combinations are meant
+        to be registered up front through ``label_sets``; an unseen one is
+        created on first use.
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            child = self._children[values] = self._child(_label_string(self.labelnames, values), values)
+        return child
+
+    def _child(self, label_string: str, values: LabelValues):
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ("labels", "value")
+
+    def __init__(self, label_string: str):
+        self.labels = label_string
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Counter(_Labelled):
+    type = "counter"
+
+    def _child(self, label_string: str, values: LabelValues) -> _CounterChild:
+        return _CounterChild(label_string)
+
+    def inc(self, amount: float = 1):
+        self._default.inc(amount)
+
+    def collect(self, lines: List[str]):
+        for child in self._children.values():
+            lines.append(f"{self.name}{child.labels} {_number(child.value)}")
+
+
+class _HistogramChild:
+    __slots__ = ("values", "bounds", "counts", "sum")
+
+    def __init__(self, values: LabelValues, bounds: Tuple[float, ...]):
+        self.values = values
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # per bucket, not cumulative; the last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Labelled):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float] = LATENCY_BUCKETS,
+                 labelnames: Sequence[str] = (), label_sets: Iterable[Sequence[str]] = (),
+                 registry: Optional[Registry] = REGISTRY):
+        self.buckets = tuple(sorted(float(bound) for bound in buckets))
+        super().__init__(name, documentation, labelnames, label_sets, registry)
+
+    def _child(self, label_string: str, values: LabelValues) -> _HistogramChild:
+        return _HistogramChild(values, self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def collect(self, lines: List[str]):
+        bounds = [_number(bound) for bound in self.buckets] + ["+Inf"]
+        for child in self._children.values():
+            cumulative = 0
+            for bound, count in zip(bounds, child.counts):
+                cumulative += count
+                labels = _label_string(self.labelnames, child.values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _label_string(self.labelnames, child.values)
+            lines.append(f"{self.name}_sum{labels} {_number(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+
+
+class CallbackMetric(_Family):
+    """
+    Gauge or counter whose samples come from ``callback`` at scrape time, as
+    (label values, value) pairs, e.g. counters a component keeps in its stats()
+    """
+
+    def __init__(self, name: str, documentation: str, type: str, labelnames: Sequence[str],
+                 callback: Callable[[], Iterable[Tuple[Sequence[str], float]]],
+                 registry: Optional[Registry] = REGISTRY):
+        if type not in ("gauge", "counter"):
+            raise ValueError(f"Unsupported callback metric type {type!r}")
+        self.type = type
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        super().__init__(name, documentation, registry)
+
+    def collect(self, lines: List[str]):
+        for values, value in self.callback():
+            lines.append(f"{self.name}{_label_string(self.labelnames, values)} {_number(value)}")
+
+
+def _status_class(code: int) -> str:
+    return f"{code // 100}xx"
+
+
+def register_route_series(histogram: Histogram, routes: Iterable[Any],
+                          status_classes: Sequence[str] = ("2xx", "4xx", "5xx")):
+    """Create the series of every (method, route, status class) of ``RequestMetricsMiddleware`` up front"""
+    for route in routes:
+        path, methods = getattr(route, "path", None), getattr(route, "methods", None)
+        if path is None or not methods:
+            continue
+        for method in sorted(methods):
+            for status in status_classes:
+                histogram.labels(method, path, status)
+    for status in status_classes:
+        histogram.labels("OTHER", "unmatched", status)
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware observing each HTTP request in ``histogram``, labelled
+    (method, route, status), from the call until the app returns (the whole
+    stream for streaming responses).  The route is the matched path template
+    the router leaves in the scope, so /jobs/1 and /jobs/2 share a series;
+    requests that match no route are "unmatched", and methods a route does
+    not declare are "OTHER", which keeps the label sets bounded.
+    """
+
+    def __init__(self, app, histogram: Histogram):
+        self.app = app
+        self.histogram = histogram
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None)
+            method = scope["method"]
+            if path is None:
+                path, method = "unmatched", "OTHER"
+            elif method not in (getattr(route, "methods", None) or ()):
+                method = "OTHER"
+            self.histogram.labels(method, path, _status_class(status_code)).observe(perf_counter() - started)
@@ -0,0 +1,74 @@
+"""
+Repositories for the API's collections.
+
+Every lookup the handlers need is served from an index of the underlying
+storage collection (see storage.py), so the cost of a request no longer grows
+with the size of the collection.
+"""
+from typing import Any, Dict, List, Optional
+
+from storage import DuplicateKeyError, field_index
+
+
+class DuplicateEmailError(ValueError):
+    pass
+
+
+def email_key(email: str) -> str:
+    return email.strip().lower()
+
+
+USER_INDEXES = {"email": lambda user: email_key(user["email"])}
+
+# Secondary indexes for job collections: owner, location and position lookups
+# cost time proportional to the number of matches, not to the catalog size.
+JOB_INDEXES = {
+    "created_by": field_index("created_by"),
+    "location": field_index("location"),
+    "position": field_index("position")
+}
+
+
+class UserRepository:
+    """Users indexed by id (primary) and by case-folded email (unique)"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def email_exists(self, email: str) -> bool:
+        return await self.collection.find_one("email", email_key(email)) is not None
+
+    async def add(self, user: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            return await self.collection.put(user)
+        except DuplicateKeyError:
+            raise DuplicateEmailError(user["email"])
+
+    async def get_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.get(user_id)
+
+    async def get_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one("email", email_key(email))
+
+    async def update(self, user_id: str, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Apply ``changes`` to a user; the email index follows an email change.
+
+        The id is never changed.  Raises ``DuplicateEmailError`` if the new
+        email belongs to another user, in which case nothing is modified.
+        """
+        user = await self.collection.get(user_id)
+        if user is None:
+            return None
+
+        updated = {**user, **{key: value for key, value in changes.items() if key != "id"}}
+        try:
+            return await self.collection.put(updated)
+        except DuplicateKeyError:
+            raise DuplicateEmailError(updated["email"])
+
+    async def delete(self, user_id: str) -> bool:
+        return await self.collection.delete(user_id) is not None
+
+    async def all(self) -> List[Dict[str, Any]]:
+        return await self.collection.all()
@@ -0,0 +1,244 @@
+"""
+Password hashing and bearer token verification.
+
+bcrypt deliberately burns 100-300 ms of CPU per call.  ``PasswordHasher``
+runs it on a small dedicated thread pool (bcrypt releases the GIL), caps how
+many calls run and wait at once, and rehashes transparently on login when the
+configured cost changes.
+
+``TokenCache`` remembers the claims of bearer tokens that already passed
+signature verification, so a client presenting the same token on every
+request pays for one HMAC check instead of one per request.  Revocations
+(logout, password change) are kept in the same process; with several uvicorn
+workers each worker keeps its own cache and revocation list.
+"""
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from passlib.context import CryptContext
+
+from metrics import Histogram
+
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_seconds", "bcrypt hash and verify time on the hashing pool, once a worker is free",
+    buckets=(0.05, 0.1, 0.15, 0.2, 0.3, 0.5, 0.75, 1.0, 2.5, 5.0),
+    labelnames=("operation",), label_sets=[("hash",), ("verify",)]
+)
+
+
+class HasherBusyError(Exception):
+    """Too many password hashing calls are already waiting"""
+
+
+class PasswordHasher:
+    def __init__(self, rounds: int = 12, max_workers: int = 2, max_pending: int = 100):
+        # min = max = default, so needs_update flags any hash made with a different cost
+        self.context = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=rounds,
+            bcrypt__min_rounds=rounds,
+            bcrypt__max_rounds=rounds
+        )
+        self.rounds = rounds
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.rejected = 0
+        self.completed = 0
+        self.rehashed = 0
+        self.total_seconds = 0.0
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", self.context.hash, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run("verify", self.context.verify, password, hashed)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password; also return a new hash if the stored one uses an outdated cost"""
+        valid, new_hash = await self._run("verify", self.context.verify_and_update, password, hashed)
+        if new_hash:
+            self.rehashed += 1
+        return valid, new_hash
+
+    async def _run(self, operation: str, func: Callable[..., Any], *args) -> Any:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bcrypt")
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+
+        if self.waiting >= self.max_pending:
+            self.rejected += 1
+            raise HasherBusyError()
+
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.total_seconds += elapsed
+            PASSWORD_HASH_SECONDS.labels(operation).observe(elapsed)
+            self.completed += 1
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+            self._semaphore = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rounds": self.rounds,
+            "workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_waiting,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "rehashed": self.rehashed,
+            "avg_ms": round(self.total_seconds / self.completed * 1000, 2) if self.completed else 0.0
+        }
+
+
+class TokenCache:
+    """
+    Bounded LRU of validated token claims keyed by the token's SHA-256.
+
+    An entry lives until the earlier of the token's ``exp`` and ``ttl_seconds``
+    after it was cached.  ``revoke`` blocks a single token until it expires;
+    ``revoke_subject`` blocks every token of a subject issued (``iat``) at or
+    before the revocation time.  A subject revocation is dropped once
+    ``max_token_lifetime_seconds`` have passed, when every token it covers has expired.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300.0, max_token_lifetime_seconds: float = 900.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_token_lifetime_seconds = max_token_lifetime_seconds
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._by_subject: Dict[str, Dict[str, None]] = {}  # sub -> keys of its cached tokens
+        self._revoked: Dict[str, float] = {}  # token hash -> token exp
+        self._revoked_subjects: Dict[str, float] = {}  # sub -> revoked at
+
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.rejected = 0
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Cached claims for ``token``, or None if it must be decoded"""
+        key = self.key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        claims, expires_at = entry
+        if expires_at <= time.time():
+            self._drop(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return claims
+
+    def put(self, token: str, claims: Dict[str, Any]):
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        if "exp" in claims:
+            expires_at = min(expires_at, float(claims["exp"]))
+        if expires_at <= now or self.max_entries <= 0:
+            return
+        key = self.key(token)
+        self._entries[key] = (claims, expires_at)
+        self._entries.move_to_end(key)
+        self._by_subject.setdefault(str(claims.get("sub")), {})[key] = None
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _drop(self, key: str):
+        claims, _ = self._entries.pop(key)
+        subject = str(claims.get("sub"))
+        keys = self._by_subject.get(subject)
+        if keys is not None:
+            keys.pop(key, None)
+            if not keys:
+                del self._by_subject[subject]
+
+    def is_revoked(self, token: str, claims: Dict[str, Any]) -> bool:
+        revoked = False
+        if self._revoked:
+            revoked = self.key(token) in self._revoked
+        if not revoked and self._revoked_subjects:
+            cutoff = self._revoked_subjects.get(str(claims.get("sub")))
+            # Tokens without iat predate the cutoff by definition
+            revoked = cutoff is not None and float(claims.get("iat", 0)) <= cutoff
+        if revoked:
+            self.rejected += 1
+        return revoked
+
+    def revoke(self, token: str, expires_at: Optional[float] = None):
+        """Reject ``token`` from now on (until ``expires_at``, after which jwt.decode rejects it anyway)"""
+        key = self.key(token)
+        if key in self._entries:
+            self._drop(key)
+        self._revoked[key] = expires_at if expires_at is not None else time.time() + self.ttl_seconds
+        self._purge_revoked()
+
+    def revoke_subject(self, subject: Any):
+        """Reject every token issued to ``subject`` up to now"""
+        self._purge_revoked_subjects()
+        self._revoked_subjects[str(subject)] = time.time()
+        for key in self._by_subject.pop(str(subject), {}):
+            del self._entries[key]
+
+    def _purge_revoked(self):
+        now = time.time()
+        for key in [key for key, expires_at in self._revoked.items() if expires_at <= now]:
+            del self._revoked[key]
+
+    def _purge_revoked_subjects(self):
+        cutoff = time.time() - self.max_token_lifetime_seconds
+        for subject in [subject for subject, revoked_at in self._revoked_subjects.items() if revoked_at < cutoff]:
+            del self._revoked_subjects[subject]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "revoked_tokens": len(self._revoked),
+            "revoked_subjects": len(self._revoked_subjects),
+            "rejected": self.rejected,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
@@ -0,0 +1,291 @@
+"""
+Pluggable storage for the API's collections.
+
+Each collection holds JSON-serializable documents keyed by ``id`` and may
+declare indexed fields (optionally unique).  Two backends share one async
+interface:
+
+- ``MemoryStorage``: dicts plus hash indexes, the default and the one to use
+  in tests; nothing survives a restart.  Documents are copied on the way in
+  and out, so, as with SQLite, a caller only changes what is stored through
+  ``put``.
+- ``SQLiteStorage``: one table per collection in a WAL-mode database, with a
+  column and SQL index per indexed field.  Queries run on a small thread pool
+  where every thread owns its own connection (the connection pool), and use
+  fixed parameterized SQL so sqlite3's statement cache reuses the prepared
+  statements.  Several uvicorn workers can share the same database file.
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+IndexSpec = Dict[str, Callable[[Dict[str, Any]], Any]]
+
+
+class DuplicateKeyError(ValueError):
+    """A write would violate a unique index"""
+
+    def __init__(self, collection: str, field: str, value: Any = None):
+        detail = f"already contains {value!r}" if value is not None else "must be unique"
+        super().__init__(f"{collection}.{field} {detail}")
+        self.collection = collection
+        self.field = field
+        self.value = value
+
+
+def field_index(field: str) -> Callable[[Dict[str, Any]], Any]:
+    return lambda doc: doc.get(field)
+
+
+def _index_key(value: Any) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+def _copy(value: Any) -> Any:
+    """Copy of a document's nested dicts and lists; other values are shared (strings, numbers, dates)"""
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class MemoryCollection:
+    """Documents in a dict with one hash index per indexed field"""
+
+    def __init__(self, name: str, indexes: Optional[IndexSpec] = None, unique: Iterable[str] = ()):
+        self.name = name
+        self.indexes = indexes or {}
+        self.unique = set(unique)
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._index_data: Dict[str, Dict[str, Dict[str, None]]] = {
+            field: defaultdict(dict) for field in self.indexes
+        }
+
+    async def get(self, doc_id: Any) -> Optional[Dict[str, Any]]:
+        doc = self._docs.get(str(doc_id))
+        return _copy(doc) if doc is not None else None
+
+    async def find(self, field: str, value: Any) -> List[Dict[str, Any]]:
+        ids = self._index_data[field].get(_index_key(value))
+        return [_copy(self._docs[doc_id]) for doc_id in ids] if ids else []
+
+    async def find_one(self, field: str, value: Any) -> Optional[Dict[str, Any]]:
+        ids = self._index_data[field].get(_index_key(value))
+        return _copy(self._docs[next(iter(ids))]) if ids else None
+
+    async def all(self) -> List[Dict[str, Any]]:
+        return [_copy(doc) for doc in self._docs.values()]
+
+    async def count(self) -> int:
+        return len(self._docs)
+
+    async def put(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        """Insert or replace a document; raises DuplicateKeyError before changing anything"""
+        doc_id = str(doc["id"])
+        keys = {field: _index_key(extract(doc)) for field, extract in self.indexes.items()}
+        for field in self.unique:
+            holders = self._index_data[field].get(keys[field])
+            if holders and any(holder != doc_id for holder in holders):
+                raise DuplicateKeyError(self.name, field, keys[field])
+
+        previous = self._docs.get(doc_id)
+        if previous is not None:
+            self._unindex(doc_id, previous)
+        self._docs[doc_id] = _copy(doc)
+        for field, key in keys.items():
+            if key is not None:
+                self._index_data[field][key][doc_id] = None
+        return doc
+
+    async def put_many(self, docs: Iterable[Dict[str, Any]]):
+        for doc in docs:
+            await self.put(doc)
+
+    async def delete(self, doc_id: Any) -> Optional[Dict[str, Any]]:
+        doc = self._docs.pop(str(doc_id), None)
+        if doc is not None:
+            self._unindex(str(doc_id), doc)
+        return doc
+
+    def _unindex(self, doc_id: str, doc: Dict[str, Any]):
+        for field, extract in self.indexes.items():
+            key = _index_key(extract(doc))
+            ids = self._index_data[field].get(key)
+            if ids is not None:
+                ids.pop(doc_id, None)
+                if not ids:
+                    del self._index_data[field][key]
+
+
+class MemoryStorage:
+    def __init__(self):
+        self._collections: Dict[str, MemoryCollection] = {}
+
+    def collection(self, name: str, indexes: Optional[IndexSpec] = None, unique: Iterable[str] = ()) -> MemoryCollection:
+        self._collections[name] = MemoryCollection(name, indexes, unique)
+        return self._collections[name]
+
+    async def connect(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class SQLiteStorage:
+    """WAL-mode SQLite database accessed through a per-thread connection pool"""
+
+    def __init__(self, path: str, pool_size: int = 4):
+        self.path = path
+        self.pool_size = max(1, pool_size)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._collections: Dict[str, "SQLiteCollection"] = {}
+
+    def collection(self, name: str, indexes: Optional[IndexSpec] = None, unique: Iterable[str] = ()) -> "SQLiteCollection":
+        self._collections[name] = SQLiteCollection(self, name, indexes, unique)
+        return self._collections[name]
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, check_same_thread=False, cached_statements=256)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        """Run ``func(connection, *args)`` on the pool"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="sqlite")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: func(self._connection(), *args))
+
+    async def connect(self):
+        for collection in self._collections.values():
+            await self.run(collection._create_schema)
+
+    async def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+class SQLiteCollection:
+    """One table: id, JSON document and one indexed column per indexed field"""
+
+    def __init__(self, storage: SQLiteStorage, name: str, indexes: Optional[IndexSpec] = None, unique: Iterable[str] = ()):
+        self.storage = storage
+        self.name = name
+        self.indexes = indexes or {}
+        self.unique = set(unique)
+        self._fields = list(self.indexes)
+        self._columns = [f"ix_{field}" for field in self._fields]
+
+        column_list = ", ".join(["id", "data"] + self._columns)
+        placeholders = ", ".join("?" * (2 + len(self._columns)))
+        updates = ", ".join(f"{column} = excluded.{column}" for column in ["data"] + self._columns)
+        self._sql_upsert = (
+            f"INSERT INTO {name} ({column_list}) VALUES ({placeholders}) "
+            f"ON CONFLICT(id) DO UPDATE SET {updates}"
+        )
+        self._sql_get = f"SELECT data FROM {name} WHERE id = ?"
+        self._sql_all = f"SELECT data FROM {name} ORDER BY seq"
+        self._sql_count = f"SELECT COUNT(*) FROM {name}"
+        self._sql_delete = f"DELETE FROM {name} WHERE id = ? RETURNING data"
+        self._sql_find = {
+            field: f"SELECT data FROM {name} WHERE {column} = ? ORDER BY seq"
+            for field, column in zip(self._fields, self._columns)
+        }
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        columns = "".join(f", {column} TEXT" for column in self._columns)
+        with conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.name} ("
+                f"seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL UNIQUE, data TEXT NOT NULL{columns})"
+            )
+            for field, column in zip(self._fields, self._columns):
+                kind = "UNIQUE INDEX" if field in self.unique else "INDEX"
+                conn.execute(f"CREATE {kind} IF NOT EXISTS {self.name}_{column} ON {self.name} ({column})")
+
+    def _row(self, doc: Dict[str, Any]) -> Tuple[Any, ...]:
+        keys = [_index_key(extract(doc)) for extract in self.indexes.values()]
+        return (str(doc["id"]), json.dumps(doc, default=_json_default), *keys)
+
+    async def get(self, doc_id: Any) -> Optional[Dict[str, Any]]:
+        def query(conn):
+            row = conn.execute(self._sql_get, (str(doc_id),)).fetchone()
+            return json.loads(row[0]) if row else None
+        return await self.storage.run(query)
+
+    async def find(self, field: str, value: Any) -> List[Dict[str, Any]]:
+        sql = self._sql_find[field]
+
+        def query(conn):
+            return [json.loads(row[0]) for row in conn.execute(sql, (_index_key(value),))]
+        return await self.storage.run(query)
+
+    async def find_one(self, field: str, value: Any) -> Optional[Dict[str, Any]]:
+        docs = await self.find(field, value)
+        return docs[0] if docs else None
+
+    async def all(self) -> List[Dict[str, Any]]:
+        def query(conn):
+            return [json.loads(row[0]) for row in conn.execute(self._sql_all)]
+        return await self.storage.run(query)
+
+    async def count(self) -> int:
+        return await self.storage.run(lambda conn: conn.execute(self._sql_count).fetchone()[0])
+
+    async def put(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        await self.put_many([doc])
+        return doc
+
+    async def put_many(self, docs: Iterable[Dict[str, Any]]):
+        rows = [self._row(doc) for doc in docs]
+
+        def write(conn):
+            try:
+                with conn:
+                    conn.executemany(self._sql_upsert, rows)
+            except sqlite3.IntegrityError as e:
+                field = next((f for f in self.unique if f"ix_{f}" in str(e)), "id")
+                raise DuplicateKeyError(self.name, field) from e
+        await self.storage.run(write)
+
+    async def delete(self, doc_id: Any) -> Optional[Dict[str, Any]]:
+        def write(conn):
+            with conn:
+                row = conn.execute(self._sql_delete, (str(doc_id),)).fetchone()
+            return json.loads(row[0]) if row else None
+        return await self.storage.run(write)
+
+
+def open_storage(backend: str = "memory", sqlite_path: str = "fljobs.db", pool_size: int = 4):
+    if backend == "sqlite":
+        return SQLiteStorage(sqlite_path, pool_size)
+    return MemoryStorage()
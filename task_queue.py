@@ -0,0 +1,295 @@
+"""
+Persistent background task queue backed by SQLite.
+
+Tasks are rows in a ``tasks`` table, so queued work survives restarts and
+several API processes can share one queue file.  A worker claims the oldest
+due task inside an IMMEDIATE transaction and leases it until
+``locked_until``, renewing the lease while the handler runs; if the process
+dies mid-task the lease runs out and the task becomes claimable again.  ``TaskWorkerPool`` runs a fixed number of
+async workers over the queue.  A handler that raises is retried with
+exponential backoff (with jitter) until ``max_attempts`` is used up;
+raising ``RetryLater`` reschedules without using up an attempt, e.g. while
+the model is still loading.  Each (kind, key) has at most one pending task.
+"""
+import asyncio
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RetryLater(Exception):
+    """Raised by a handler to run the task again after ``delay_seconds`` without counting an attempt"""
+
+    def __init__(self, delay_seconds: float):
+        super().__init__(f"retry in {delay_seconds:.1f}s")
+        self.delay_seconds = delay_seconds
+
+
+class Task(NamedTuple):
+    id: int
+    kind: str
+    key: str
+    payload: Dict[str, Any]
+    attempts: int  # including the current one
+
+
+class TaskQueue:
+    """
+    SQLite table of tasks; every method is blocking and thread-safe.  With
+    ``path`` ":memory:" the queue only lives as long as the process.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 300.0):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        """Connect and create the table (also done lazily on first use)"""
+        with self._lock:
+            self._open()
+
+    def _open(self) -> sqlite3.Connection:
+        if self._conn is not None:
+            return self._conn
+        conn = sqlite3.connect(self.path, timeout=30.0, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, key TEXT NOT NULL, payload TEXT NOT NULL, "
+            "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, available_at REAL NOT NULL, "
+            "locked_until REAL, last_error TEXT, created_at REAL NOT NULL, UNIQUE (kind, key))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS tasks_due ON tasks (status, available_at)")
+        self._conn = conn
+        return conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def enqueue(self, kind: str, key: Any, payload: Dict[str, Any], delay_seconds: float = 0.0) -> bool:
+        """
+        Queue a task; False if one for (kind, key) is already pending.  A task
+        that failed for good is reset and queued again.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._open().execute(
+                "INSERT INTO tasks (kind, key, payload, status, available_at, created_at) VALUES (?, ?, ?, 'queued', ?, ?) "
+                "ON CONFLICT (kind, key) DO UPDATE SET payload = excluded.payload, status = 'queued', attempts = 0, "
+                "available_at = excluded.available_at, locked_until = NULL, last_error = NULL WHERE status = 'failed'",
+                (kind, str(key), json.dumps(payload), now + delay_seconds, now)
+            )
+            return cursor.rowcount > 0
+
+    def claim(self) -> Optional[Task]:
+        """Lease the oldest due task (including ones whose lease expired), or None"""
+        now = time.time()
+        with self._lock:
+            conn = self._open()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT id, kind, key, payload, attempts FROM tasks "
+                    "WHERE (status = 'queued' AND available_at <= ?) OR (status = 'running' AND locked_until <= ?) "
+                    "ORDER BY available_at, id LIMIT 1",
+                    (now, now)
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE tasks SET status = 'running', attempts = attempts + 1, locked_until = ? WHERE id = ?",
+                        (now + self.lease_seconds, row[0])
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        task_id, kind, key, payload, attempts = row
+        return Task(task_id, kind, key, json.loads(payload), attempts + 1)
+
+    def renew(self, task_id: int) -> bool:
+        """Extend the lease of a running task; False if it is no longer running"""
+        with self._lock:
+            cursor = self._open().execute(
+                "UPDATE tasks SET locked_until = ? WHERE id = ? AND status = 'running'",
+                (time.time() + self.lease_seconds, task_id)
+            )
+            return cursor.rowcount > 0
+
+    def complete(self, task_id: int):
+        with self._lock:
+            self._open().execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+
+    def retry(self, task_id: int, delay_seconds: float, error: str, count_attempt: bool = True):
+        with self._lock:
+            self._open().execute(
+                "UPDATE tasks SET status = 'queued', available_at = ?, locked_until = NULL, last_error = ?, "
+                "attempts = attempts - ? WHERE id = ?",
+                (time.time() + delay_seconds, error, 0 if count_attempt else 1, task_id)
+            )
+
+    def fail(self, task_id: int, error: str):
+        with self._lock:
+            self._open().execute(
+                "UPDATE tasks SET status = 'failed', locked_until = NULL, last_error = ? WHERE id = ?",
+                (error, task_id)
+            )
+
+    def next_due(self) -> Optional[float]:
+        """Seconds until the next queued task is due (0 if one is due now), None if nothing is queued"""
+        with self._lock:
+            row = self._open().execute(
+                "SELECT MIN(available_at) FROM tasks WHERE status = 'queued'"
+            ).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._open().execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+        return dict(rows)
+
+
+Handler = Callable[[Task], Awaitable[None]]
+
+
+class TaskWorkerPool:
+    """``concurrency`` async workers running ``handler`` for each claimed task"""
+
+    def __init__(self, queue: TaskQueue, handler: Handler, concurrency: int = 2, max_attempts: int = 5,
+                 retry_base_seconds: float = 2.0, retry_max_seconds: float = 300.0, poll_seconds: float = 5.0,
+                 on_failure: Optional[Callable[[Task, Exception], Awaitable[None]]] = None):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = max(1, int(concurrency))
+        self.max_attempts = max(1, int(max_attempts))
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.poll_seconds = poll_seconds
+        self.on_failure = on_failure
+        self._workers = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self.running = 0
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+
+    def start(self):
+        if self._workers:
+            return
+        self._wakeup = asyncio.Event()
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        """Cancel the workers; tasks they were running go back to the queue without using up an attempt"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def notify(self):
+        """Wake idle workers, e.g. right after enqueueing"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def backoff(self, attempts: int) -> float:
+        delay = min(self.retry_max_seconds, self.retry_base_seconds * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _work(self):
+        while True:
+            try:
+                task = await asyncio.to_thread(self.queue.claim)
+            except sqlite3.Error as e:
+                logger.error(f"Task queue unavailable: {str(e)}")
+                task = None
+            if task is None:
+                await self._idle()
+                continue
+            try:
+                await self._run(task)
+            except Exception as e:
+                logger.error(f"Error finishing {task.kind} task {task.key}: {str(e)}")
+
+    async def _idle(self):
+        try:
+            due = await asyncio.to_thread(self.queue.next_due)
+        except sqlite3.Error:
+            due = None
+        timeout = self.poll_seconds if due is None else min(self.poll_seconds, due)
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _heartbeat(self, task: Task):
+        """Renew the lease every third of its length, so a slow handler is not claimed by a second worker"""
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            try:
+                await asyncio.to_thread(self.queue.renew, task.id)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not renew the lease of {task.kind} task {task.key}: {str(e)}")
+
+    async def _run(self, task: Task):
+        self.running += 1
+        heartbeat = asyncio.create_task(self._heartbeat(task))
+        try:
+            try:
+                await self.handler(task)
+            finally:
+                heartbeat.cancel()
+        except RetryLater as e:
+            await asyncio.to_thread(self.queue.retry, task.id, e.delay_seconds, str(e), False)
+            return
+        except asyncio.CancelledError:
+            await asyncio.to_thread(self.queue.retry, task.id, 0.0, "interrupted", False)
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {str(e)}"
+            if task.attempts < self.max_attempts:
+                delay = self.backoff(task.attempts)
+                logger.warning(f"{task.kind} task {task.key} failed (attempt {task.attempts}), retrying in {delay:.1f}s: {error}")
+                self.retried += 1
+                await asyncio.to_thread(self.queue.retry, task.id, delay, error)
+                return
+            logger.error(f"{task.kind} task {task.key} failed after {task.attempts} attempts: {error}")
+            self.failed += 1
+            await asyncio.to_thread(self.queue.fail, task.id, error)
+            if self.on_failure is not None:
+                try:
+                    await self.on_failure(task, e)
+                except Exception as failure_error:
+                    logger.error(f"Failure handler for {task.kind} task {task.key} raised: {str(failure_error)}")
+            return
+        finally:
+            self.running -= 1
+        self.completed += 1
+        await asyncio.to_thread(self.queue.complete, task.id)
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            queued = self.queue.counts()
+        except sqlite3.Error:
+            queued = {}
+        return {
+            "concurrency": self.concurrency,
+            "running": self.running,
+            "completed": self.completed,
+            "retried": self.retried,
+            "failed": self.failed,
+            "queue": queued
+        }
@@ -0,0 +1,39 @@
+import asyncio
+
+from change_tracker import ChangeTracker, ReembedWorker
+
+
+def test_records_are_forgotten_once_resolved():
+    tracker = ChangeTracker()
+    texts = {"1": "barista", "2": None}  # job 2 was deleted
+    applied = []
+
+    async def load_text(kind, record_id):
+        return texts[record_id]
+
+    async def encode(batch):
+        # Job 1 changes again while its batch is being encoded
+        tracker.mark("job", "1")
+        return [[0.0] for _ in batch]
+
+    worker = ReembedWorker(tracker, encode, load_text, lambda upserts, deletes: applied.append((upserts, deletes)))
+
+    async def run():
+        tracker.mark("job", "1")
+        tracker.mark("job", "2")
+        await worker.process_batch(tracker.pending(10))
+
+    asyncio.run(run())
+    # The stale vector for job 1 was skipped and job 1 stays dirty; job 2 is gone
+    assert applied == [([], [("job", "2")])]
+    assert tracker.is_dirty("job", "1")
+    assert tracker.stats()["tracked"] == 1
+    assert tracker.version("job", "2") == 0
+
+    async def again(batch):
+        return [[1.0] for _ in batch]
+
+    worker.encode = again
+    asyncio.run(worker.process_batch(tracker.pending(10)))
+    assert len(tracker) == 0
+    assert tracker.stats()["tracked"] == 0
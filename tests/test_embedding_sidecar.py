@@ -0,0 +1,97 @@
+import asyncio
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import embedding_sidecar
+from embedding_sidecar import EmbeddingClient
+
+
+class SlowModel:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    def encode(self, texts, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        return np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def sidecar():
+    """Start a sidecar on a temporary socket; yields a function taking the model"""
+    path = os.path.join(tempfile.mkdtemp(), "embeddings.sock")
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    def start(model, **options):
+        asyncio.run_coroutine_threadsafe(embedding_sidecar.serve(path, model, **options), loop)
+        deadline = time.time() + 5
+        while not os.path.exists(path) and time.time() < deadline:
+            time.sleep(0.01)
+        return path
+
+    yield start
+
+    async def stop():
+        current = asyncio.current_task()
+        pending = [task for task in asyncio.all_tasks() if task is not current]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    asyncio.run_coroutine_threadsafe(stop(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+
+def test_round_trip(sidecar):
+    client = EmbeddingClient(sidecar(SlowModel()))
+    vectors = client.encode(["a", "bbb"])
+    assert vectors.shape == (2, 2)
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+    client.close()
+
+
+def test_timeout_is_not_resent(sidecar):
+    model = SlowModel(delay=0.5)
+    client = EmbeddingClient(sidecar(model), timeout_seconds=0.1)
+    with pytest.raises(socket.timeout):
+        client.encode(["slow"])
+    time.sleep(0.6)
+    assert model.calls == 1
+    assert client.connects == 1
+
+
+def test_bad_json_gets_an_error_reply(sidecar):
+    path = sidecar(SlowModel())
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(5)
+    sock.connect(path)
+    for payload in (b"{not json", b'{"a": 1}'):
+        sock.sendall(embedding_sidecar._REQUEST_HEADER.pack(len(payload)) + payload)
+        status, length = embedding_sidecar._RESPONSE_HEADER.unpack(sock.recv(embedding_sidecar._RESPONSE_HEADER.size))
+        assert status == 1
+        sock.recv(length)
+    sock.close()
+
+
+def test_oversized_request_is_refused(sidecar):
+    path = sidecar(SlowModel(), max_request_bytes=1024)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(5)
+    sock.connect(path)
+    sock.sendall(embedding_sidecar._REQUEST_HEADER.pack(2 ** 32 - 1))
+    status, length = embedding_sidecar._RESPONSE_HEADER.unpack(sock.recv(embedding_sidecar._RESPONSE_HEADER.size))
+    assert status == 1
+    assert b"limit" in sock.recv(length)
+    assert sock.recv(1) == b""  # closed
+    sock.close()
@@ -0,0 +1,65 @@
+import asyncio
+import gc
+
+import numpy as np
+import pytest
+
+from embeddings import EmbeddingBatcher
+
+
+class CountingModel:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.batches = []
+
+    def encode(self, texts, **kwargs):
+        self.batches.append(list(texts))
+        if self.fail:
+            raise ValueError("encode failed")
+        return np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+
+
+def test_concurrent_requests_share_one_batch_and_the_cache():
+    async def run():
+        model = CountingModel()
+        batcher = EmbeddingBatcher(window_ms=5)
+        batcher.attach(model)
+        first, second = await asyncio.gather(batcher.encode(["a", "bb"]), batcher.encode(["bb", "ccc"]))
+        again = await batcher.encode(["ccc"])
+        batcher.shutdown()
+        return model, first, second, again
+
+    model, first, second, again = asyncio.run(run())
+    assert model.batches == [["a", "bb", "ccc"]]
+    assert np.allclose(np.linalg.norm(first, axis=1), 1.0)
+    assert np.allclose(first[1], second[0]) and np.allclose(second[1], again[0])
+
+
+def test_failed_batch_raises_once_without_unretrieved_exceptions():
+    unretrieved = []
+
+    async def run():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: unretrieved.append(context))
+        batcher = EmbeddingBatcher(window_ms=1)
+        batcher.attach(CountingModel(fail=True))
+        with pytest.raises(ValueError):
+            await batcher.encode(["a", "b", "c"])
+        batcher.shutdown()
+        gc.collect()
+
+    asyncio.run(run())
+    gc.collect()
+    assert unretrieved == []
+
+
+def test_shutdown_fails_queued_requests():
+    async def run():
+        batcher = EmbeddingBatcher(window_ms=1000)
+        batcher.attach(CountingModel())
+        request = asyncio.ensure_future(batcher.encode(["queued"]))
+        await asyncio.sleep(0.01)
+        batcher.shutdown()
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(request, 1)
+
+    asyncio.run(run())
@@ -0,0 +1,83 @@
+import pytest
+
+from generation_profiles import (
+    GENERATION_PROFILES, TRUNCATION_MARK, TaskMetrics, TaskProfile, estimate_tokens, fill_prompt, fit_text, task_profile
+)
+
+PARAGRAPHS = "\n\n".join(
+    " ".join(f"Sentence {p}.{s} about stocking shelves and serving customers." for s in range(5)) for p in range(6)
+)
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens(None) == 0
+    assert estimate_tokens("the cat sat.") == 4
+    # Long words count one token per four characters
+    assert estimate_tokens("responsibilities") == 4
+
+
+def test_profile_params():
+    summary = task_profile("summary").params()
+    assert summary["max_new_tokens"] == 200
+    assert summary["stop_sequences"] == ["\n\n"]
+    assert summary["temperature"] == 0.5
+
+    analysis = task_profile("match_analysis").params()
+    assert analysis["decoding_method"] == "greedy"
+    assert "temperature" not in analysis and "top_p" not in analysis
+    assert "stop_sequences" not in analysis
+
+    with pytest.raises(KeyError):
+        task_profile("poem")
+    assert all(profile.max_prompt_tokens > 0 for profile in GENERATION_PROFILES.values())
+
+
+def test_fit_text_keeps_short_text():
+    assert fit_text("short text", 10) == "short text"
+
+
+def test_fit_text_cuts_at_a_boundary():
+    for max_tokens in (40, 100, 250):
+        cut = fit_text(PARAGRAPHS, max_tokens)
+        assert cut.endswith(TRUNCATION_MARK)
+        assert max_tokens // 2 <= estimate_tokens(cut) <= max_tokens
+        body = cut[:-len(TRUNCATION_MARK)]
+        assert PARAGRAPHS.startswith(body)
+        assert body.endswith(".")
+        # Deterministic, so the prompt keeps hitting the response cache
+        assert fit_text(PARAGRAPHS, max_tokens) == cut
+    assert fit_text(PARAGRAPHS, 1) == ""
+
+
+def test_fill_prompt_within_budget_is_unchanged():
+    profile = TaskProfile("test", max_new_tokens=10, max_prompt_tokens=100)
+    assert fill_prompt(profile, "Job: {job}\nCandidate: {candidate}", job="Cashier", candidate=None) == \
+        ("Job: Cashier\nCandidate: ", False)
+
+
+def test_fill_prompt_trims_the_longest_field():
+    profile = TaskProfile("test", max_new_tokens=10, max_prompt_tokens=200)
+    template = "Job: {job}\nCandidate: {candidate}\nNotes: {notes}"
+    prompt, truncated = fill_prompt(profile, template, job="Night shift cashier", candidate=PARAGRAPHS, notes="")
+    assert truncated
+    assert estimate_tokens(prompt) <= 200
+    # The short field keeps all its text and passes its share on
+    assert prompt.startswith("Job: Night shift cashier\nCandidate: Sentence 0.0")
+    assert TRUNCATION_MARK in prompt
+    assert estimate_tokens(prompt) > 150
+
+
+def test_task_metrics_counts_per_task():
+    metrics = TaskMetrics(["test_task"])
+    metrics.record_call("test_task", 0.5, prompt_tokens=100, generated_tokens=20, stop_reason="max_tokens")
+    metrics.record_call("test_task", 1.5, prompt_tokens=300, generated_tokens=40)
+    metrics.record_cache_hit("test_task")
+    metrics.record_truncation("test_task")
+    stats = metrics.stats()["test_task"]
+    assert stats["calls"] == 2
+    assert stats["token_cap_hits"] == 1
+    assert stats["cache_hits"] == 1
+    assert stats["truncated_prompts"] == 1
+    assert stats["avg_prompt_tokens"] == 200.0
+    assert stats["avg_generated_tokens"] == 30.0
@@ -0,0 +1,78 @@
+import time
+
+import numpy as np
+
+from geo_index import GeoIndex, haversine_m
+
+
+def brute_force(points, lat, lon, k):
+    ids = list(points)
+    distances = haversine_m(lat, lon, np.array([points[i][0] for i in ids]), np.array([points[i][1] for i in ids]))
+    order = sorted(range(len(ids)), key=lambda n: (distances[n], ids[n]))
+    return [(ids[n], float(distances[n])) for n in order[:k]]
+
+
+def random_index(count, seed=0):
+    rng = np.random.default_rng(seed)
+    index, points = GeoIndex(), {}
+    for n in range(count):
+        lat, lon = 17.3 + rng.uniform(0, 0.3), 78.3 + rng.uniform(0, 0.3)
+        index.add(f"p{n}", lat, lon)
+        points[f"p{n}"] = (lat, lon)
+    return index, points
+
+
+def test_nearest_matches_brute_force():
+    index, points = random_index(500)
+    for lat, lon in [(17.45, 78.45), (17.3, 78.3), (17.7, 78.0)]:
+        result = index.nearest(lat, lon, 15)
+        expected = brute_force(points, lat, lon, 15)
+        assert [item for item, _ in result] == [item for item, _ in expected]
+        assert np.allclose([d for _, d in result], [d for _, d in expected])
+
+
+def test_within_matches_brute_force():
+    index, points = random_index(300)
+    result = index.within(17.45, 78.45, 5000)
+    expected = [(item, d) for item, d in brute_force(points, 17.45, 78.45, len(points)) if d <= 5000]
+    assert [item for item, _ in result] == [item for item, _ in expected]
+
+
+def test_k_larger_than_index_returns_every_point_quickly():
+    index = GeoIndex()
+    index.add("a", 17.40, 78.40)
+    index.add("b", 17.50, 78.60)
+    started = time.perf_counter()
+    result = index.nearest(17.45, 78.50, k=20)
+    assert time.perf_counter() - started < 0.5
+    assert sorted(item for item, _ in result) == ["a", "b"]
+
+
+def test_query_far_from_the_data_is_fast():
+    index, points = random_index(50)
+    # About 1,200 km from every point
+    started = time.perf_counter()
+    result = index.nearest(28.0, 78.4, k=20)
+    assert time.perf_counter() - started < 0.5
+    assert [item for item, _ in result] == [item for item, _ in brute_force(points, 28.0, 78.4, 20)]
+
+
+def test_bounds_shrink_after_removal():
+    index = GeoIndex()
+    index.add("near", 17.4, 78.4)
+    index.add("far", 40.0, -74.0)
+    index.remove("far")
+    assert index._bounds == [index._cell(17.4, 78.4)[0]] * 2 + [index._cell(17.4, 78.4)[1]] * 2
+    assert index.nearest(17.4, 78.4, 5) == [("near", 0.0)]
+    index.remove("near")
+    assert index._bounds is None
+    assert index.nearest(17.4, 78.4, 5) == []
+
+
+def test_move_and_max_radius():
+    index = GeoIndex()
+    index.add("a", 17.40, 78.40)
+    index.add("b", 17.41, 78.40)
+    index.add("a", 17.60, 78.40)
+    assert index.location("a") == (17.60, 78.40)
+    assert [item for item, _ in index.nearest(17.40, 78.40, 5, max_radius_m=5000)] == ["b"]
@@ -0,0 +1,43 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from granite_runtime import GraniteRunner, hedged
+
+
+def test_timed_out_call_keeps_its_slot_until_the_thread_returns():
+    runner = GraniteRunner(max_concurrency=1, timeout_seconds=5)
+    release = threading.Event()
+
+    async def run():
+        with pytest.raises(asyncio.TimeoutError):
+            await runner.run(release.wait, 10, timeout=0.05)
+        # The SDK call is still running on its thread
+        assert runner.in_flight == 1
+        with pytest.raises(asyncio.TimeoutError):
+            await runner.run(lambda: "second", timeout=0.05)
+        release.set()
+        await asyncio.sleep(0.05)
+        assert runner.in_flight == 0
+        return await runner.run(lambda: "third", timeout=1)
+
+    try:
+        assert asyncio.run(run()) == "third"
+    finally:
+        release.set()
+        runner.shutdown()
+
+
+def test_hedged_waits_before_retrying_a_failure():
+    attempts = []
+
+    async def attempt():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise RuntimeError("first attempt fails")
+        return "ok"
+
+    assert asyncio.run(hedged(attempt, hedge_after=5, max_attempts=2, retry_delay=0.2)) == "ok"
+    assert attempts[1] - attempts[0] >= 0.1
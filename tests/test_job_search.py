@@ -0,0 +1,31 @@
+from job_search import JobSearch
+from text_search import BM25Index
+
+
+def job(position, wage, lat, lon):
+    return {"position": position, "store_name": "Store", "requirements": "", "responsibilities": "",
+            "wage": wage, "lat": lat, "lon": lon}
+
+
+def test_nearby_with_filters_looks_past_the_nearest_jobs():
+    search = JobSearch(BM25Index(), None)
+    # 100 low-paid jobs close by, then 5 well-paid ones further out
+    for n in range(100):
+        search.upsert(f"low{n}", job("Cashier", "$10/hour", 17.40 + n * 0.0001, 78.40))
+    for n in range(5):
+        search.upsert(f"high{n}", job("Cook", "$30/hour", 17.50 + n * 0.01, 78.40))
+
+    hits = search.nearby(17.40, 78.40, limit=3, min_wage=25)
+    assert [job_id for job_id, _ in hits] == ["high0", "high1", "high2"]
+
+    hits = search.nearby(17.40, 78.40, limit=10, min_wage=25)
+    assert [job_id for job_id, _ in hits] == [f"high{n}" for n in range(5)]
+
+
+def test_nearby_without_filters_and_with_radius():
+    search = JobSearch(BM25Index(), None)
+    search.upsert("a", job("Cashier", "$10/hour", 17.40, 78.40))
+    search.upsert("b", job("Cook", "$30/hour", 17.45, 78.40))
+    assert [job_id for job_id, _ in search.nearby(17.40, 78.40, limit=5)] == ["a", "b"]
+    assert [job_id for job_id, _ in search.nearby(17.40, 78.40, radius_m=1000, limit=5)] == ["a"]
+    assert [job_id for job_id, _ in search.nearby(17.40, 78.40, radius_m=10000, limit=5, min_wage=25)] == ["b"]
@@ -0,0 +1,40 @@
+import asyncio
+import sqlite3
+
+from llm_cache import LLMResponseCache, make_cache_key
+
+
+def test_key_ignores_prompt_whitespace():
+    params = {"max_new_tokens": 10}
+    assert make_cache_key("m", params, "Write  a\n job") == make_cache_key("m", params, "Write a job")
+    assert make_cache_key("m", params, "Write a job") != make_cache_key("other", params, "Write a job")
+
+
+def test_disk_tier_survives_restart_and_is_capped(tmp_path):
+    path = str(tmp_path / "cache.db")
+
+    async def fill():
+        cache = LLMResponseCache(max_entries=2, sqlite_path=path, max_disk_entries=20)
+        for n in range(50):
+            await cache.set(f"k{n}", f"v{n}", ttl_seconds=1000 + n)
+        await cache.set("expired", "old", ttl_seconds=-1)
+        cache.close()
+
+    async def reopen():
+        cache = LLMResponseCache(max_entries=2, sqlite_path=path, max_disk_entries=20)
+        try:
+            return await cache.get("k49"), await cache.get("k0"), await cache.get("expired"), cache.stats()
+        finally:
+            cache.close()
+
+    asyncio.run(fill())
+    rows = sqlite3.connect(path).execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+    # Trimmed every max_disk_entries // 10 writes
+    assert rows <= 22
+
+    newest, oldest, expired, stats = asyncio.run(reopen())
+    # The soonest-expiring rows went first; expired ones are purged on open
+    assert newest == "v49"
+    assert oldest is None
+    assert expired is None
+    assert stats["disk_hits"] == 1
@@ -0,0 +1,78 @@
+import asyncio
+import json
+
+from match_analysis import (
+    MATCH_ANALYSIS_INDEXES, MAX_ITEMS, IncrementalJSONParser, MatchAnalysisStore, normalize_match_analysis,
+    parse_match_analysis, text_version
+)
+from storage import open_storage
+
+ANALYSIS = {"match_score": 82, "strengths": ["Barista experience"], "gaps": ["No POS training"],
+            "recommendations": ["Take a POS course"], "summary": "Strong fit."}
+
+
+def test_parses_object_wrapped_in_prose_and_fence():
+    text = ('Here is the analysis:\n```json\n{"match_score": 82, "strengths": ["Barista experience",],'
+            '"gaps": ["No POS training"], "recommendations": ["Take a POS course"],,'
+            '"summary": "Strong\nfit."}\n```\nLet me know if you need more.')
+    assert parse_match_analysis(text) == {**ANALYSIS, "summary": "Strong fit."}
+
+
+def test_stream_is_complete_at_the_closing_brace():
+    parser = IncrementalJSONParser()
+    document = json.dumps(ANALYSIS)
+    chunks = [document[i:i + 7] for i in range(0, len(document), 7)]
+    assert not any(parser.feed(chunk) for chunk in chunks[:-1])
+    assert parser.feed(chunks[-1] + " and some commentary {")
+    assert parser.value() == ANALYSIS
+
+
+def test_truncated_object_closes_at_last_complete_element():
+    parser = IncrementalJSONParser()
+    parser.feed('{"match_score": 70, "strengths": ["Punctual", "Friendly"], "gaps": ["Evening avail')
+    assert not parser.done
+    assert parser.value() == {"match_score": 70, "strengths": ["Punctual", "Friendly"], "gaps": []}
+    assert IncrementalJSONParser().value() is None
+
+
+def test_normalize_enforces_the_schema():
+    analysis = normalize_match_analysis({
+        "match_score": "130%",
+        "strengths": ["  Lifting   heavy boxes ", "lifting heavy boxes", 42] + [f"Skill {n}" for n in range(10)],
+        "gaps": "Night shifts",
+        "extra": "dropped"
+    })
+    assert analysis["match_score"] == 100
+    assert analysis["strengths"][0] == "Lifting heavy boxes"
+    assert len(analysis["strengths"]) == MAX_ITEMS
+    assert analysis["gaps"] == ["Night shifts"]
+    assert analysis["recommendations"] == []
+    assert analysis["summary"] == ""
+    assert "extra" not in analysis
+
+    assert normalize_match_analysis({"match_score": 50, "strengths": []}) is None
+    assert normalize_match_analysis({"match_score": True, "strengths": ["x"]}) is None
+    assert normalize_match_analysis(["not", "an", "object"]) is None
+    assert parse_match_analysis("I cannot analyze this candidate.") is None
+
+
+def test_store_serves_analysis_until_a_version_changes():
+    async def run():
+        store = MatchAnalysisStore(open_storage("memory").collection("match_analyses", MATCH_ANALYSIS_INDEXES))
+        job_v1, job_v2 = text_version("Barista, 9-5"), text_version("Barista, 10-6")
+        candidate = text_version("Five years behind the counter")
+        await store.put("user:1", candidate, "job:1", job_v1, "granite", ANALYSIS)
+        results = (
+            await store.get("user:1", candidate, "job:1", job_v1, "granite"),
+            await store.get("user:1", candidate, "job:1", job_v2, "granite"),
+            await store.get("user:1", candidate, "job:1", job_v1, "keywords"),
+            await store.forget_job("job:1"),
+            await store.get("user:1", candidate, "job:1", job_v1, "granite")
+        )
+        return results
+
+    current, changed_job, other_analyzer, forgotten, after_delete = asyncio.run(run())
+    assert current == ANALYSIS
+    assert changed_job is None and other_analyzer is None
+    assert forgotten == 1
+    assert after_delete is None
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from metrics import CallbackMetric, Counter, Histogram, Registry, RequestMetricsMiddleware, register_route_series
+
+
+def test_counter_renders_labelled_series():
+    registry = Registry()
+    counter = Counter("jobs_total", "Jobs posted", labelnames=("location",),
+                      label_sets=[("Madhapur",), ('Say "hi"\\\n',)], registry=registry)
+    counter.labels("Madhapur").inc()
+    counter.labels("Madhapur").inc(2)
+    assert registry.render() == (
+        "# HELP jobs_total Jobs posted\n"
+        "# TYPE jobs_total counter\n"
+        'jobs_total{location="Madhapur"} 3\n'
+        'jobs_total{location="Say \\"hi\\"\\\\\\n"} 0\n'
+    )
+    with pytest.raises(ValueError):
+        counter.labels("Madhapur", "extra")
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = Histogram("latency_seconds", "Latency", buckets=(0.1, 1.0), registry=registry)
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+    lines = registry.render().splitlines()
+    assert lines[2:] == [
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1.0"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 3.65",
+        "latency_seconds_count 4",
+    ]
+
+
+def test_callback_metric_and_duplicate_names():
+    registry = Registry()
+    CallbackMetric("queue_depth", "Queued tasks", "gauge", ("queue",),
+                   lambda: [(("enhance",), 3), (("reembed",), float("nan"))], registry=registry)
+    assert registry.render().splitlines()[2:] == ['queue_depth{queue="enhance"} 3', 'queue_depth{queue="reembed"} NaN']
+    with pytest.raises(ValueError):
+        Counter("queue_depth", "Again", registry=registry)
+    with pytest.raises(ValueError):
+        CallbackMetric("odd", "Odd", "summary", (), lambda: [], registry=registry)
+
+
+class _Route:
+    def __init__(self, path, methods):
+        self.path = path
+        self.methods = methods
+
+
+def test_middleware_labels_by_route_template():
+    route = _Route("/jobs/{job_id}", {"GET"})
+    histogram = Histogram("http_seconds", "Requests", labelnames=("method", "route", "status"), registry=None)
+    register_route_series(histogram, [route])
+
+    async def app(scope, receive, send):
+        if scope["path"].startswith("/jobs/"):
+            scope["route"] = route
+            await send({"type": "http.response.start", "status": 200})
+        else:
+            await send({"type": "http.response.start", "status": 404})
+
+    async def send(message):
+        pass
+
+    async def run():
+        middleware = RequestMetricsMiddleware(app, histogram)
+        for method, path in (("GET", "/jobs/1"), ("GET", "/jobs/2"), ("POST", "/jobs/3"), ("GET", "/nowhere")):
+            await middleware({"type": "http", "method": method, "path": path}, None, send)
+
+    asyncio.run(run())
+    counts = {values: sum(child.counts) for values, child in histogram._children.items() if sum(child.counts)}
+    assert counts == {
+        ("GET", "/jobs/{job_id}", "2xx"): 2,
+        ("OTHER", "/jobs/{job_id}", "2xx"): 1,
+        ("OTHER", "unmatched", "4xx"): 1,
+    }
+    assert ("GET", "/jobs/{job_id}", "5xx") in histogram._children
@@ -0,0 +1,43 @@
+import time
+
+from security import TokenCache
+
+
+def test_cached_claims_expire_with_the_token():
+    cache = TokenCache(ttl_seconds=300)
+    cache.put("live", {"sub": "u1", "exp": time.time() + 60})
+    cache.put("expired", {"sub": "u1", "exp": time.time() - 1})
+    assert cache.get("live")["sub"] == "u1"
+    assert cache.get("expired") is None
+
+
+def test_revoke_subject_blocks_tokens_issued_before_it():
+    cache = TokenCache()
+    old = {"sub": "u1", "iat": time.time() - 10}
+    cache.put("old", old)
+    cache.revoke_subject("u1")
+    assert cache.get("old") is None
+    assert cache.is_revoked("old", old)
+    assert not cache.is_revoked("new", {"sub": "u1", "iat": time.time() + 1})
+    assert not cache.is_revoked("other", {"sub": "u2", "iat": 0})
+
+
+def test_subject_revocations_are_dropped_after_the_token_lifetime():
+    cache = TokenCache(max_token_lifetime_seconds=60)
+    cache.revoke_subject("old")
+    cache._revoked_subjects["old"] -= 61
+    cache.revoke_subject("recent")
+    assert set(cache._revoked_subjects) == {"recent"}
+    assert cache.stats()["revoked_subjects"] == 1
+
+
+def test_evicted_and_revoked_tokens_leave_the_subject_index():
+    cache = TokenCache(max_entries=2)
+    cache.put("a", {"sub": "u1"})
+    cache.put("b", {"sub": "u2"})
+    cache.put("c", {"sub": "u2"})  # evicts "a"
+    assert set(cache._by_subject) == {"u2"}
+    cache.revoke("b")
+    cache.revoke_subject("u2")
+    assert cache.stats()["size"] == 0
+    assert cache._by_subject == {}
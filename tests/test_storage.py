@@ -0,0 +1,20 @@
+import asyncio
+
+from storage import MemoryCollection, field_index
+
+
+def test_memory_collection_hands_out_copies():
+    async def scenario():
+        jobs = MemoryCollection("jobs", indexes={"store": field_index("store_id")})
+        doc = {"id": 1, "store_id": 7, "tags": ["retail"]}
+        await jobs.put(doc)
+        doc["tags"].append("changed after put")
+
+        (await jobs.get(1))["tags"].append("changed after get")
+        (await jobs.find("store", 7))[0]["store_id"] = 8
+        (await jobs.all())[0]["title"] = "not saved"
+
+        assert await jobs.get(1) == {"id": 1, "store_id": 7, "tags": ["retail"]}
+        assert [job["id"] for job in await jobs.find("store", 7)] == [1]
+
+    asyncio.run(scenario())
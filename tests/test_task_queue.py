@@ -0,0 +1,49 @@
+import asyncio
+
+from task_queue import TaskQueue, TaskWorkerPool
+
+
+def test_lease_is_renewed_while_the_handler_runs(tmp_path):
+    queue = TaskQueue(str(tmp_path / "tasks.db"), lease_seconds=0.3)
+    queue.enqueue("enhance", 1, {})
+    second_claims = []
+
+    async def handler(task):
+        for _ in range(4):
+            await asyncio.sleep(0.2)
+            # Well past the original lease; another worker must not get the task
+            second_claims.append(await asyncio.to_thread(queue.claim))
+
+    async def scenario():
+        pool = TaskWorkerPool(queue, handler, concurrency=1, poll_seconds=0.05)
+        pool.start()
+        while pool.completed == 0:
+            await asyncio.sleep(0.05)
+        await pool.stop()
+
+    asyncio.run(scenario())
+    assert second_claims == [None] * 4
+    assert queue.counts() == {}
+    queue.close()
+
+
+def test_cancelled_task_goes_back_to_the_queue(tmp_path):
+    queue = TaskQueue(str(tmp_path / "tasks.db"))
+    queue.enqueue("enhance", 1, {})
+    started = []
+
+    async def handler(task):
+        started.append(task.attempts)
+        await asyncio.sleep(10)
+
+    async def scenario():
+        pool = TaskWorkerPool(queue, handler, concurrency=1, poll_seconds=0.05)
+        pool.start()
+        while not started:
+            await asyncio.sleep(0.01)
+        await pool.stop()
+
+    asyncio.run(scenario())
+    assert queue.counts() == {"queued": 1}
+    assert queue.claim().attempts == 1
+    queue.close()
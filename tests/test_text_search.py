@@ -0,0 +1,64 @@
+import math
+
+import pytest
+
+from text_search import BM25Index, stem, tokenize
+
+
+def test_tokenize_stems_and_drops_stopwords():
+    assert tokenize("Cashiers and cashiering for the Cashier") == ("cashier", "cashier", "cashier")
+    assert stem("shipped") == "ship"
+    assert stem("services") == stem("service")
+    assert stem("handling") == stem("handle")
+    assert tokenize("") == ()
+    assert tokenize(None) == ()
+
+
+def test_search_ranks_by_bm25():
+    index = BM25Index()
+    index.add("1", "Barista making espresso and coffee")
+    index.add("2", "Cashier handling the register")
+    index.add("3", "Coffee shop cashier, espresso experience preferred, espresso machine")
+    results = index.search("espresso cashier", k=10)
+    assert [doc_id for doc_id, _ in results] == ["3", "2", "1"]
+    assert all(score > 0 for _, score in results)
+    assert index.search("forklift") == []
+
+
+def test_search_respects_k_and_ids():
+    index = BM25Index()
+    for n in range(20):
+        index.add(str(n), f"warehouse picker {n}")
+    assert len(index.search("warehouse", k=5)) == 5
+    assert [doc_id for doc_id, _ in index.search("warehouse", ids=["7", "missing"])] == ["7"]
+    # Equal scores keep a fixed order
+    assert index.search("warehouse", k=3) == index.search("warehouse", k=3)
+
+
+def test_add_replaces_and_remove_updates_statistics():
+    index = BM25Index()
+    index.add("1", "driver delivery")
+    index.add("2", "cook kitchen")
+    index.add("1", "cook grill")
+    assert len(index) == 2
+    assert index.terms("1") == ("cook", "grill")
+    assert index.search("driver") == []
+    assert {doc_id for doc_id, _ in index.search("cook")} == {"1", "2"}
+
+    assert index.remove("2")
+    assert not index.remove("2")
+    assert "2" not in index
+    assert index.idf("cook") == pytest.approx(math.log(1 + 0.5 / 1.5))
+    # Removed slots are reused
+    index.add("3", "cashier")
+    assert index.size == 2
+    assert index.search("cashier")[0][0] == "3"
+
+
+def test_score_text_matches_indexed_score():
+    index = BM25Index()
+    index.add("1", "night shift security guard")
+    index.add("2", "day shift retail associate")
+    indexed = dict(index.search("security shift"))["1"]
+    assert index.score_text("security shift", "night shift security guard") == pytest.approx(indexed)
+    assert index.max_score("security shift") == pytest.approx(sum(index.idf(term) for term in tokenize("security shift")))
@@ -0,0 +1,212 @@
+"""
+Deterministic keyword matching: shared tokenizer and a BM25 inverted index.
+
+``tokenize`` lowercases, splits on non-alphanumerics, drops stopwords and
+applies a light suffix stemmer, so "Cashiers", "cashier" and "cashiering"
+meet on the same term.  ``BM25Index`` keeps postings per term and scores a
+query against every document with a few numpy operations per query term,
+which ranks thousands of jobs in well under a millisecond per term.
+"""
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below between both
+but by can could did do does doing down during each etc few for from further had has have having he her here hers
+him his how i if in into is it its itself just me more most my no nor not of off on once only or other our ours out
+over own per same she should so some such than that the their theirs them then there these they this those through
+to too under until up very was we were what when where which while who whom why will with would you your yours
+""".split())
+
+
+def stem(word: str) -> str:
+    """Light suffix stripping; keeps at least three characters of the stem"""
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    for suffix in ("ing", "ed"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            # "shipped" -> "ship"
+            if len(word) > 3 and word[-1] == word[-2] and word[-1] not in "lsz":
+                word = word[:-1]
+            return word
+    if word.endswith(("ses", "xes", "zes", "ches", "shes")):
+        word = word[:-2]
+    elif word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+    # "handle"/"handling", "service"/"services" meet without the final e
+    if word.endswith("e") and len(word) > 4:
+        word = word[:-1]
+    return word
+
+
+@lru_cache(maxsize=8192)
+def _tokenize_cached(text: str) -> Tuple[str, ...]:
+    return tuple(stem(word) for word in _WORD.findall(text.lower()) if word not in STOPWORDS)
+
+
+def tokenize(text: Optional[str]) -> Tuple[str, ...]:
+    """Stemmed, stopword-free terms of ``text`` in order (cached per distinct text)"""
+    return _tokenize_cached(text) if text else ()
+
+
+Query = Union[str, Iterable[str]]  # raw text, or terms that were already tokenized
+
+
+def _terms(query: Query) -> Tuple[str, ...]:
+    return tokenize(query) if isinstance(query, str) else tuple(query)
+
+
+class BM25Index:
+    """Okapi BM25 over an inverted index with incremental add/remove"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._slots: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []
+        self._free: List[int] = []
+        self._doc_terms: List[Optional[Dict[str, int]]] = []
+        self._lengths = np.zeros(64, dtype=np.float32)
+        self._total_length = 0
+        self._postings: Dict[str, Dict[int, int]] = {}
+        # term -> (slots, term frequencies); rebuilt lazily after the term's postings change
+        self._arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return str(doc_id) in self._slots
+
+    def add(self, doc_id: str, text: str):
+        """Insert or replace a document"""
+        doc_id = str(doc_id)
+        self.remove(doc_id)
+        tokens = tokenize(text)
+        counts = dict(Counter(tokens))
+
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = len(self._ids)
+            self._ids.append(None)
+            self._doc_terms.append(None)
+            if slot == len(self._lengths):
+                self._lengths = np.concatenate([self._lengths, np.zeros_like(self._lengths)])
+        self._slots[doc_id] = slot
+        self._ids[slot] = doc_id
+        self._doc_terms[slot] = counts
+        self._lengths[slot] = len(tokens)
+        self._total_length += len(tokens)
+
+        for term, tf in counts.items():
+            self._postings.setdefault(term, {})[slot] = tf
+            self._arrays.pop(term, None)
+
+    def remove(self, doc_id: str) -> bool:
+        slot = self._slots.pop(str(doc_id), None)
+        if slot is None:
+            return False
+        for term in self._doc_terms[slot]:
+            postings = self._postings[term]
+            del postings[slot]
+            if not postings:
+                del self._postings[term]
+            self._arrays.pop(term, None)
+        self._total_length -= int(self._lengths[slot])
+        self._lengths[slot] = 0
+        self._ids[slot] = None
+        self._doc_terms[slot] = None
+        self._free.append(slot)
+        return True
+
+    def slot(self, doc_id: str) -> Optional[int]:
+        return self._slots.get(str(doc_id))
+
+    @property
+    def size(self) -> int:
+        """Number of slots, i.e. the length of the ``scores`` array"""
+        return len(self._ids)
+
+    def id_at(self, slot: int) -> Optional[str]:
+        """Document stored in ``slot`` (the positions of the ``scores`` array)"""
+        return self._ids[slot]
+
+    def terms(self, doc_id: str) -> Tuple[str, ...]:
+        """Distinct terms of an indexed document"""
+        slot = self._slots.get(str(doc_id))
+        return tuple(self._doc_terms[slot]) if slot is not None else ()
+
+    def idf(self, term: str) -> float:
+        n = len(self._slots)
+        df = len(self._postings.get(term, ()))
+        return math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+    def _avg_length(self) -> float:
+        return self._total_length / len(self._slots) if self._slots else 0.0
+
+    def _term_arrays(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            postings = self._postings[term]
+            arrays = (
+                np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+            )
+            self._arrays[term] = arrays
+        return arrays
+
+    def scores(self, query_tokens: Iterable[str]) -> np.ndarray:
+        """BM25 score of every slot (free slots score 0); repeated query terms count once"""
+        scores = np.zeros(len(self._ids), dtype=np.float32)
+        avg_length = self._avg_length() or 1.0
+        for term in set(query_tokens):
+            if term not in self._postings:
+                continue
+            slots, tf = self._term_arrays(term)
+            norm = self.k1 * (1.0 - self.b + self.b * self._lengths[slots] / avg_length)
+            scores[slots] += self.idf(term) * tf * (self.k1 + 1.0) / (tf + norm)
+        return scores
+
+    def search(self, query: Query, k: int = 10, ids: Optional[Sequence[str]] = None) -> List[Tuple[str, float]]:
+        """
+        Top ``k`` (doc id, score) pairs with a positive score, best first; equal
+        scores keep a fixed order.  ``ids`` restricts the search to those documents.
+        """
+        if not self._slots or k <= 0:
+            return []
+        scores = self.scores(_terms(query))
+        if ids is not None:
+            allowed = np.zeros(len(scores), dtype=bool)
+            allowed[[self._slots[str(doc_id)] for doc_id in ids if str(doc_id) in self._slots]] = True
+            scores = np.where(allowed, scores, 0.0)
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return [(self._ids[slot], float(scores[slot])) for slot in candidates]
+
+    def score_text(self, query: Query, text: str) -> float:
+        """BM25 of an ad-hoc document against ``query`` using this index's term statistics"""
+        counts = Counter(tokenize(text))
+        length = sum(counts.values())
+        avg_length = self._avg_length() or length or 1.0
+        norm = self.k1 * (1.0 - self.b + self.b * length / avg_length)
+        return sum(
+            self.idf(term) * counts[term] * (self.k1 + 1.0) / (counts[term] + norm)
+            for term in set(_terms(query)) if term in counts
+        )
+
+    def max_score(self, query: Query) -> float:
+        """Score of an average-length document containing every query term once; used to scale to 0-100"""
+        return sum(self.idf(term) for term in set(_terms(query)))
@@ -0,0 +1,164 @@
+"""
+Vector indexes over job embeddings.
+
+``FlatIndex`` is an exact search over a contiguous float32 matrix: one
+matrix-vector product plus ``argpartition`` per query, which is fast enough
+for tens of thousands of jobs.  For larger catalogs ``HNSWIndex`` wraps the
+optional ``hnswlib`` package.  Both backends take unit-length vectors, score
+by inner product (cosine similarity) and support incremental add/remove.
+"""
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import hnswlib
+    HNSWLIB_AVAILABLE = True
+except ImportError:
+    HNSWLIB_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class FlatIndex:
+    """Exact inner-product search; the dimension is taken from the first vector"""
+
+    def __init__(self, initial_capacity: int = 1024):
+        self._capacity = max(1, initial_capacity)
+        self._matrix: Optional[np.ndarray] = None
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._rows
+
+    def add(self, item_id: str, vector: np.ndarray):
+        """Insert or replace the vector stored for ``item_id``"""
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        if self._matrix is None:
+            self._matrix = np.zeros((self._capacity, vector.shape[0]), dtype=np.float32)
+
+        row = self._rows.get(item_id)
+        if row is None:
+            row = len(self._ids)
+            if row == self._matrix.shape[0]:
+                grown = np.zeros((row * 2, self._matrix.shape[1]), dtype=np.float32)
+                grown[:row] = self._matrix
+                self._matrix = grown
+            self._ids.append(item_id)
+            self._rows[item_id] = row
+        self._matrix[row] = vector
+
+    def add_many(self, item_ids: List[str], vectors: np.ndarray):
+        for item_id, vector in zip(item_ids, vectors):
+            self.add(item_id, vector)
+
+    def remove(self, item_id: str) -> bool:
+        """Delete ``item_id`` by moving the last row into its slot"""
+        row = self._rows.pop(item_id, None)
+        if row is None:
+            return False
+        last = len(self._ids) - 1
+        if row != last:
+            moved_id = self._ids[last]
+            self._matrix[row] = self._matrix[last]
+            self._ids[row] = moved_id
+            self._rows[moved_id] = row
+        self._ids.pop()
+        return True
+
+    def search(self, query: np.ndarray, k: int = 10) -> List[Tuple[str, float]]:
+        n = len(self._ids)
+        if n == 0 or k <= 0:
+            return []
+        scores = self._matrix[:n] @ np.asarray(query, dtype=np.float32).ravel()
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self._ids[i], float(scores[i])) for i in top]
+
+
+class HNSWIndex:
+    """Approximate search backed by hnswlib (``pip install hnswlib``)"""
+
+    def __init__(self, max_elements: int = 100000, m: int = 16, ef_construction: int = 200, ef_search: int = 64):
+        if not HNSWLIB_AVAILABLE:
+            raise RuntimeError("hnswlib is not installed")
+        self.max_elements = max_elements
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._index = None
+        self._labels: Dict[str, int] = {}
+        self._ids: Dict[int, str] = {}
+        self._next_label = 0
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._labels
+
+    def _ensure_index(self, dim: int):
+        if self._index is None:
+            self._index = hnswlib.Index(space="ip", dim=dim)
+            self._index.init_index(
+                max_elements=self.max_elements,
+                ef_construction=self.ef_construction,
+                M=self.m,
+                allow_replace_deleted=True
+            )
+            self._index.set_ef(self.ef_search)
+
+    def add(self, item_id: str, vector: np.ndarray):
+        self.add_many([item_id], np.asarray(vector, dtype=np.float32).reshape(1, -1))
+
+    def add_many(self, item_ids: List[str], vectors: np.ndarray):
+        if not item_ids:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self._ensure_index(vectors.shape[1])
+
+        for item_id in item_ids:
+            self.remove(item_id)
+        needed = len(self._labels) + len(item_ids)
+        if needed > self._index.get_max_elements():
+            self._index.resize_index(max(needed, self._index.get_max_elements() * 2))
+
+        labels = []
+        for item_id in item_ids:
+            label = self._next_label
+            self._next_label += 1
+            self._labels[item_id] = label
+            self._ids[label] = item_id
+            labels.append(label)
+        self._index.add_items(vectors, np.asarray(labels), replace_deleted=True)
+
+    def remove(self, item_id: str) -> bool:
+        label = self._labels.pop(item_id, None)
+        if label is None:
+            return False
+        del self._ids[label]
+        self._index.mark_deleted(label)
+        return True
+
+    def search(self, query: np.ndarray, k: int = 10) -> List[Tuple[str, float]]:
+        k = min(k, len(self._labels))
+        if k <= 0:
+            return []
+        labels, distances = self._index.knn_query(np.asarray(query, dtype=np.float32).reshape(1, -1), k=k)
+        # hnswlib reports inner-product distance as 1 - dot
+        return [(self._ids[int(label)], 1.0 - float(distance)) for label, distance in zip(labels[0], distances[0])]
+
+
+def create_vector_index(backend: str = "flat", **options):
+    """Build the configured index, falling back to exact search if hnswlib is missing"""
+    if backend == "hnsw":
+        if HNSWLIB_AVAILABLE:
+            return HNSWIndex(**options)
+        logger.warning("hnswlib not installed; using exact flat vector index")
+    return FlatIndex()